@@ -0,0 +1,167 @@
+from datetime import datetime, date, timedelta
+
+FORMATO_DIA = "%Y-%m-%d"
+FORMATO_HORA = "%Y-%m-%d %H"
+
+
+def inicializar_agregados():
+    """Estructura vacía de agregados por día y por hora, con el primer y el último día que tienen datos"""
+    return {"dia": {}, "hora": {}, "primero": None, "ultimo": None}
+
+
+def _extremos(agregados):
+    """(primer día, último día) con buckets; los snapshots anteriores a estas marcas las calculan una vez"""
+    if "primero" not in agregados:
+        dias = agregados["dia"]
+        agregados["primero"] = min(dias) if dias else None
+        agregados["ultimo"] = max(dias) if dias else None
+    return agregados["primero"], agregados["ultimo"]
+
+
+def nuevo_bucket():
+    """Contadores de un intervalo de tiempo (un día o una hora)"""
+    return {
+        "conversaciones": 0,
+        "mensajes": 0,
+        "urgentes": 0,
+        "derivaciones": 0,
+        "automaticas": 0,
+        "encuestas": 0,
+        "satisfactorias": 0,
+        "respuestas": 0,
+        "tiempo_respuesta_total": 0.0,
+        "sistemas": {},
+        "problemas": {}
+    }
+
+
+def acumular_evento(agregados, evento):
+    """Suma un evento de estadísticas en los buckets de su día y de su hora"""
+    fecha = evento.get("fecha")
+    if evento["tipo"] == "conversacion":
+        fecha = evento["conversacion"]["fecha"]
+    if not fecha:
+        # Eventos antiguos sin marca de tiempo solo cuentan en los totales históricos
+        return
+
+    momento = datetime.strptime(fecha, "%Y-%m-%d %H:%M:%S")
+    dia = momento.strftime(FORMATO_DIA)
+    primero, ultimo = _extremos(agregados)
+    if primero is None or dia < primero:
+        agregados["primero"] = dia
+    if ultimo is None or dia > ultimo:
+        agregados["ultimo"] = dia
+    for nivel, clave in (("dia", dia), ("hora", momento.strftime(FORMATO_HORA))):
+        bucket = agregados[nivel].get(clave)
+        if bucket is None:
+            bucket = agregados[nivel][clave] = nuevo_bucket()
+        _sumar_evento(bucket, evento)
+
+
+def reconstruir_conversaciones(agregados, conversaciones):
+    """Recalcula lo que aportan las conversaciones a los buckets desde la lista completa de un snapshot antiguo.
+
+    Esa lista tiene todas las conversaciones, también las anteriores a los
+    buckets, así que se descarta lo que las conversaciones ya habían sumado y
+    se vuelve a acumular cada una. Si todavía no había buckets, las
+    derivaciones salen de la marca `derivado_agente` de cada conversación.
+    """
+    sin_buckets = not agregados["dia"]
+    for nivel in (agregados["dia"], agregados["hora"]):
+        for bucket in nivel.values():
+            for campo in ("conversaciones", "mensajes", "urgentes", "automaticas"):
+                bucket[campo] = 0
+            bucket["sistemas"] = {}
+            bucket["problemas"] = {}
+    for conversacion in conversaciones:
+        acumular_evento(agregados, {"tipo": "conversacion", "conversacion": conversacion})
+        if sin_buckets and conversacion.get("derivado_agente"):
+            acumular_evento(agregados, {"tipo": "derivacion", "fecha": conversacion["fecha"]})
+
+
+def _sumar_evento(bucket, evento):
+    tipo = evento["tipo"]
+    if tipo == "conversacion":
+        conversacion = evento["conversacion"]
+        bucket["conversaciones"] += 1
+        bucket["mensajes"] += len(conversacion["mensajes"])
+        bucket["urgentes"] += int(bool(conversacion["es_urgente"]))
+        bucket["automaticas"] += int(bool(conversacion["respuesta_automatica"]))
+        for campo, clave in (("sistemas", "sistema"), ("problemas", "problema")):
+            valor = conversacion[clave]
+            if valor:
+                bucket[campo][valor] = bucket[campo].get(valor, 0) + 1
+    elif tipo == "encuesta":
+        bucket["encuestas"] += 1
+        bucket["satisfactorias"] += int(bool(evento["satisfactoria"]))
+    elif tipo == "derivacion":
+        bucket["derivaciones"] += 1
+    elif tipo == "respuesta":
+        bucket["respuestas"] += 1
+        bucket["tiempo_respuesta_total"] += evento["tiempo_respuesta"]
+
+
+def _combinar(total, bucket):
+    for campo, valor in bucket.items():
+        if isinstance(valor, dict):
+            destino = total[campo]
+            for clave, cantidad in valor.items():
+                destino[clave] = destino.get(clave, 0) + cantidad
+        else:
+            total[campo] += valor
+
+
+def _a_datetime(valor, es_fin):
+    """Convierte una fecha (texto, date o datetime) al inicio de su hora"""
+    if isinstance(valor, datetime):
+        return valor.replace(minute=0, second=0, microsecond=0)
+    if isinstance(valor, date):
+        return datetime(valor.year, valor.month, valor.day, 23 if es_fin else 0)
+    valor = str(valor).strip()
+    try:
+        if len(valor) == 10:
+            dia = datetime.strptime(valor, FORMATO_DIA)
+            return dia.replace(hour=23) if es_fin else dia
+        return datetime.strptime(valor[:13], FORMATO_HORA)
+    except ValueError:
+        raise ValueError(f"Fecha inválida '{valor}': se espera AAAA-MM-DD o AAAA-MM-DD HH:MM")
+
+
+def consultar_rango(agregados, inicio=None, fin=None):
+    """Combina solo los buckets que cubren el rango [inicio, fin] (ambos inclusive).
+
+    Los días completos se leen de su bucket diario y los extremos parciales de
+    los buckets por hora, por lo que el costo depende del largo del rango y no
+    de la cantidad de historia almacenada. El rango se recorta al primer y al
+    último día con datos (marcas que `acumular_evento` mantiene al día), así
+    una cota muy lejana no recorre días vacíos. Lanza ValueError si una fecha
+    no se puede interpretar.
+    """
+    total = nuevo_bucket()
+    desde = _a_datetime(inicio, False) if inicio else None
+    hasta = _a_datetime(fin, True) if fin else None
+    dias = agregados["dia"]
+    if not dias:
+        return total
+
+    primero, ultimo = _extremos(agregados)
+    primero = datetime.strptime(primero, FORMATO_DIA)
+    ultimo = datetime.strptime(ultimo, FORMATO_DIA).replace(hour=23)
+    desde = max(desde, primero) if desde else primero
+    hasta = min(hasta, ultimo) if hasta else ultimo
+
+    dia = desde.date()
+    while dia <= hasta.date():
+        hora_inicial = desde.hour if dia == desde.date() else 0
+        hora_final = hasta.hour if dia == hasta.date() else 23
+        if hora_inicial == 0 and hora_final == 23:
+            bucket = dias.get(dia.strftime(FORMATO_DIA))
+            if bucket:
+                _combinar(total, bucket)
+        else:
+            for hora in range(hora_inicial, hora_final + 1):
+                bucket = agregados["hora"].get(f"{dia.strftime(FORMATO_DIA)} {hora:02d}")
+                if bucket:
+                    _combinar(total, bucket)
+        dia += timedelta(days=1)
+    return total
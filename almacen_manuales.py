@@ -0,0 +1,197 @@
+import os
+import re
+import json
+import threading
+from collections import OrderedDict
+
+from base_binaria import abrir_base
+
+_FALTA = object()
+
+
+def normalizar_matricula(matricula):
+    """'cc-abc', 'CC ABC' y 'CCABC' se comparan igual"""
+    return re.sub(r'[\s-]', '', matricula).upper() if matricula else None
+
+
+class AlmacenManuales:
+    """Bases de conocimiento de varios manuales particionadas por tipo de aeronave.
+
+    Cada tipo tiene su carpeta `<directorio>/<tipo>/knowledge_base.json` con
+    las secciones de todos sus manuales (AMM, TSM, MEL...) y
+    `<directorio>/flota.json` asigna matrículas a tipos:
+    {"A320": ["CC-BAA", "CC-BAB"], "B787": ["CC-BGA"]}.
+
+    Las particiones se cargan recién cuando una consulta las necesita y solo
+    se mantienen en memoria las `max_particiones` usadas más recientemente.
+    Una consulta con matrícula busca primero en la partición de su tipo y
+    después en la base general (`base_general`, la base única de siempre).
+    Si junto a una base JSON hay una versión binaria (.mkb) al día, se abre
+    esa, que se lee bajo demanda desde un mapeo en memoria. Tiene la misma
+    interfaz de consulta que ManualKnowledge; el stack de extracción de PDF
+    solo se importa al ingerir.
+
+    Las rutas sin base (tipo sin carpeta, base general ausente o ilegible)
+    también se recuerdan, junto con la fecha de modificación de su carpeta:
+    mientras esa carpeta no cambie no se vuelve a intentar abrirlas en cada
+    consulta. `recargar` olvida todo lo abierto y lo que faltaba.
+    """
+
+    ARCHIVO_BASE = 'knowledge_base.json'
+
+    def __init__(self, directorio, base_general=None, max_particiones=8):
+        self.directorio = directorio
+        self.base_general = base_general
+        self.max_particiones = max_particiones
+        self.flota = self._cargar_flota()
+        self._particiones = OrderedDict()
+        self._general = None
+        self._sin_base = {}
+        self._lock = threading.Lock()
+
+    def _cargar_flota(self):
+        """Devuelve {matrícula normalizada: tipo}"""
+        ruta = os.path.join(self.directorio, 'flota.json')
+        if not os.path.exists(ruta):
+            return {}
+        try:
+            with open(ruta, 'r', encoding='utf-8') as f:
+                tipos = json.load(f)
+        except Exception as e:
+            print(f"Error al cargar la flota: {e}")
+            return {}
+        return {normalizar_matricula(matricula): tipo
+                for tipo, matriculas in tipos.items() for matricula in matriculas}
+
+    def disponible(self):
+        """Indica si hay alguna base de conocimiento para consultar"""
+        return bool(self.tipos()) or bool(self.base_general and (
+            os.path.exists(self.base_general) or os.path.exists(self._ruta_binaria(self.base_general))))
+
+    def tipos(self):
+        """Tipos de aeronave con partición en disco"""
+        if not os.path.isdir(self.directorio):
+            return []
+        return sorted(tipo for tipo in os.listdir(self.directorio)
+                      if os.path.exists(self._ruta_particion(tipo)) or
+                      os.path.exists(self._ruta_binaria(self._ruta_particion(tipo))))
+
+    def tipo_de(self, matricula):
+        """Tipo de aeronave de una matrícula, o None si no está en la flota"""
+        return self.flota.get(normalizar_matricula(matricula))
+
+    def _ruta_particion(self, tipo):
+        return os.path.join(self.directorio, tipo, self.ARCHIVO_BASE)
+
+    @staticmethod
+    def _ruta_binaria(ruta_json):
+        return os.path.splitext(ruta_json)[0] + '.mkb'
+
+    @staticmethod
+    def _firma_carpeta(ruta):
+        """(carpeta, fecha de modificación) de la carpeta de la base, o de la de arriba si todavía no existe"""
+        carpeta = os.path.dirname(ruta)
+        for _ in range(2):
+            try:
+                return carpeta, os.stat(carpeta).st_mtime_ns
+            except OSError:
+                carpeta = os.path.dirname(carpeta)
+        return None
+
+    def _abrir(self, ruta):
+        """abrir_base, salvo que la ruta no tuviera base y su carpeta siga igual"""
+        firma = self._firma_carpeta(ruta)
+        if self._sin_base.get(ruta, _FALTA) == firma:
+            return None
+        conocimiento = abrir_base(ruta)
+        if conocimiento is None:
+            self._sin_base[ruta] = firma
+        else:
+            self._sin_base.pop(ruta, None)
+        return conocimiento
+
+    def particion(self, tipo):
+        """Base de conocimiento del tipo, cargándola si todavía no está en memoria"""
+        with self._lock:
+            conocimiento = self._particiones.get(tipo)
+            if conocimiento is not None:
+                self._particiones.move_to_end(tipo)
+                return conocimiento
+
+        conocimiento = self._abrir(self._ruta_particion(tipo))
+        if conocimiento is None:
+            return None
+
+        with self._lock:
+            # Si otro hilo la cargó mientras tanto se usa esa
+            conocimiento = self._particiones.setdefault(tipo, conocimiento)
+            self._particiones.move_to_end(tipo)
+            while len(self._particiones) > self.max_particiones:
+                self._particiones.popitem(last=False)
+        return conocimiento
+
+    def general(self):
+        """Base de conocimiento común a toda la flota"""
+        if self._general is None and self.base_general:
+            self._general = self._abrir(self.base_general)
+        return self._general
+
+    def recargar(self):
+        """Olvida las bases abiertas y las que faltaban, y vuelve a leer la flota"""
+        with self._lock:
+            self._particiones.clear()
+            self._general = None
+            self._sin_base.clear()
+        self.flota = self._cargar_flota()
+
+    def _bases_para(self, matricula):
+        tipo = self.tipo_de(matricula)
+        if tipo:
+            conocimiento = self.particion(tipo)
+            if conocimiento is not None:
+                yield conocimiento
+        conocimiento = self.general()
+        if conocimiento is not None:
+            yield conocimiento
+
+    def get_response(self, system, problem, message=None, matricula=None):
+        """Obtiene una respuesta de la partición del tipo de la aeronave o, si no hay, de la general"""
+        for conocimiento in self._bases_para(matricula):
+            respuesta = conocimiento.get_response(system, problem, message)
+            if respuesta:
+                return respuesta
+        return None
+
+    def get_all_responses(self, system, problem, matricula=None):
+        """Obtiene todas las respuestas para un sistema y problema específicos"""
+        for conocimiento in self._bases_para(matricula):
+            respuestas = conocimiento.get_all_responses(system, problem)
+            if respuestas:
+                return respuestas
+        return []
+
+    def search(self, message, system=None, problem=None, k=3, matricula=None):
+        """Devuelve las k secciones más relevantes de la primera base con resultados"""
+        for conocimiento in self._bases_para(matricula):
+            resultados = conocimiento.search(message, system, problem, k)
+            if resultados:
+                return resultados
+        return []
+
+    def ingerir(self, tipo, rutas_pdf, procesos=None, paginas_por_tarea=16):
+        """Ingiere los manuales de un tipo y reemplaza su partición.
+
+        Los manifiestos de cada manual se guardan en la carpeta del tipo, así
+        al volver a ingerir una revisión solo se extraen las páginas cambiadas.
+        Devuelve las estadísticas de cada manual y los segundos de escritura.
+        """
+        from pdf_knowledge import ManualKnowledge
+        from ingesta import ingerir_manuales
+
+        plantilla = ManualKnowledge()
+        resultado = ingerir_manuales(rutas_pdf, self._ruta_particion(tipo), plantilla.system_keywords,
+                                     plantilla.problem_keywords, procesos, paginas_por_tarea)
+        with self._lock:
+            self._particiones.pop(tipo, None)
+            self._sin_base.pop(self._ruta_particion(tipo), None)
+        return resultado
@@ -0,0 +1,187 @@
+import re
+import unicodedata
+
+PATRON_TOKEN = re.compile(r'\w+')
+
+# Comandos exactos (en minúsculas) y el nombre de su ruta
+COMANDOS = {
+    'nueva consulta': 'nueva_consulta',
+    'nuevo problema': 'nueva_consulta',
+    'otra consulta': 'nueva_consulta',
+    'reiniciar': 'nueva_consulta',
+    'ayuda': 'ayuda',
+    'ejemplos': 'ejemplos',
+    'urgente': 'urgente',
+    'agente': 'agente',
+}
+
+
+def quitar_acentos(texto):
+    """'Eléctrico' -> 'Electrico'"""
+    if texto.isascii():
+        return texto
+    return ''.join(c for c in unicodedata.normalize('NFKD', texto) if not unicodedata.combining(c))
+
+
+def tokenizar(texto):
+    return tuple(PATRON_TOKEN.findall(quitar_acentos(texto.lower())))
+
+
+class DetectorFrases:
+    """Detecta frases completas (secuencias de tokens) con un trie de palabras.
+
+    Recorre los tokens una vez de izquierda a derecha tomando en cada posición
+    la frase más larga que empieza ahí, así el costo es O(largo del mensaje)
+    y 'no' nunca coincide dentro de 'nota' ni se confunde con 'no gracias'.
+    `completas` son frases que solo cuentan si forman el mensaje entero
+    ('s', 'n', 'y'), y `relleno` las palabras que no aportan contenido.
+    """
+
+    def __init__(self, frases, completas=None, relleno=()):
+        self._trie = {}
+        for frase, intencion in frases.items():
+            nodo = self._trie
+            for token in tokenizar(frase):
+                nodo = nodo.setdefault(token, {})
+            nodo[''] = intencion
+        self._completas = {tokenizar(frase): intencion for frase, intencion in (completas or {}).items()}
+        self._relleno = frozenset(relleno)
+
+    def detectar(self, tokens):
+        """Devuelve (intenciones en orden de aparición, tokens que no son frase ni relleno)"""
+        completa = self._completas.get(tokens)
+        if completa:
+            return [completa], 0
+        intenciones = []
+        otros = 0
+        i, total = 0, len(tokens)
+        while i < total:
+            nodo, j, fin = self._trie, i, None
+            while j < total and tokens[j] in nodo:
+                nodo = nodo[tokens[j]]
+                j += 1
+                if '' in nodo:
+                    fin, intencion = j, nodo['']
+            if fin is None:
+                otros += tokens[i] not in self._relleno
+                i += 1
+            else:
+                intenciones.append(intencion)
+                i = fin
+        return intenciones, otros
+
+
+# Despedida: alguna de estas frases y nada más que cortesía ("ok, muchas gracias por la ayuda");
+# "el APU no arranca" o "gracias, pero sigue fallando" no son despedidas
+DETECTOR_DESPEDIDA = DetectorFrases(
+    {frase: 'despedida' for frase in (
+        'no gracias', 'no necesito mas ayuda', 'no necesito nada mas', 'no hay mas', 'no hay nada mas',
+        'nada mas', 'es todo', 'eso es todo', 'eso seria todo', 'seria todo', 'listo', 'terminamos',
+        'gracias', 'muchas gracias', 'chao', 'adios', 'hasta luego')},
+    completas={'no': 'despedida', 'nada': 'despedida'},
+    relleno=('ok', 'okay', 'vale', 'bueno', 'bien', 'muy', 'perfecto', 'excelente', 'genial', 'entonces',
+             'ahora', 'ya', 'si', 'eso', 'todo', 'por', 'la', 'el', 'tu', 'su', 'ayuda', 'apoyo',
+             'informacion', 'info', 'mil', 'de', 'nada', 'a', 'ti', 'usted', 'amable', 'saludos', 'buen',
+             'buena', 'buenas', 'dia', 'tarde', 'noche', 'me', 'sirvio', 'funciono', 'quedo', 'con'))
+
+# Respuestas a la encuesta de satisfacción: como la despedida, un sí o un no y nada más que
+# cortesía ("no, sigue igual"); "el APU no enciende", "no sé" o "sí, pero sigue fallando" no
+# cuentan y se vuelve a preguntar. 's', 'n' e 'y' solo valen como mensaje completo
+DETECTOR_ENCUESTA = DetectorFrases(
+    {'si': 'si', 'yes': 'si', 'claro': 'si', 'por supuesto': 'si', 'afirmativo': 'si', 'correcto': 'si',
+     'no': 'no', 'not': 'no', 'nope': 'no', 'negativo': 'no', 'incorrecto': 'no', 'para nada': 'no',
+     'sigue igual': 'no', 'sigue fallando': 'no', 'agente': 'agente'},
+    completas={'s': 'si', 'y': 'si', 'n': 'no'},
+    relleno=('ok', 'bueno', 'pues', 'mmm', 'eh', 'la', 'respuesta', 'es', 'gracias', 'muchas', 'quiero',
+             'un', 'una', 'hablar', 'con'))
+
+# "no quiero agente", "sin agente": mencionan al agente para rechazarlo. La coma de "no, quiero un
+# agente" corta el patrón, así ese sigue siendo un pedido de agente
+PATRON_SIN_AGENTE = re.compile(r'\b(?:no|sin|ningun)\s+(?:(?:quiero|necesito|pido|hace falta)\s+)?'
+                               r'(?:(?:un|una|el|al|a|con)\s+)?agente')
+
+
+class MensajeAnalizado:
+    """Rasgos de un mensaje calculados una sola vez y compartidos por todas las rutas.
+
+    Al crearlo se pasa el texto a minúsculas y sin acentos, se separa en
+    tokens y se calculan las marcas de despedida, respuesta a la encuesta,
+    comando, agente y reset y los problemas específicos mencionados. La detección de sistema, problema
+    y matrícula se hace la primera vez que alguien la pide (los comandos no
+    la necesitan) y queda guardada para el resto del procesamiento.
+    """
+
+    __slots__ = ('texto', 'minusculas', 'plano', 'tokens', 'es_corto', 'comando', 'es_despedida',
+                 'respuesta_encuesta', 'pide_agente', 'pide_reset', 'sistema_en_reset',
+                 'problemas_especificos', '_detectar', '_deteccion')
+
+    def __init__(self, texto, detectar, claves_especificas=()):
+        self.texto = texto
+        self.minusculas = m = texto.lower()
+        self.plano = p = quitar_acentos(m)
+        self.tokens = tuple(PATRON_TOKEN.findall(p))
+        self.es_corto = len(texto.strip()) <= 5
+        self.comando = COMANDOS.get(m)
+
+        intenciones, otros = DETECTOR_DESPEDIDA.detectar(self.tokens)
+        self.es_despedida = bool(intenciones) and not otros
+        self.respuesta_encuesta = self._respuesta_encuesta()
+        self.pide_agente = (self.comando == 'agente' or 'contactar' in p or 'contactame' in p or
+                            'hablar con agente' in p)
+        self.pide_reset = 'reset' in p or 'reinicio' in p or 'reiniciar' in p
+        if 'apu' in p:
+            self.sistema_en_reset = 'APU'
+        elif 'electrico' in p:
+            self.sistema_en_reset = 'ELECTRICO'
+        elif 'tren' in p or 'aterrizaje' in p:
+            self.sistema_en_reset = 'TREN'
+        else:
+            self.sistema_en_reset = None
+        self.problemas_especificos = tuple(clave for clave in claves_especificas if clave in p)
+
+        self._detectar = detectar
+        self._deteccion = None
+
+    def _respuesta_encuesta(self):
+        """'agente' si lo pide (sin negarlo), 'si'/'no' si es solo eso, o None para volver a preguntar"""
+        intenciones, otros = DETECTOR_ENCUESTA.detectar(self.tokens)
+        if 'agente' in intenciones:
+            if not PATRON_SIN_AGENTE.search(self.plano):
+                return 'agente'
+            return None
+        respuestas = set(intenciones)
+        if len(respuestas) == 1 and not otros:
+            return respuestas.pop()
+        return None
+
+    @property
+    def deteccion(self):
+        """(sistema, problema, matrícula) detectados en el mensaje"""
+        if self._deteccion is None:
+            self._deteccion = self._detectar(self.texto)
+        return self._deteccion
+
+    @property
+    def sistema(self):
+        return self.deteccion[0]
+
+    @property
+    def problema(self):
+        return self.deteccion[1]
+
+    @property
+    def matricula(self):
+        return self.deteccion[2]
+
+    @property
+    def tema(self):
+        """Caso especial con manejador propio: 'APU_NO_ARRANCA', 'TREN', 'ELECTRICO' o None"""
+        sistema, problema, _ = self.deteccion
+        p = self.plano
+        if (sistema == 'APU' and problema == 'NO_ARRANCA') or ('apu' in p and ('no arranca' in p or 'no enciende' in p)):
+            return 'APU_NO_ARRANCA'
+        if sistema == 'TREN' or ('tren' in p and 'aterrizaje' in p):
+            return 'TREN'
+        if sistema == 'ELECTRICO' or 'electrico' in p:
+            return 'ELECTRICO'
+        return None
@@ -1,9 +1,13 @@
 from flask import Flask, render_template, request, jsonify
 from bot_simple import WhatsAppBot
+import atexit
 import os
 
+FILTROS_CONVERSACIONES = ('matricula', 'sistema', 'problema', 'desde', 'hasta', 'texto')
+
 app = Flask(__name__)
 bot = WhatsAppBot()
+atexit.register(bot.cerrar)
 
 @app.route('/')
 def index():
@@ -11,13 +15,47 @@ def index():
 
 @app.route('/api/message', methods=['POST'])
 def receive_message():
-    data = request.json
+    data = request.get_json(silent=True)
+    if not isinstance(data, dict):
+        return jsonify({'error': 'Se espera un objeto JSON'}), 400
     message = data.get('message', '')
     user_id = data.get('user_id', 'web_user')
     
     response = bot.procesar_mensaje(message, user_id)
     return jsonify({'response': response})
 
+@app.route('/api/messages', methods=['POST'])
+def receive_messages():
+    data = request.get_json(silent=True)
+    try:
+        messages = [(item.get('user_id', 'web_user'), item.get('message', '')) for item in data.get('messages', [])]
+    except (AttributeError, TypeError):
+        return jsonify({'error': 'Se espera {"messages": [{"user_id": ..., "message": ...}]}'}), 400
+    
+    responses = bot.procesar_lote(messages)
+    return jsonify({'responses': [
+        {'user_id': user_id, 'response': response}
+        for (user_id, _), response in zip(messages, responses)
+    ]})
+
+@app.route('/api/conversaciones', methods=['GET'])
+def search_conversations():
+    filtros = {clave: request.args.get(clave) for clave in FILTROS_CONVERSACIONES}
+    filtros['limite'] = max(1, min(request.args.get('limite', 50, type=int), 500))
+    filtros['desplazamiento'] = max(request.args.get('desplazamiento', 0, type=int), 0)
+    return jsonify({'conversaciones': bot.buscar_conversaciones(**filtros)})
+
+@app.route('/api/estadisticas', methods=['GET'])
+def statistics():
+    try:
+        return jsonify(bot.obtener_estadisticas(request.args.get('start_date'), request.args.get('end_date')))
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+
+@app.route('/api/metricas', methods=['GET'])
+def metrics():
+    return jsonify(bot.obtener_metricas())
+
 # Punto de entrada para Render
 if __name__ == '__main__':
     # Obtener el puerto de la variable de entorno o usar 10000 como predeterminado
@@ -0,0 +1,297 @@
+import os
+import re
+import sys
+import glob
+import gzip
+import json
+import zlib
+import threading
+from contextlib import contextmanager
+
+try:
+    import fcntl
+except ImportError:
+    # Sin fcntl (Windows) solo un proceso debe escribir el archivo
+    fcntl = None
+
+from backends import BaseSQLite
+from almacen_manuales import normalizar_matricula
+
+PATRON_SEGMENTO = re.compile(r'seg_(\d+)\.jsonl(?:\.gz)?$')
+
+COLUMNAS = ("id", "fecha", "id_usuario", "matricula", "sistema", "problema", "es_urgente", "derivado_agente")
+
+
+def texto_buscable(conversacion):
+    """Texto que entra en la búsqueda: lo que escribió el usuario (las respuestas son plantillas)"""
+    return "\n".join(m.get('mensaje', '') for m in conversacion.get("mensajes", [])
+                     if isinstance(m, dict) and m.get('tipo') == 'usuario')
+
+
+def consulta_fts(texto):
+    """Cada palabra entre comillas: se buscan todas, sin interpretar la sintaxis de FTS5"""
+    return " ".join('"' + palabra.replace('"', '""') + '"' for palabra in texto.split())
+
+
+class ArchivoConversaciones:
+    """Archivo de conversaciones en segmentos por día, rotados por tamaño.
+
+    Cada conversación se anexa al segmento actual de su día,
+    `<directorio>/<AAAA-MM-DD>/seg_00001.jsonl`, como una línea JSON o, si
+    `comprimir`, como un miembro gzip independiente (`.jsonl.gz`, que sigue
+    siendo un gzip válido para zcat). Al superar `max_segmento` bytes se pasa
+    al segmento siguiente. Un índice SQLite guarda id -> (segmento, offset,
+    largo), así leer una conversación es una consulta al índice y una lectura
+    puntual, sin un archivo por conversación. Varios procesos pueden anexar a
+    la vez: las escrituras se serializan con un lock de archivo.
+
+    El mismo índice guarda matrícula, sistema, problema y fecha (con índices)
+    y el texto de los mensajes del usuario en una tabla FTS5, para `buscar`
+    casos anteriores sin leer los segmentos.
+    """
+
+    def __init__(self, directorio, max_segmento=64 * 1024 * 1024, comprimir=False):
+        self.directorio = directorio
+        self.max_segmento = max_segmento
+        self.comprimir = comprimir
+        self.extension = '.jsonl.gz' if comprimir else '.jsonl'
+        os.makedirs(directorio, exist_ok=True)
+
+        self.indice = BaseSQLite(os.path.join(directorio, 'indice.db'))
+        with self.indice.conexion(escritura=True) as conexion:
+            conexion.execute("""
+                CREATE TABLE IF NOT EXISTS conversaciones (
+                    id TEXT PRIMARY KEY,
+                    segmento TEXT NOT NULL,
+                    offset INTEGER NOT NULL,
+                    largo INTEGER NOT NULL
+                )
+            """)
+            columnas = {fila[1] for fila in conexion.execute("PRAGMA table_info(conversaciones)")}
+            for columna in COLUMNAS[1:]:
+                if columna not in columnas:
+                    conexion.execute(f"ALTER TABLE conversaciones ADD COLUMN {columna}")
+            conexion.execute("CREATE INDEX IF NOT EXISTS conv_matricula ON conversaciones (matricula, fecha)")
+            conexion.execute("CREATE INDEX IF NOT EXISTS conv_sistema ON conversaciones (sistema, problema, fecha)")
+            conexion.execute("CREATE INDEX IF NOT EXISTS conv_fecha ON conversaciones (fecha)")
+            conexion.execute("""
+                CREATE VIRTUAL TABLE IF NOT EXISTS conversaciones_texto
+                USING fts5(id UNINDEXED, texto, tokenize = 'unicode61 remove_diacritics 2')
+            """)
+            # Índices creados antes de tener estas columnas: se completan desde los segmentos
+            incompleto = conexion.execute(
+                "SELECT 1 FROM conversaciones WHERE fecha IS NULL LIMIT 1").fetchone() is not None
+
+        self._lock = threading.Lock()
+        self._segmentos = {}
+        if incompleto:
+            self.reindexar()
+
+    @contextmanager
+    def _bloqueo_archivo(self):
+        """Lock exclusivo entre procesos mientras se elige el segmento y se escribe"""
+        if fcntl is None:
+            yield
+            return
+        with open(os.path.join(self.directorio, '.lock'), 'a') as f:
+            fcntl.flock(f, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(f, fcntl.LOCK_UN)
+
+    def _ultimo_segmento(self, dia):
+        carpeta = os.path.join(self.directorio, dia)
+        if not os.path.isdir(carpeta):
+            return 1
+        numeros = [int(m.group(1)) for m in map(PATRON_SEGMENTO.match, os.listdir(carpeta)) if m]
+        return max(numeros, default=1)
+
+    def _segmento(self, dia, largo):
+        """Nombre del segmento del día donde entran `largo` bytes más"""
+        numero = self._segmentos.get(dia) or self._ultimo_segmento(dia)
+        while True:
+            nombre = f"{dia}/seg_{numero:05d}{self.extension}"
+            ruta = os.path.join(self.directorio, nombre)
+            tamano = os.path.getsize(ruta) if os.path.exists(ruta) else 0
+            if tamano == 0 or tamano + largo <= self.max_segmento:
+                break
+            numero += 1
+        self._segmentos[dia] = numero
+        return nombre
+
+    def guardar(self, conversacion):
+        """Anexa la conversación al archivo y la registra en el índice"""
+        return self.guardar_lote([conversacion])[0]
+
+    def guardar_lote(self, conversaciones):
+        """Anexa varias conversaciones con un solo lock y una sola transacción del índice"""
+        posiciones = []
+        archivos = {}
+        with self._lock, self._bloqueo_archivo():
+            try:
+                with self.indice.conexion(escritura=True) as conexion:
+                    for conversacion in conversaciones:
+                        linea = (json.dumps(conversacion, ensure_ascii=False) + "\n").encode('utf-8')
+                        datos = gzip.compress(linea) if self.comprimir else linea
+                        nombre = self._segmento(conversacion["fecha"][:10], len(datos))
+                        if nombre not in archivos:
+                            ruta = os.path.join(self.directorio, nombre)
+                            os.makedirs(os.path.dirname(ruta), exist_ok=True)
+                            archivos[nombre] = open(ruta, 'ab')
+                        f = archivos[nombre]
+                        offset = f.seek(0, os.SEEK_END)
+                        f.write(datos)
+                        # _segmento mide el archivo en disco para decidir la rotación
+                        f.flush()
+                        self._indexar(conexion, conversacion, nombre, offset, len(datos))
+                        posiciones.append((nombre, offset, len(datos)))
+            finally:
+                for f in archivos.values():
+                    f.close()
+        return posiciones
+
+    def _indexar(self, conexion, conversacion, segmento, offset, largo):
+        fila = [conversacion.get(columna) for columna in COLUMNAS]
+        fila[COLUMNAS.index("matricula")] = normalizar_matricula(conversacion.get("matricula"))
+        conexion.execute(
+            f"INSERT OR REPLACE INTO conversaciones (segmento, offset, largo, {', '.join(COLUMNAS)}) "
+            f"VALUES (?, ?, ?, {', '.join('?' * len(COLUMNAS))})", [segmento, offset, largo] + fila)
+        conexion.execute("DELETE FROM conversaciones_texto WHERE id = ?", (conversacion["id"],))
+        conexion.execute("INSERT INTO conversaciones_texto (id, texto) VALUES (?, ?)",
+                         (conversacion["id"], texto_buscable(conversacion)))
+
+    def _leer(self, segmento, offset, largo):
+        with open(os.path.join(self.directorio, segmento), 'rb') as f:
+            f.seek(offset)
+            datos = f.read(largo)
+        if segmento.endswith('.gz'):
+            datos = gzip.decompress(datos)
+        return json.loads(datos.decode('utf-8'))
+
+    def obtener(self, id_conversacion):
+        """Devuelve una conversación por id, o None si no está archivada"""
+        with self.indice.conexion() as conexion:
+            fila = conexion.execute("SELECT segmento, offset, largo FROM conversaciones WHERE id = ?",
+                                    (id_conversacion,)).fetchone()
+        return self._leer(*fila) if fila else None
+
+    def __contains__(self, id_conversacion):
+        with self.indice.conexion() as conexion:
+            fila = conexion.execute("SELECT 1 FROM conversaciones WHERE id = ?", (id_conversacion,)).fetchone()
+        return fila is not None
+
+    def __len__(self):
+        with self.indice.conexion() as conexion:
+            return conexion.execute("SELECT COUNT(*) FROM conversaciones").fetchone()[0]
+
+    def buscar(self, matricula=None, sistema=None, problema=None, desde=None, hasta=None,
+               texto=None, limite=50, desplazamiento=0, completas=False):
+        """Conversaciones que cumplen todos los filtros, de la más reciente a la más antigua.
+
+        `desde`/`hasta` son fechas AAAA-MM-DD (o con hora) inclusive y `texto`
+        busca palabras en los mensajes del usuario. Los resultados se paginan
+        con `limite` y `desplazamiento`. Devuelve los campos indexados de cada
+        conversación, o las conversaciones completas si `completas`.
+        """
+        condiciones, parametros = [], []
+        for columna, valor in (("matricula", normalizar_matricula(matricula)), ("sistema", sistema),
+                               ("problema", problema)):
+            if valor:
+                condiciones.append(f"{columna} = ?")
+                parametros.append(valor)
+        if desde:
+            condiciones.append("fecha >= ?")
+            parametros.append(desde)
+        if hasta:
+            condiciones.append("fecha <= ?")
+            parametros.append(hasta + " 23:59:59" if len(hasta) == 10 else hasta)
+        if texto and texto.strip():
+            condiciones.append("id IN (SELECT id FROM conversaciones_texto WHERE conversaciones_texto MATCH ?)")
+            parametros.append(consulta_fts(texto))
+
+        sql = f"SELECT segmento, offset, largo, {', '.join(COLUMNAS)} FROM conversaciones"
+        if condiciones:
+            sql += " WHERE " + " AND ".join(condiciones)
+        sql += " ORDER BY fecha DESC, id LIMIT ? OFFSET ?"
+        # SQLite toma un LIMIT negativo como "sin límite": se acota aquí para todos los llamadores
+        with self.indice.conexion() as conexion:
+            filas = conexion.execute(sql, parametros + [max(limite, 0), max(desplazamiento, 0)]).fetchall()
+
+        if completas:
+            return [self._leer(*fila[:3]) for fila in filas]
+        return [dict(zip(COLUMNAS, fila[3:])) for fila in filas]
+
+    def _dias(self):
+        return sorted(d for d in os.listdir(self.directorio) if os.path.isdir(os.path.join(self.directorio, d)))
+
+    def _segmentos_del_dia(self, dia):
+        carpeta = os.path.join(self.directorio, dia)
+        return sorted((f"{dia}/{m.group(0)}" for m in map(PATRON_SEGMENTO.match, os.listdir(carpeta)) if m),
+                      key=lambda nombre: int(PATRON_SEGMENTO.search(nombre).group(1)))
+
+    def _registros(self, segmento):
+        """Genera (offset, largo, conversación) de cada registro de un segmento"""
+        with open(os.path.join(self.directorio, segmento), 'rb') as f:
+            if not segmento.endswith('.gz'):
+                offset = 0
+                for linea in f:
+                    if linea.strip():
+                        yield offset, len(linea), json.loads(linea.decode('utf-8'))
+                    offset += len(linea)
+                return
+            datos = memoryview(f.read())
+        # Un miembro gzip por registro: se descomprime por partes hasta el final de cada miembro
+        posicion = 0
+        while posicion < len(datos):
+            inicio, partes = posicion, []
+            descompresor = zlib.decompressobj(wbits=31)
+            while not descompresor.eof and posicion < len(datos):
+                trozo = datos[posicion:posicion + 65536]
+                partes.append(descompresor.decompress(trozo))
+                posicion += len(trozo)
+            posicion -= len(descompresor.unused_data)
+            yield inicio, posicion - inicio, json.loads(b''.join(partes).decode('utf-8'))
+
+    def recorrer(self, desde=None, hasta=None):
+        """Genera las conversaciones de los días [desde, hasta] (AAAA-MM-DD) sin cargarlas todas"""
+        for dia in self._dias():
+            if (desde and dia < desde[:10]) or (hasta and dia > hasta[:10]):
+                continue
+            for segmento in self._segmentos_del_dia(dia):
+                for _, _, conversacion in self._registros(segmento):
+                    yield conversacion
+
+    def reindexar(self):
+        """Reconstruye el índice completo leyendo todos los segmentos"""
+        with self._lock, self._bloqueo_archivo():
+            with self.indice.conexion(escritura=True) as conexion:
+                conexion.execute("DELETE FROM conversaciones")
+                conexion.execute("DELETE FROM conversaciones_texto")
+                for dia in self._dias():
+                    for segmento in self._segmentos_del_dia(dia):
+                        for offset, largo, conversacion in self._registros(segmento):
+                            self._indexar(conexion, conversacion, segmento, offset, largo)
+
+    def migrar(self, log_dir):
+        """Importa los conv_<id>.json sueltos del formato anterior que no estén en el archivo"""
+        importadas = 0
+        for ruta in sorted(glob.glob(os.path.join(log_dir, 'conv_*.json'))):
+            try:
+                with open(ruta, 'r', encoding='utf-8') as f:
+                    conversacion = json.load(f)
+                if conversacion["id"] not in self:
+                    self.guardar(conversacion)
+                    importadas += 1
+            except Exception as e:
+                print(f"Error al migrar {ruta}: {e}")
+        return importadas
+
+
+if __name__ == "__main__":
+    # Migración: python archivo_conversaciones.py logs
+    log_dir = sys.argv[1] if len(sys.argv) > 1 else "logs"
+    archivo = ArchivoConversaciones(os.path.join(log_dir, 'conversaciones'))
+    cantidad = archivo.migrar(log_dir)
+    print(f"Se importaron {cantidad} conversaciones a {archivo.directorio}; "
+          f"los conv_*.json originales pueden borrarse después de verificar.")
@@ -0,0 +1,145 @@
+"""Punto de entrada ASGI.
+
+Alternativa asíncrona a wsgi.py: un solo proceso puede mantener miles de
+conexiones de webhook abiertas porque cada mensaje se procesa con
+WhatsAppBot.aprocesar_mensaje sin bloquear el event loop.
+
+    uvicorn asgi:app --host 0.0.0.0 --port $PORT
+"""
+import os
+import json
+import asyncio
+from functools import partial
+from urllib.parse import parse_qs
+from bot_simple import WhatsAppBot
+
+bot = WhatsAppBot()
+
+FILTROS_CONVERSACIONES = ('matricula', 'sistema', 'problema', 'desde', 'hasta', 'texto')
+
+with open(os.path.join(os.path.dirname(os.path.abspath(__file__)), 'templates', 'index.html'), 'rb') as f:
+    INDEX_HTML = f.read()
+
+
+async def leer_cuerpo(receive):
+    """Lee el cuerpo completo de la petición HTTP"""
+    cuerpo = b''
+    while True:
+        mensaje = await receive()
+        cuerpo += mensaje.get('body', b'')
+        if not mensaje.get('more_body', False):
+            return cuerpo
+
+
+async def responder(send, estado, contenido, tipo):
+    await send({
+        'type': 'http.response.start',
+        'status': estado,
+        'headers': [(b'content-type', tipo), (b'content-length', str(len(contenido)).encode())]
+    })
+    await send({'type': 'http.response.body', 'body': contenido})
+
+
+async def responder_json(send, datos, estado=200):
+    await responder(send, estado, json.dumps(datos, ensure_ascii=False).encode('utf-8'),
+                    b'application/json; charset=utf-8')
+
+
+async def receive_message(receive, send):
+    try:
+        data = json.loads(await leer_cuerpo(receive) or b'{}')
+    except ValueError:
+        await responder_json(send, {'error': 'JSON inválido'}, 400)
+        return
+    if not isinstance(data, dict):
+        await responder_json(send, {'error': 'Se espera un objeto JSON'}, 400)
+        return
+    message = data.get('message', '')
+    user_id = data.get('user_id', 'web_user')
+
+    response = await bot.aprocesar_mensaje(message, user_id)
+    await responder_json(send, {'response': response})
+
+
+async def receive_messages(receive, send):
+    try:
+        data = json.loads(await leer_cuerpo(receive) or b'{}')
+        messages = [(item.get('user_id', 'web_user'), item.get('message', '')) for item in data.get('messages', [])]
+    except (ValueError, AttributeError, TypeError):
+        await responder_json(send, {'error': 'Se espera {"messages": [{"user_id": ..., "message": ...}]}'}, 400)
+        return
+
+    # procesar_lote reparte los mensajes en el pool del bot y espera los resultados:
+    # se coordina desde el pool por defecto del loop para no ocupar un hilo del bot esperando
+    loop = asyncio.get_running_loop()
+    responses = await loop.run_in_executor(None, bot.procesar_lote, messages)
+    await responder_json(send, {'responses': [
+        {'user_id': user_id, 'response': response}
+        for (user_id, _), response in zip(messages, responses)
+    ]})
+
+
+async def search_conversations(scope, send):
+    parametros = parse_qs(scope.get('query_string', b'').decode('utf-8'))
+    filtros = {clave: parametros[clave][0] for clave in FILTROS_CONVERSACIONES if clave in parametros}
+    try:
+        filtros['limite'] = max(1, min(int(parametros.get('limite', ['50'])[0]), 500))
+        filtros['desplazamiento'] = max(int(parametros.get('desplazamiento', ['0'])[0]), 0)
+    except ValueError:
+        await responder_json(send, {'error': 'limite y desplazamiento deben ser números'}, 400)
+        return
+
+    # La consulta a SQLite es bloqueante: se hace en el pool de hilos del bot
+    loop = asyncio.get_running_loop()
+    conversaciones = await loop.run_in_executor(bot.executor, partial(bot.buscar_conversaciones, **filtros))
+    await responder_json(send, {'conversaciones': conversaciones})
+
+
+async def get_statistics(scope, send):
+    parametros = parse_qs(scope.get('query_string', b'').decode('utf-8'))
+    start_date = parametros.get('start_date', [None])[0]
+    end_date = parametros.get('end_date', [None])[0]
+    loop = asyncio.get_running_loop()
+    try:
+        estadisticas = await loop.run_in_executor(bot.executor, bot.obtener_estadisticas, start_date, end_date)
+    except ValueError as e:
+        await responder_json(send, {'error': str(e)}, 400)
+        return
+    await responder_json(send, estadisticas)
+
+
+async def get_metrics(send):
+    # Las métricas vacían la cola de escritura (escribe a disco): fuera del event loop
+    loop = asyncio.get_running_loop()
+    await responder_json(send, await loop.run_in_executor(bot.executor, bot.obtener_metricas))
+
+
+async def app(scope, receive, send):
+    if scope['type'] == 'lifespan':
+        while True:
+            evento = await receive()
+            if evento['type'] == 'lifespan.startup':
+                await send({'type': 'lifespan.startup.complete'})
+            elif evento['type'] == 'lifespan.shutdown':
+                bot.cerrar()
+                await send({'type': 'lifespan.shutdown.complete'})
+                return
+
+    if scope['type'] != 'http':
+        return
+
+    ruta, metodo = scope['path'], scope['method']
+    if ruta == '/' and metodo == 'GET':
+        await responder(send, 200, INDEX_HTML, b'text/html; charset=utf-8')
+    elif ruta == '/api/message' and metodo == 'POST':
+        await receive_message(receive, send)
+    elif ruta == '/api/messages' and metodo == 'POST':
+        await receive_messages(receive, send)
+    elif ruta == '/api/conversaciones' and metodo == 'GET':
+        await search_conversations(scope, send)
+    elif ruta == '/api/estadisticas' and metodo == 'GET':
+        await get_statistics(scope, send)
+    elif ruta == '/api/metricas' and metodo == 'GET':
+        await get_metrics(send)
+    else:
+        await responder_json(send, {'error': 'No encontrado'}, 404)
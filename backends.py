@@ -0,0 +1,437 @@
+import os
+import json
+import time
+import sqlite3
+import threading
+from collections import deque
+from sesiones import AlmacenSesiones, Sesion
+from diario import DiarioEventos
+
+
+class BackendArchivo:
+    """Backend de un solo proceso: sesiones en memoria y diario de estadísticas en archivos"""
+
+    def __init__(self, ruta_snapshot, ruta_diario):
+        self.ruta_snapshot = ruta_snapshot
+        self.ruta_diario = ruta_diario
+
+    def abrir_sesiones(self, ttl, capacidad, max_historial, al_expirar):
+        return AlmacenSesiones(ttl=ttl, capacidad=capacidad, max_historial=max_historial, al_expirar=al_expirar)
+
+    def abrir_diario(self, obtener_estado):
+        return DiarioEventos(self.ruta_snapshot, self.ruta_diario, obtener_estado)
+
+
+class BackendMemoria:
+    """Backend completamente en memoria, pensado para pruebas.
+
+    Varias instancias de WhatsAppBot que compartan el mismo BackendMemoria se
+    comportan como workers que comparten estado: ven las mismas sesiones y los
+    eventos de estadísticas de los demás.
+    """
+
+    def __init__(self):
+        self._sesiones = None
+        self._eventos = []
+
+    def abrir_sesiones(self, ttl, capacidad, max_historial, al_expirar):
+        if self._sesiones is None:
+            self._sesiones = AlmacenSesiones(ttl=ttl, capacidad=capacidad, max_historial=max_historial)
+        self._sesiones.al_expirar = al_expirar
+        return self._sesiones
+
+    def abrir_diario(self, obtener_estado):
+        return DiarioMemoria(self._eventos, obtener_estado)
+
+
+class BaseSQLite:
+    """Base SQLite en modo WAL con una conexión por hilo"""
+
+    def __init__(self, ruta):
+        self.ruta = ruta
+        self._local = threading.local()
+
+    def conexion(self, escritura=False):
+        """Transacción sobre la conexión propia del hilo actual (sqlite3 no comparte conexiones entre hilos)"""
+        conexion = getattr(self._local, 'conexion', None)
+        if conexion is None:
+            conexion = sqlite3.connect(self.ruta, timeout=30, isolation_level=None)
+            conexion.execute("PRAGMA journal_mode=WAL")
+            conexion.execute("PRAGMA synchronous=NORMAL")
+            self._local.conexion = conexion
+        return _Transaccion(conexion, escritura)
+
+
+class BackendSQLite(BaseSQLite):
+    """Backend compartido entre procesos sobre una base SQLite en modo WAL.
+
+    Permite correr varios workers de gunicorn: cada mensaje carga la sesión
+    del usuario desde la base y la guarda al terminar, y los eventos de
+    estadísticas de todos los workers van a una misma tabla.
+    """
+
+    def __init__(self, ruta):
+        super().__init__(ruta)
+        with self.conexion(escritura=True) as conexion:
+            conexion.execute("""
+                CREATE TABLE IF NOT EXISTS sesiones (
+                    id_usuario TEXT PRIMARY KEY,
+                    contexto TEXT NOT NULL,
+                    historial TEXT NOT NULL,
+                    ultimo_acceso REAL NOT NULL,
+                    version INTEGER NOT NULL DEFAULT 1
+                )
+            """)
+            # Bases creadas antes de versionar las sesiones
+            columnas = {fila[1] for fila in conexion.execute("PRAGMA table_info(sesiones)")}
+            if 'version' not in columnas:
+                conexion.execute("ALTER TABLE sesiones ADD COLUMN version INTEGER NOT NULL DEFAULT 1")
+            conexion.execute("CREATE INDEX IF NOT EXISTS idx_sesiones_acceso ON sesiones (ultimo_acceso)")
+            conexion.execute("""
+                CREATE TABLE IF NOT EXISTS eventos (
+                    seq INTEGER PRIMARY KEY AUTOINCREMENT,
+                    evento TEXT NOT NULL
+                )
+            """)
+            conexion.execute("""
+                CREATE TABLE IF NOT EXISTS snapshot (
+                    id INTEGER PRIMARY KEY CHECK (id = 1),
+                    seq INTEGER NOT NULL,
+                    estado TEXT NOT NULL
+                )
+            """)
+
+    def abrir_sesiones(self, ttl, capacidad, max_historial, al_expirar):
+        return SesionesSQLite(self, ttl, capacidad, max_historial, al_expirar)
+
+    def abrir_diario(self, obtener_estado):
+        return DiarioSQLite(self, obtener_estado)
+
+
+class _Transaccion:
+    """Context manager que abre una transacción (de escritura si se pide) sobre la conexión"""
+
+    def __init__(self, conexion, escritura):
+        self.conexion = conexion
+        self.escritura = escritura
+
+    def __enter__(self):
+        self.conexion.execute("BEGIN IMMEDIATE" if self.escritura else "BEGIN")
+        return self.conexion
+
+    def __exit__(self, tipo, valor, traza):
+        self.conexion.execute("ROLLBACK" if tipo else "COMMIT")
+
+
+class SesionSQLite(Sesion):
+    """Sesión leída de la base, con la versión y el contenido que tenía al cargarla"""
+
+    __slots__ = ('version', 'contexto_cargado', 'historial_cargado')
+
+    def __init__(self, max_historial, contexto=None, historial=(), ultimo_acceso=None, version=0):
+        super().__init__(max_historial, contexto, historial, ultimo_acceso)
+        self.version = version
+        # Copias en JSON para calcular qué cambió este worker si otro guardó antes
+        self.contexto_cargado = json.dumps(self.contexto, ensure_ascii=False)
+        self.historial_cargado = json.dumps(list(self.historial), ensure_ascii=False)
+
+    def mensajes_nuevos(self):
+        """Mensajes agregados al historial desde que se cargó (el historial solo crece por el final)"""
+        actual = list(self.historial)
+        cargado = json.loads(self.historial_cargado)
+        for nuevos in range(len(actual) + 1):
+            comunes = len(actual) - nuevos
+            if comunes == 0 or actual[:comunes] == cargado[-comunes:]:
+                return actual[comunes:]
+
+    def combinar_contexto(self, contexto_base):
+        """Aplica sobre el contexto guardado por otro worker solo las claves que cambió este"""
+        cargado = json.loads(self.contexto_cargado)
+        combinado = dict(contexto_base)
+        for clave in cargado.keys() | self.contexto.keys():
+            if clave not in self.contexto:
+                combinado.pop(clave, None)
+            elif clave not in cargado or cargado[clave] != self.contexto[clave]:
+                combinado[clave] = self.contexto[clave]
+        return combinado
+
+
+class SesionesSQLite:
+    """Sesiones guardadas en SQLite; misma interfaz que AlmacenSesiones.
+
+    Cada fila lleva una versión. `guardar` la compara al escribir: si otro
+    worker guardó la misma sesión mientras tanto, se combinan los cambios de
+    ambos en vez de pisarlos, y si la purga ya la archivó solo se vuelven a
+    guardar los mensajes nuevos, para no archivarlos dos veces. `en_uso` se
+    acepta por compatibilidad: la purga puede correr en otro worker, que no
+    sabe qué mensajes están en proceso.
+    """
+
+    def __init__(self, backend, ttl, capacidad, max_historial, al_expirar, intervalo_purga=30):
+        self.backend = backend
+        self.ttl = ttl
+        self.capacidad = capacidad
+        self.max_historial = max_historial
+        self.al_expirar = al_expirar
+        self.intervalo_purga = intervalo_purga
+        self._ultima_purga = 0
+
+    def __iter__(self):
+        with self.backend.conexion() as conexion:
+            filas = conexion.execute("SELECT id_usuario FROM sesiones").fetchall()
+        return iter([fila[0] for fila in filas])
+
+    def __len__(self):
+        with self.backend.conexion() as conexion:
+            return conexion.execute("SELECT COUNT(*) FROM sesiones").fetchone()[0]
+
+    def __contains__(self, id_usuario):
+        return self.buscar(id_usuario) is not None
+
+    def buscar(self, id_usuario):
+        """Lee la sesión del usuario desde la base, o None si no existe"""
+        with self.backend.conexion() as conexion:
+            fila = conexion.execute(
+                "SELECT contexto, historial, ultimo_acceso, version FROM sesiones WHERE id_usuario = ?",
+                (id_usuario,)
+            ).fetchone()
+        if fila is None:
+            return None
+        return SesionSQLite(self.max_historial, json.loads(fila[0]), json.loads(fila[1]), fila[2], fila[3])
+
+    def cargar(self, id_usuario, en_uso=False):
+        """Lee la sesión del usuario (o crea una nueva) y purga periódicamente las expiradas"""
+        if time.time() - self._ultima_purga >= self.intervalo_purga:
+            self.purgar()
+        sesion = self.buscar(id_usuario)
+        if sesion is None:
+            sesion = SesionSQLite(self.max_historial, ultimo_acceso=time.time())
+        return sesion
+
+    def guardar(self, id_usuario, sesion):
+        """Escribe la sesión en la base para que cualquier worker pueda continuarla.
+
+        Compare-and-swap sobre la versión leída en `cargar`; si no coincide se
+        combina con lo que hay en la base dentro de la misma transacción.
+        """
+        if not isinstance(sesion, SesionSQLite):
+            # Sesión armada fuera del almacén: todo su contenido cuenta como cambio propio
+            propia = SesionSQLite(self.max_historial)
+            propia.contexto, propia.historial = sesion.contexto, deque(sesion.historial, maxlen=self.max_historial)
+            sesion = propia
+        sesion.ultimo_acceso = time.time()
+        contexto, historial = sesion.contexto, list(sesion.historial)
+        with self.backend.conexion(escritura=True) as conexion:
+            version = sesion.version + 1
+            actualizada = sesion.version and conexion.execute(
+                "UPDATE sesiones SET contexto = ?, historial = ?, ultimo_acceso = ?, version = ? "
+                "WHERE id_usuario = ? AND version = ?",
+                (json.dumps(contexto, ensure_ascii=False), json.dumps(historial, ensure_ascii=False),
+                 sesion.ultimo_acceso, version, id_usuario, sesion.version)
+            ).rowcount
+            if not actualizada:
+                fila = conexion.execute("SELECT contexto, historial, version FROM sesiones WHERE id_usuario = ?",
+                                        (id_usuario,)).fetchone()
+                if fila is None:
+                    # La purga la archivó mientras se procesaba: solo quedan pendientes los mensajes nuevos
+                    if sesion.version:
+                        historial = sesion.mensajes_nuevos()
+                    version = 1
+                else:
+                    # Otro worker la guardó antes: se combinan los cambios de ambos
+                    contexto = sesion.combinar_contexto(json.loads(fila[0]))
+                    historial = (json.loads(fila[1]) + sesion.mensajes_nuevos())[-self.max_historial:]
+                    version = fila[2] + 1
+                conexion.execute(
+                    "INSERT INTO sesiones (id_usuario, contexto, historial, ultimo_acceso, version) "
+                    "VALUES (?, ?, ?, ?, ?) ON CONFLICT (id_usuario) DO UPDATE SET contexto = excluded.contexto, "
+                    "historial = excluded.historial, ultimo_acceso = excluded.ultimo_acceso, "
+                    "version = excluded.version",
+                    (id_usuario, json.dumps(contexto, ensure_ascii=False), json.dumps(historial, ensure_ascii=False),
+                     sesion.ultimo_acceso, version)
+                )
+        # Lo guardado pasa a ser la base de un próximo guardar del mismo objeto
+        sesion.contexto = contexto
+        sesion.historial = deque(historial, maxlen=self.max_historial)
+        sesion.version = version
+        sesion.contexto_cargado = json.dumps(contexto, ensure_ascii=False)
+        sesion.historial_cargado = json.dumps(historial, ensure_ascii=False)
+
+    def purgar(self):
+        """Elimina de la base las sesiones inactivas y las que excedan la capacidad"""
+        self._ultima_purga = time.time()
+        with self.backend.conexion(escritura=True) as conexion:
+            filas = conexion.execute(
+                "SELECT id_usuario, contexto, historial, ultimo_acceso, version FROM sesiones "
+                "WHERE ultimo_acceso < ? OR id_usuario IN ("
+                "  SELECT id_usuario FROM sesiones ORDER BY ultimo_acceso DESC LIMIT -1 OFFSET ?)",
+                (time.time() - self.ttl, self.capacidad)
+            ).fetchall()
+            # Solo se archiva lo que efectivamente se borró: si la sesión se guardó de nuevo, sigue viva
+            borradas = [fila[:4] for fila in filas if conexion.execute(
+                "DELETE FROM sesiones WHERE id_usuario = ? AND ultimo_acceso <= ? AND version = ?",
+                (fila[0], fila[3], fila[4])
+            ).rowcount]
+        self._expulsar(borradas)
+
+    def vaciar(self):
+        """Al detener un worker no se borra nada: las sesiones siguen disponibles para los demás"""
+
+    def _expulsar(self, filas):
+        for id_usuario, contexto, historial, ultimo_acceso in filas:
+            if self.al_expirar:
+                sesion = Sesion(self.max_historial, json.loads(contexto), json.loads(historial), ultimo_acceso)
+                try:
+                    self.al_expirar(id_usuario, sesion)
+                except Exception as e:
+                    print(f"Error al guardar sesión expirada de {id_usuario}: {e}")
+
+
+class DiarioCompartido:
+    """Base para diarios cuyos eventos pueden escribir varios workers.
+
+    Cada worker aplica sus propios eventos de inmediato y con `actualizar`
+    incorpora los de los demás en orden de secuencia, omitiendo los propios.
+    Las subclases implementan el acceso al almacenamiento.
+    """
+
+    def __init__(self, obtener_estado, eventos_por_snapshot=1000):
+        self.obtener_estado = obtener_estado
+        self.eventos_por_snapshot = eventos_por_snapshot
+        self.secuencia = 0
+        self._propios = set()
+        self._eventos_desde_snapshot = 0
+        self._estado_inicial = None
+        self._aplicar = None
+
+    def cargar(self, estado_inicial, aplicar):
+        """Carga el snapshot compartido y reproduce los eventos posteriores"""
+        self._estado_inicial = estado_inicial
+        self._aplicar = aplicar
+        estado = estado_inicial()
+        secuencia, snapshot = self._leer_snapshot()
+        if snapshot:
+            estado.update(snapshot)
+        self.secuencia = secuencia
+        self._propios.clear()
+        self.actualizar(estado, aplicar)
+        return estado
+
+    def registrar(self, evento):
+        """Anexa un evento ya aplicado localmente"""
+        self.registrar_lote([evento])
+
+    def registrar_lote(self, eventos):
+        """Anexa varios eventos ya aplicados localmente en una sola transacción"""
+        if not eventos:
+            return
+        for seq in self._anexar(eventos):
+            if seq == self.secuencia + 1:
+                self.secuencia = seq
+            else:
+                # Hay eventos de otros workers sin aplicar; este se omitirá al actualizar
+                self._propios.add(seq)
+        self._eventos_desde_snapshot += len(eventos)
+        if self._eventos_desde_snapshot >= self.eventos_por_snapshot:
+            self.compactar()
+
+    def actualizar(self, estado, aplicar):
+        """Aplica sobre `estado` los eventos registrados por otros workers"""
+        secuencia_snapshot, snapshot = self._leer_snapshot(solo_secuencia=True)
+        if secuencia_snapshot > self.secuencia:
+            # Otro worker compactó eventos que aún no vimos: recargar desde el snapshot
+            recargado = self.cargar(self._estado_inicial, aplicar)
+            estado.clear()
+            estado.update(recargado)
+            return
+        for seq, evento in self._leer_eventos(self.secuencia):
+            if seq in self._propios:
+                self._propios.discard(seq)
+            else:
+                aplicar(estado, evento)
+            self.secuencia = seq
+
+    def sincronizar(self):
+        pass
+
+    def cerrar(self):
+        pass
+
+
+class DiarioSQLite(DiarioCompartido):
+    """Diario de eventos compartido en las tablas `eventos` y `snapshot` de SQLite"""
+
+    def __init__(self, backend, obtener_estado, eventos_por_snapshot=1000):
+        super().__init__(obtener_estado, eventos_por_snapshot)
+        self.backend = backend
+
+    def _leer_snapshot(self, solo_secuencia=False):
+        with self.backend.conexion() as conexion:
+            fila = conexion.execute(
+                "SELECT seq, " + ("NULL" if solo_secuencia else "estado") + " FROM snapshot WHERE id = 1"
+            ).fetchone()
+        if fila is None:
+            return 0, None
+        return fila[0], json.loads(fila[1]) if fila[1] else None
+
+    def _leer_eventos(self, desde):
+        with self.backend.conexion() as conexion:
+            filas = conexion.execute("SELECT seq, evento FROM eventos WHERE seq > ? ORDER BY seq", (desde,)).fetchall()
+        return [(seq, json.loads(evento)) for seq, evento in filas]
+
+    def _anexar(self, eventos):
+        with self.backend.conexion(escritura=True) as conexion:
+            return [conexion.execute("INSERT INTO eventos (evento) VALUES (?)",
+                                     (json.dumps(evento, ensure_ascii=False),)).lastrowid
+                    for evento in eventos]
+
+    def compactar(self):
+        """Guarda el estado como snapshot compartido y borra los eventos que incluye"""
+        estado = self.obtener_estado()
+        with self.backend.conexion(escritura=True) as conexion:
+            # Con la transacción de escritura abierta nadie más puede anexar eventos
+            for seq, evento in [(seq, json.loads(evento)) for seq, evento in conexion.execute(
+                    "SELECT seq, evento FROM eventos WHERE seq > ? ORDER BY seq", (self.secuencia,))]:
+                if seq in self._propios:
+                    self._propios.discard(seq)
+                elif self._aplicar:
+                    self._aplicar(estado, evento)
+                self.secuencia = seq
+            conexion.execute(
+                "INSERT INTO snapshot (id, seq, estado) VALUES (1, ?, ?) "
+                "ON CONFLICT (id) DO UPDATE SET seq = excluded.seq, estado = excluded.estado",
+                (self.secuencia, json.dumps(estado, ensure_ascii=False))
+            )
+            conexion.execute("DELETE FROM eventos WHERE seq <= ?", (self.secuencia,))
+        self._eventos_desde_snapshot = 0
+
+
+class DiarioMemoria(DiarioCompartido):
+    """Diario compartido en una lista en memoria (para pruebas)"""
+
+    def __init__(self, eventos, obtener_estado, eventos_por_snapshot=1000):
+        super().__init__(obtener_estado, eventos_por_snapshot)
+        self._eventos = eventos
+
+    def _leer_snapshot(self, solo_secuencia=False):
+        return 0, None
+
+    def _leer_eventos(self, desde):
+        return self._eventos[desde:]
+
+    def _anexar(self, eventos):
+        secuencias = []
+        for evento in eventos:
+            self._eventos.append((len(self._eventos) + 1, json.loads(json.dumps(evento))))
+            secuencias.append(len(self._eventos))
+        return secuencias
+
+    def compactar(self):
+        self._eventos_desde_snapshot = 0
+
+
+def crear_backend(log_dir, stats_file, journal_file):
+    """Elige el backend según BOT_BACKEND ('archivo' por defecto o 'sqlite')"""
+    if os.environ.get('BOT_BACKEND', 'archivo').lower() == 'sqlite':
+        return BackendSQLite(os.environ.get('BOT_SQLITE', os.path.join(log_dir, 'bot_estado.db')))
+    return BackendArchivo(os.path.join(log_dir, stats_file), os.path.join(log_dir, journal_file))
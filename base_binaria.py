@@ -0,0 +1,193 @@
+import os
+import sys
+import json
+import mmap
+import struct
+
+from indice_manual import BuscadorBM25, IndiceBM25
+
+MAGIA = b'MKB1'
+ENTERO = struct.Struct('<I')
+OFFSET = struct.Struct('<Q')
+RANGO = struct.Struct('<QQ')
+POSTING = struct.Struct('<If')
+
+# Bloques del archivo, en orden, después del encabezado
+BLOQUES = ('offsets_secciones', 'secciones', 'ids', 'offsets_terminos', 'terminos',
+           'offsets_postings', 'postings')
+
+
+def _offsets(longitudes):
+    """Tabla de offsets acumulados (n + 1 valores) empaquetada"""
+    tabla = bytearray(OFFSET.size * (len(longitudes) + 1))
+    posicion = 0
+    for i, longitud in enumerate(longitudes):
+        OFFSET.pack_into(tabla, OFFSET.size * i, posicion)
+        posicion += longitud
+    OFFSET.pack_into(tabla, OFFSET.size * len(longitudes), posicion)
+    return bytes(tabla)
+
+
+def escribir_base_binaria(ruta, knowledge_base):
+    """Guarda la base en formato binario compacto, de forma atómica.
+
+    Formato: MAGIA, largo del directorio (u32) y un directorio JSON con las
+    claves (sistema, problema) y la posición de cada bloque. Los bloques son
+    la tabla de secciones sin repetir (offsets u64 + UTF-8), los ids de sección
+    de cada clave (u32), los términos ordenados (offsets u64 + UTF-8) y sus
+    postings BM25 (pares u32 sección, f32 peso).
+    """
+    indice = IndiceBM25.desde_base(knowledge_base)
+    secciones = [seccion.encode('utf-8') for seccion in indice.secciones]
+    terminos = sorted(indice.postings)
+    terminos_utf8 = [termino.encode('utf-8') for termino in terminos]
+
+    claves = {}
+    ids = []
+    for (sistema, problema), documentos in indice.por_etiqueta.items():
+        claves.setdefault(sistema, {})[problema] = [len(ids), len(documentos)]
+        ids.extend(documentos)
+
+    postings = []
+    cantidades = []
+    for termino in terminos:
+        lista = indice.postings[termino]
+        cantidades.append(len(lista) * POSTING.size)
+        postings.extend(POSTING.pack(doc_id, peso) for doc_id, peso in lista)
+
+    contenido = {
+        'offsets_secciones': _offsets([len(s) for s in secciones]),
+        'secciones': b''.join(secciones),
+        'ids': struct.pack(f'<{len(ids)}I', *ids),
+        'offsets_terminos': _offsets([len(t) for t in terminos_utf8]),
+        'terminos': b''.join(terminos_utf8),
+        'offsets_postings': _offsets(cantidades),
+        'postings': b''.join(postings)
+    }
+    posiciones = {}
+    posicion = 0
+    for bloque in BLOQUES:
+        posiciones[bloque] = posicion
+        posicion += len(contenido[bloque])
+
+    directorio = json.dumps({
+        'version': 1,
+        'secciones': len(secciones),
+        'terminos': len(terminos),
+        'claves': claves,
+        'bloques': posiciones
+    }, ensure_ascii=False).encode('utf-8')
+
+    ruta_temporal = ruta + '.tmp'
+    with open(ruta_temporal, 'wb') as f:
+        f.write(MAGIA)
+        f.write(ENTERO.pack(len(directorio)))
+        f.write(directorio)
+        for bloque in BLOQUES:
+            f.write(contenido[bloque])
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(ruta_temporal, ruta)
+
+
+class BaseBinaria(BuscadorBM25):
+    """Base de conocimiento de solo lectura sobre un archivo .mkb mapeado en memoria.
+
+    Al abrirla solo se lee el directorio (las claves sistema/problema), así
+    el arranque no depende del tamaño del manual; las secciones y los postings
+    se leen del mapeo cuando una consulta los necesita y el sistema operativo
+    solo trae a memoria las páginas tocadas.
+    """
+
+    def __init__(self, ruta):
+        self.ruta = ruta
+        with open(ruta, 'rb') as f:
+            self._mapa = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        if self._mapa[:4] != MAGIA:
+            self._mapa.close()
+            raise ValueError(f"{ruta} no es una base de conocimiento binaria")
+        largo = ENTERO.unpack_from(self._mapa, 4)[0]
+        inicio = 8 + largo
+        self.directorio = json.loads(self._mapa[8:inicio].decode('utf-8'))
+        self._bloques = {bloque: inicio + posicion for bloque, posicion in self.directorio['bloques'].items()}
+        self._total_terminos = self.directorio['terminos']
+
+    def cerrar(self):
+        self._mapa.close()
+
+    def _rango(self, bloque_offsets, i):
+        """Inicio y fin del elemento i según su tabla de offsets"""
+        return RANGO.unpack_from(self._mapa, self._bloques[bloque_offsets] + OFFSET.size * i)
+
+    def _seccion(self, doc_id):
+        desde, hasta = self._rango('offsets_secciones', doc_id)
+        base = self._bloques['secciones']
+        return self._mapa[base + desde:base + hasta].decode('utf-8')
+
+    def _termino(self, i):
+        desde, hasta = self._rango('offsets_terminos', i)
+        base = self._bloques['terminos']
+        return self._mapa[base + desde:base + hasta]
+
+    def _ids(self, sistema, problema):
+        posicion = self.directorio['claves'].get(sistema, {}).get(problema)
+        if posicion is None:
+            return []
+        inicio, cantidad = posicion
+        return list(struct.unpack_from(f'<{cantidad}I', self._mapa, self._bloques['ids'] + 4 * inicio))
+
+    def _postings(self, termino):
+        # Búsqueda binaria sobre los términos ordenados (el orden de UTF-8 es el de los caracteres)
+        buscado = termino.encode('utf-8')
+        bajo, alto = 0, self._total_terminos
+        while bajo < alto:
+            medio = (bajo + alto) // 2
+            if self._termino(medio) < buscado:
+                bajo = medio + 1
+            else:
+                alto = medio
+        if bajo == self._total_terminos or self._termino(bajo) != buscado:
+            return ()
+        desde, hasta = self._rango('offsets_postings', bajo)
+        base = self._bloques['postings']
+        return POSTING.iter_unpack(self._mapa[base + desde:base + hasta])
+
+    def _candidatos(self, sistema, problema):
+        ids = self._ids(sistema, problema)
+        return ids, set(ids)
+
+
+def abrir_base(ruta_json):
+    """Abre una base de conocimiento para consultas, sin cargar el stack de ingesta.
+
+    Usa la versión binaria (.mkb) si existe y no es más vieja que el JSON; si
+    no, carga el JSON en un IndiceBM25. Devuelve None si no hay ninguna.
+    """
+    ruta_binaria = os.path.splitext(ruta_json)[0] + '.mkb'
+    if os.path.exists(ruta_binaria) and (
+            not os.path.exists(ruta_json) or os.path.getmtime(ruta_binaria) >= os.path.getmtime(ruta_json)):
+        try:
+            return BaseBinaria(ruta_binaria)
+        except Exception as e:
+            print(f"Error al abrir la base binaria {ruta_binaria}: {e}")
+    if not os.path.exists(ruta_json):
+        return None
+    try:
+        with open(ruta_json, 'r', encoding='utf-8') as f:
+            base = IndiceBM25.desde_base(json.load(f))
+        print(f"Base de conocimiento cargada desde {ruta_json}")
+        return base
+    except Exception as e:
+        print(f"Error al cargar la base de conocimiento: {e}")
+        return None
+
+
+if __name__ == "__main__":
+    # Convierte una base JSON existente: python base_binaria.py logs/knowledge_base.json
+    for ruta_json in sys.argv[1:]:
+        with open(ruta_json, 'r', encoding='utf-8') as f:
+            base = json.load(f)
+        ruta_binaria = os.path.splitext(ruta_json)[0] + '.mkb'
+        escribir_base_binaria(ruta_binaria, base)
+        print(f"Base binaria guardada en {ruta_binaria} ({os.path.getsize(ruta_binaria)} bytes, "
+              f"JSON: {os.path.getsize(ruta_json)} bytes)")
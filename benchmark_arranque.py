@@ -0,0 +1,59 @@
+import os
+import sys
+import json
+import time
+import tempfile
+import statistics
+import subprocess
+
+# Se ejecuta en un proceso nuevo para medir un arranque en frío real
+PROGRAMA = r'''
+import sys
+import json
+import time
+inicio = time.perf_counter()
+from bot_simple import WhatsAppBot
+importado = time.perf_counter()
+bot = WhatsAppBot()
+creado = time.perf_counter()
+bot.procesar_mensaje("El APU no arranca en CC-ABC", "benchmark")
+respondido = time.perf_counter()
+pesados = [modulo for modulo in ("PyPDF2", "nltk") if modulo in sys.modules]
+print(json.dumps({"importar": importado - inicio, "crear_bot": creado - importado,
+                  "primera_respuesta": respondido - creado, "pesados": pesados}))
+'''
+
+
+def medir_arranque(directorio_logs=None):
+    """Arranca el bot en un proceso nuevo y devuelve los tiempos de cada etapa (segundos)"""
+    raiz = os.path.dirname(os.path.abspath(__file__))
+    entorno = dict(os.environ, PYTHONPATH=raiz + os.pathsep + os.environ.get('PYTHONPATH', ''))
+    with tempfile.TemporaryDirectory() as directorio:
+        if directorio_logs:
+            # El bot lee logs/ relativo al directorio de trabajo
+            os.symlink(os.path.abspath(directorio_logs), os.path.join(directorio, 'logs'))
+        inicio = time.perf_counter()
+        salida = subprocess.run([sys.executable, '-c', PROGRAMA], cwd=directorio, env=entorno,
+                                capture_output=True, text=True, check=True).stdout
+        total = time.perf_counter() - inicio
+    tiempos = json.loads(salida.strip().splitlines()[-1])
+    tiempos["total"] = total
+    return tiempos
+
+
+def main():
+    repeticiones = int(sys.argv[1]) if len(sys.argv) > 1 else 5
+    directorio_logs = sys.argv[2] if len(sys.argv) > 2 else None
+    mediciones = [medir_arranque(directorio_logs) for _ in range(repeticiones)]
+
+    print(f"Arranque en frío hasta la primera respuesta ({repeticiones} corridas, mediana):")
+    for etapa in ("importar", "crear_bot", "primera_respuesta", "total"):
+        valores = [medicion[etapa] for medicion in mediciones]
+        print(f"  {etapa:<18} {statistics.median(valores) * 1000:8.1f} ms  (máx {max(valores) * 1000:.1f} ms)")
+    pesados = sorted({modulo for medicion in mediciones for modulo in medicion["pesados"]})
+    if pesados:
+        print(f"  ATENCIÓN: el arranque importó {', '.join(pesados)}")
+
+
+if __name__ == "__main__":
+    main()
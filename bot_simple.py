@@ -1,41 +1,34 @@
 import os
 import re
-import json
 from datetime import datetime
-from collections import defaultdict
 import random
 import time
 import uuid
-from pdf_knowledge import ManualKnowledge
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from almacen_manuales import AlmacenManuales
+from agregados import inicializar_agregados, acumular_evento, consultar_rango, reconstruir_conversaciones
+from latencias import nuevo_histograma, registrar_latencia, combinar_histogramas, resumir_histograma
+from sesiones import VistaContextos, VistaHistoriales
+from analisis import MensajeAnalizado
+from backends import crear_backend
+from archivo_conversaciones import ArchivoConversaciones
+from escritor import EscritorDiferido
+from plantillas import PLANTILLAS, RegistroPlantillas
+from configuracion import ConfiguracionRecargable
+
+# Ramas de respuesta con histograma de latencia propio
+RAMAS = ('encuesta', 'agente', 'automatica', 'manual', 'fallback', 'otros')
+
 
 class WhatsAppBot:
-    def __init__(self):
-        # Sistemas y problemas con palabras clave expandidas
-        self.sistemas = {
-            'APU': ['apu', 'auxiliary', 'auxiliar', 'power unit', 'unidad auxiliar'],
-            'MOTOR': ['motor', 'engine', 'engines', 'powerplant', 'motores', 'turbina', 'propulsor', 'n1', 'n2'],
-            'TREN': ['tren', 'gear', 'landing', 'lgear', 'ruedas', 'aterrizaje', 'mlg', 'nlg', 'llantas'],
-            'HIDRAULICO': ['hidraulico', 'hydraulic', 'hyd', 'presion', 'fluido', 'fluid', 'presión', 'bomba', 'pump'],
-            'ELECTRICO': ['electrico', 'electrical', 'power', 'bateria', 'energia', 'battery', 'electric', 'luz', 'light'],
-            'CABINA': ['cabina', 'cabin', 'pax', 'pasajeros', 'passenger', 'asientos', 'seats', 'oxigeno', 'oxygen'],
-            'GALLEY': ['galley', 'cocina', 'catering', 'comida', 'food', 'bebida', 'drink', 'horno', 'oven']
-        }
-        
-        # Problemas con frases completas
-        self.problemas = {
-            'NO_ARRANCA': ['no arranca', 'no enciende', 'no prende', 'falla arranque', 'problema arranque', 
-                          'won\'t start', 'no start', 'failed to start', 'start failure'],
-            'NO_FUNCIONA': ['no funciona', 'no opera', 'inoperativo', 'falla', 'mal funcionamiento', 
-                           'not working', 'inoperative', 'failure', 'malfunction', 'broken'],
-            'ERROR': ['error', 'warning', 'alerta', 'mensaje', 'indicacion', 'luz', 'indication', 
-                     'light', 'caution', 'fault', 'code', 'código'],
-            'REVISAR': ['revisar', 'verificar', 'chequear', 'check', 'inspeccionar', 'inspect', 
-                       'review', 'examine', 'test', 'probar']
-        }
-        
-        # Historial de conversaciones
-        self.conversaciones = defaultdict(list)
-        self.contexto_actual = {}
+    def __init__(self, backend=None):
+        # Vocabulario de detección y respuestas: se leen de configuracion.json (o BOT_CONFIG)
+        # y se recargan solos cuando cambia el archivo, sin reiniciar los workers
+        self.configuracion = ConfiguracionRecargable(
+            os.environ.get('BOT_CONFIG'),
+            intervalo=float(os.environ.get('BOT_CONFIG_INTERVALO', 2.0)),
+            al_cambiar=self._aplicar_configuracion)
         
         # Cargar respuestas predefinidas
         self.respuestas_comunes = {
@@ -44,120 +37,159 @@ class WhatsAppBot:
             'agradecimiento': ['De nada', 'Con gusto', 'Para servirte', 'Estamos para ayudar']
         }
         
-        # Respuestas automatizadas para casos comunes
-        self.respuestas_automaticas = {
-            ('APU', 'NO_ARRANCA'): [
-                "Para problemas de arranque de APU, verifica lo siguiente:\n\n"
-                "1. Asegúrate que el interruptor de batería esté en posición ON\n"
-                "2. Verifica que el nivel de combustible sea adecuado\n"
-                "3. Comprueba que no haya mensajes de error en el ECAM/EICAS\n"
-                "4. Intenta un ciclo completo de apagado y encendido\n\n"
-                "Si el problema persiste, proporciona más detalles para ayudarte mejor."
-            ],
-            ('MOTOR', 'NO_ARRANCA'): [
-                "Para problemas de arranque de motor, verifica lo siguiente:\n\n"
-                "1. Asegúrate que el suministro de combustible sea adecuado\n"
-                "2. Verifica que el sistema de ignición esté funcionando correctamente\n"
-                "3. Comprueba que no haya mensajes de error en el ECAM/EICAS\n"
-                "4. Revisa el procedimiento de arranque en el manual\n\n"
-                "Si el problema persiste, proporciona más detalles para ayudarte mejor."
-            ],
-            ('TREN', 'NO_FUNCIONA'): [
-                "Para problemas con el tren de aterrizaje, verifica lo siguiente:\n\n"
-                "1. Comprueba el sistema hidráulico y nivel de presión\n"
-                "2. Verifica que no haya obstrucciones mecánicas\n"
-                "3. Revisa los indicadores de posición del tren\n"
-                "4. Considera usar el sistema de extensión de emergencia si es necesario\n\n"
-                "Si el problema persiste, proporciona más detalles para ayudarte mejor."
-            ],
-            ('HIDRAULICO', 'ERROR'): [
-                "Para problemas con el sistema hidráulico, verifica lo siguiente:\n\n"
-                "1. Comprueba el nivel de fluido hidráulico\n"
-                "2. Verifica que no haya fugas visibles\n"
-                "3. Revisa la presión del sistema\n"
-                "4. Comprueba el funcionamiento de las bombas\n\n"
-                "Si el problema persiste, proporciona más detalles para ayudarte mejor."
-            ],
-            ('ELECTRICO', 'ERROR'): [
-                "Para problemas con el sistema eléctrico, verifica lo siguiente:\n\n"
-                "1. Comprueba los disyuntores (circuit breakers)\n"
-                "2. Verifica el estado de las baterías\n"
-                "3. Revisa las conexiones de los generadores\n"
-                "4. Comprueba los buses eléctricos principales\n\n"
-                "Si el problema persiste, proporciona más detalles para ayudarte mejor."
-            ],
-            ('GALLEY', 'NO_FUNCIONA'): [
-                "Para problemas con el galley, verifica lo siguiente:\n\n"
-                "1. Comprueba que el interruptor de alimentación esté activado\n"
-                "2. Verifica que el sistema eléctrico del galley esté operativo\n"
-                "3. Revisa los disyuntores específicos del galley\n"
-                "4. Comprueba las conexiones de los equipos\n\n"
-                "Si el problema persiste, proporciona más detalles para ayudarte mejor."
-            ]
-        }
-        
-        # Respuestas para problemas específicos
-        self.respuestas_especificas = {
-            'apu overheat': "Para un mensaje de APU OVERHEAT:\n\n"
-                           "1. Apaga el APU inmediatamente\n"
-                           "2. Verifica posibles fugas de fluidos alrededor del APU\n"
-                           "3. Espera al menos 30 minutos para enfriamiento\n"
-                           "4. Consulta el MEL para determinar si el vuelo puede continuar\n\n"
-                           "Este problema requiere inspección de mantenimiento antes del próximo vuelo.",
-            
-            'low oil pressure': "Para un mensaje de LOW OIL PRESSURE:\n\n"
-                               "1. Monitorea la presión de aceite y temperatura\n"
-                               "2. Reduce la potencia del motor si es posible\n"
-                               "3. Prepárate para un posible apagado del motor\n"
-                               "4. Consulta el QRH para el procedimiento específico\n\n"
-                               "Este problema requiere atención inmediata de mantenimiento.",
-            
-            'hydraulic low level': "Para un mensaje de HYDRAULIC LOW LEVEL:\n\n"
-                                  "1. Verifica posibles fugas en el sistema hidráulico\n"
-                                  "2. Monitorea la presión del sistema\n"
-                                  "3. Considera las limitaciones de operación\n"
-                                  "4. Consulta el MEL para determinar restricciones\n\n"
-                                  "Este problema requiere inspección de mantenimiento antes del próximo vuelo.",
-            
-            'cargo door': "Para problemas con la puerta de carga:\n\n"
-                         "1. Verifica que los mecanismos de cierre estén correctamente enganchados\n"
-                         "2. Comprueba que no haya obstrucciones en los sellos\n"
-                         "3. Revisa los indicadores de estado de la puerta\n"
-                         "4. Considera un reinicio del sistema eléctrico\n\n"
-                         "Si el problema persiste, se requiere inspección de mantenimiento."
-        }
-
         # Añadir configuración para el registro de conversaciones
         self.log_dir = "logs"
         self.stats_file = "conversation_stats.json"
+        self.journal_file = "conversation_stats.jsonl"
         
         # Crear directorio de logs si no existe
         if not os.path.exists(self.log_dir):
             os.makedirs(self.log_dir)
         
-        # Inicializar estadísticas
+        # Backend de sesiones y estadísticas: archivos locales por defecto, SQLite para
+        # compartir el estado entre varios workers (ver backends.crear_backend)
+        self.backend = backend or crear_backend(self.log_dir, self.stats_file, self.journal_file)
+        
+        # Conversaciones completas: segmentos por día rotados por tamaño, con índice por id
+        self.archivo_conversaciones = ArchivoConversaciones(
+            os.path.join(self.log_dir, 'conversaciones'),
+            max_segmento=int(os.environ.get('BOT_ARCHIVO_MAX_MB', 64)) * 1024 * 1024,
+            comprimir=os.environ.get('BOT_ARCHIVO_COMPRIMIR', '0') == '1')
+        
+        # Sesiones por usuario (contexto + historial) con expiración por inactividad y límite LRU;
+        # las sesiones expiradas se registran como conversaciones completas
+        self.sesiones = self.backend.abrir_sesiones(
+            ttl=int(os.environ.get('SESION_TTL', 1800)),
+            capacidad=int(os.environ.get('SESION_CAPACIDAD', 10000)),
+            max_historial=int(os.environ.get('SESION_MAX_HISTORIAL', 50)),
+            al_expirar=self.archivar_sesion
+        )
+        self._sesiones_activas = {}
+        
+        # Concurrencia: locks por usuario (repartidos en franjas) para el estado de la conversación
+        # y un lock para los contadores globales
+        self._locks_usuario = [threading.Lock() for _ in range(64)]
+        self._lock_estadisticas = threading.Lock()
+        # Rama de la respuesta en curso cuando la decide un método interno (ver registrar_respuesta)
+        self._rama_actual = threading.local()
+        
+        # Escritura diferida: eventos y conversaciones se encolan y un hilo escritor los
+        # persiste juntos, fuera del camino de la respuesta al usuario
+        self.escritor = EscritorDiferido(
+            self._persistir,
+            intervalo=float(os.environ.get('BOT_ESCRITURA_INTERVALO', 1.0)),
+            umbral=int(os.environ.get('BOT_ESCRITURA_UMBRAL', 256)),
+            max_retencion=float(os.environ.get('BOT_ESCRITURA_MAX_RETENCION', 5.0)))
+        
+        # Plantillas de respuesta compiladas una vez y en caché por nombre
+        self._plantillas_configuradas = self.configuracion.actual.plantillas
+        self.plantillas = RegistroPlantillas({**PLANTILLAS, **self._plantillas_configuradas})
+        
+        # Pool de hilos para la API asíncrona (se crea al primer uso)
+        self._executor = None
+        self._lock_executor = threading.Lock()
+        self.conversaciones = VistaHistoriales(self.obtener_sesion, lambda: self.sesiones)
+        self.contexto_actual = VistaContextos(self.obtener_sesion, lambda: self.sesiones)
+        
+        # Tabla de rutas: por estado de la conversación, por comando exacto y por caso especial
+        self._rutas_por_estado = (
+            ('en_encuesta', self._ruta_encuesta),
+            ('recopilando_info_agente', self._ruta_recopilacion),
+        )
+        self._rutas_por_comando = {
+            'nueva_consulta': self._ruta_nueva_consulta,
+            'ayuda': self._ruta_ayuda,
+            'ejemplos': self._ruta_ejemplos,
+            'urgente': self._ruta_urgente,
+        }
+        self._rutas_por_tema = {
+            'APU_NO_ARRANCA': self._ruta_apu_no_arranca,
+            'TREN': self._ruta_tren,
+            'ELECTRICO': self._ruta_electrico,
+        }
+        
+        # Inicializar estadísticas (snapshot + eventos posteriores)
+        self.diario = self.backend.abrir_diario(lambda: self.stats)
         self.stats = self.cargar_estadisticas()
         
         # Cargar base de conocimiento del manual
-        self.manual_knowledge = ManualKnowledge()
-        knowledge_path = os.path.join(self.log_dir, 'knowledge_base.json')
-        if os.path.exists(knowledge_path):
-            self.manual_knowledge.load_knowledge_base(knowledge_path)
-        else:
+        # Manuales por tipo de aeronave en logs/manuales/; la base única de siempre queda como general
+        self.manual_knowledge = AlmacenManuales(os.path.join(self.log_dir, 'manuales'),
+                                                os.path.join(self.log_dir, 'knowledge_base.json'))
+        if not self.manual_knowledge.disponible():
             print("No se encontró la base de conocimiento del manual.")
 
+    # Lecturas de la configuración vigente: una referencia a un objeto inmutable, sin locks
+    @property
+    def sistemas(self):
+        return self.configuracion.actual.sistemas
+    
+    @property
+    def problemas(self):
+        return self.configuracion.actual.problemas
+    
+    @property
+    def sistemas_deteccion(self):
+        return self.configuracion.actual.sistemas_deteccion
+    
+    @property
+    def problemas_deteccion(self):
+        return self.configuracion.actual.problemas_deteccion
+    
+    @property
+    def clasificador(self):
+        return self.configuracion.actual.clasificador
+    
+    @property
+    def respuestas_automaticas(self):
+        return self.configuracion.actual.respuestas_automaticas
+    
+    @property
+    def respuestas_especificas(self):
+        return self.configuracion.actual.respuestas_especificas
+    
+    def _aplicar_configuracion(self, nueva):
+        """Tras una recarga: las plantillas solo se reemplazan si cambiaron"""
+        if nueva.plantillas != self._plantillas_configuradas:
+            self._plantillas_configuradas = nueva.plantillas
+            self.plantillas.actualizar({**PLANTILLAS, **nueva.plantillas})
+    
     def cargar_estadisticas(self):
-        """Carga las estadísticas desde el archivo JSON"""
-        stats_path = os.path.join(self.log_dir, self.stats_file)
-        if os.path.exists(stats_path):
+        """Carga el último snapshot de estadísticas y reproduce el diario de eventos"""
+        # Un snapshot antiguo trae la lista de conversaciones: se suman a los buckets por día y
+        # hora antes de reproducir el diario, que solo tiene eventos posteriores al snapshot
+        snapshot_pendiente = [True]
+        
+        def completar_snapshot(stats):
+            if snapshot_pendiente:
+                snapshot_pendiente.clear()
+                if stats.get("conversaciones"):
+                    reconstruir_conversaciones(stats["agregados"], stats["conversaciones"])
+        
+        def aplicar(stats, evento):
+            completar_snapshot(stats)
+            self.aplicar_evento(stats, evento)
+        
+        try:
+            stats = self.diario.cargar(self.inicializar_estadisticas, aplicar)
+            completar_snapshot(stats)
+        except Exception as e:
+            print(f"Error al cargar estadísticas: {e}")
+            return self.inicializar_estadisticas()
+        
+        # Los snapshots anteriores guardaban todas las conversaciones: pasan al archivo
+        antiguas = stats.pop("conversaciones", None)
+        if antiguas:
+            fechas = [c["fecha"].split()[0] for c in antiguas] + [stats["fecha_inicio"]]
+            stats["fecha_inicio"] = min(f for f in fechas if f)
             try:
-                with open(stats_path, 'r', encoding='utf-8') as f:
-                    return json.load(f)
+                self.archivo_conversaciones.guardar_lote(
+                    [c for c in antiguas if c["id"] not in self.archivo_conversaciones])
+                self.stats = stats
+                self.diario.compactar()
             except Exception as e:
-                print(f"Error al cargar estadísticas: {e}")
-                return self.inicializar_estadisticas()
-        else:
-            return self.inicializar_estadisticas()
+                print(f"Error al migrar las conversaciones de las estadísticas: {e}")
+        return stats
     
     def inicializar_estadisticas(self):
         """Inicializa la estructura de estadísticas"""
@@ -165,47 +197,103 @@ class WhatsAppBot:
             "total_conversaciones": 0,
             "total_mensajes": 0,
             "tiempo_respuesta_promedio": 0,
+            "total_respuestas": 0,
+            "latencias": {rama: nuevo_histograma() for rama in RAMAS},
             "consultas_por_sistema": {},
             "consultas_por_problema": {},
             "consultas_urgentes": 0,
             "derivaciones_agente": 0,
             "respuestas_automaticas": 0,
-            "conversaciones": [],
+            "fecha_inicio": None,
             "consultas_satisfactorias": 0,
-            "total_encuestas": 0
+            "total_encuestas": 0,
+            "agregados": inicializar_agregados()
         }
     
     def guardar_estadisticas(self):
-        """Guarda las estadísticas en el archivo JSON"""
-        stats_path = os.path.join(self.log_dir, self.stats_file)
-        try:
-            with open(stats_path, 'w', encoding='utf-8') as f:
-                json.dump(self.stats, f, indent=2, ensure_ascii=False)
-        except Exception as e:
-            print(f"Error al guardar estadísticas: {e}")
+        """Guarda un snapshot completo de las estadísticas y compacta el diario"""
+        self.escritor.vaciar()
+        with self._lock_estadisticas:
+            self.diario.compactar()
+    
+    def registrar_evento(self, evento):
+        """Encola un evento de estadísticas; el hilo escritor lo aplica y lo persiste.
+        
+        Los hilos nunca esperan por los contadores globales ni por el disco.
+        """
+        evento.setdefault("fecha", datetime.now().strftime("%Y-%m-%d %H:%M:%S"))
+        self.escritor.encolar(("evento", evento))
+    
+    def _persistir(self, pendientes):
+        """Aplica los eventos encolados y los escribe junto con las conversaciones (hilo escritor)"""
+        eventos = [dato for tipo, dato in pendientes if tipo == "evento"]
+        conversaciones = [dato for tipo, dato in pendientes if tipo == "conversacion"]
+        if eventos:
+            with self._lock_estadisticas:
+                for evento in eventos:
+                    self.aplicar_evento(self.stats, evento)
+                try:
+                    self.diario.registrar_lote(eventos)
+                except Exception as e:
+                    print(f"Error al guardar estadísticas: {e}")
+        if conversaciones:
+            try:
+                self.archivo_conversaciones.guardar_lote(conversaciones)
+            except Exception as e:
+                print(f"Error al guardar conversación individual: {e}")
+    
+    def aplicar_evento(self, stats, evento):
+        """Aplica un evento (delta) sobre una estructura de estadísticas"""
+        tipo = evento["tipo"]
+        
+        if tipo == "conversacion":
+            conversacion = evento["conversacion"]
+            stats["total_conversaciones"] += 1
+            stats["total_mensajes"] += len(conversacion["mensajes"])
+            
+            if conversacion["es_urgente"]:
+                stats["consultas_urgentes"] += 1
+            
+            # Las derivaciones se cuentan con el evento "derivacion" al completar la recopilación
+            if conversacion["respuesta_automatica"]:
+                stats["respuestas_automaticas"] += 1
+            
+            # Registrar sistema y problema
+            sistema = conversacion["sistema"]
+            problema = conversacion["problema"]
+            if sistema:
+                stats["consultas_por_sistema"][sistema] = stats["consultas_por_sistema"].get(sistema, 0) + 1
+            
+            if problema:
+                stats["consultas_por_problema"][problema] = stats["consultas_por_problema"].get(problema, 0) + 1
+            
+            # Las conversaciones completas van al archivo; aquí solo queda la fecha de la primera
+            if not stats["fecha_inicio"]:
+                stats["fecha_inicio"] = conversacion["fecha"].split()[0]
+        
+        elif tipo == "encuesta":
+            stats["total_encuestas"] += 1
+            if evento["satisfactoria"]:
+                stats["consultas_satisfactorias"] += 1
+        
+        elif tipo == "derivacion":
+            stats["derivaciones_agente"] += 1
+        
+        elif tipo == "respuesta":
+            # Promedio incremental sobre la cantidad de respuestas y histograma de la rama
+            tiempo_respuesta = evento["tiempo_respuesta"]
+            stats["total_respuestas"] += 1
+            stats["tiempo_respuesta_promedio"] += (tiempo_respuesta - stats["tiempo_respuesta_promedio"]) / stats["total_respuestas"]
+            rama = evento.get("rama", "otros")
+            if rama not in stats["latencias"]:
+                stats["latencias"][rama] = nuevo_histograma()
+            registrar_latencia(stats["latencias"][rama], tiempo_respuesta)
+        
+        # Mantener los buckets por día y por hora para las consultas por rango de fechas
+        acumular_evento(stats["agregados"], evento)
     
     def registrar_conversacion(self, id_usuario, mensajes, sistema=None, problema=None, matricula=None, es_urgente=False, derivado_agente=False, respuesta_automatica=False):
         """Registra una conversación completa en las estadísticas"""
-        # Incrementar contadores
-        self.stats["total_conversaciones"] += 1
-        self.stats["total_mensajes"] += len(mensajes)
-        
-        if es_urgente:
-            self.stats["consultas_urgentes"] += 1
-        
-        if derivado_agente:
-            self.stats["derivaciones_agente"] += 1
-        
-        if respuesta_automatica:
-            self.stats["respuestas_automaticas"] += 1
-        
-        # Registrar sistema y problema
-        if sistema:
-            self.stats["consultas_por_sistema"][sistema] = self.stats["consultas_por_sistema"].get(sistema, 0) + 1
-        
-        if problema:
-            self.stats["consultas_por_problema"][problema] = self.stats["consultas_por_problema"].get(problema, 0) + 1
-        
         # Crear registro de conversación
         conversacion = {
             "id": str(uuid.uuid4()),
@@ -220,93 +308,81 @@ class WhatsAppBot:
             "mensajes": mensajes
         }
         
-        # Añadir a la lista de conversaciones
-        self.stats["conversaciones"].append(conversacion)
-        
-        # Guardar estadísticas actualizadas
-        self.guardar_estadisticas()
+        # Actualizar contadores y anexar el evento al diario
+        self.registrar_evento({"tipo": "conversacion", "conversacion": conversacion})
         
         # También guardar esta conversación en un archivo separado para facilitar la búsqueda
         self.guardar_conversacion_individual(conversacion)
     
+    def archivar_sesion(self, id_usuario, sesion):
+        """Registra como conversación completa una sesión que sale de memoria"""
+        if not sesion.historial:
+            return
+        contexto = sesion.contexto
+        self.registrar_conversacion(
+            id_usuario,
+            list(sesion.historial),
+            sistema=contexto.get('sistema'),
+            problema=contexto.get('problema'),
+            matricula=contexto.get('matricula'),
+            es_urgente=contexto.get('es_urgente', False),
+            derivado_agente='ubicacion' in contexto,
+            respuesta_automatica=contexto.get('respuesta_automatica', False)
+        )
+    
+    def cerrar(self):
+        """Registra las sesiones activas y deja las estadísticas en disco"""
+        if self._executor is not None:
+            self._executor.shutdown(wait=True)
+            self._executor = None
+        self.configuracion.detener()
+        self.sesiones.vaciar()
+        self.escritor.cerrar()
+        with self._lock_estadisticas:
+            self.diario.cerrar()
+    
     def guardar_conversacion_individual(self, conversacion):
-        """Guarda una conversación individual en un archivo JSON separado"""
-        conv_id = conversacion["id"]
-        conv_path = os.path.join(self.log_dir, f"conv_{conv_id}.json")
+        """Encola la conversación para el archivo de conversaciones (segmentos por día con índice por id)"""
+        self.escritor.encolar(("conversacion", conversacion))
+
+    def obtener_conversacion(self, id_conversacion):
+        """Devuelve una conversación archivada por su id"""
         try:
-            with open(conv_path, 'w', encoding='utf-8') as f:
-                json.dump(conversacion, f, indent=2, ensure_ascii=False)
+            self.escritor.vaciar()
+            return self.archivo_conversaciones.obtener(id_conversacion)
         except Exception as e:
-            print(f"Error al guardar conversación individual: {e}")
+            print(f"Error al leer conversación {id_conversacion}: {e}")
+            return None
+
+    def buscar_conversaciones(self, **filtros):
+        """Busca casos anteriores por matrícula, sistema, problema, fechas y texto (ver ArchivoConversaciones.buscar)"""
+        try:
+            self.escritor.vaciar()
+            return self.archivo_conversaciones.buscar(**filtros)
+        except Exception as e:
+            print(f"Error al buscar conversaciones: {e}")
+            return []
 
     def detectar_sistema_y_problema(self, mensaje):
         """Detecta el sistema, problema y matrícula mencionados en el mensaje"""
-        mensaje_lower = mensaje.lower()
-        
-        # Sistemas posibles (ampliados y mejorados)
-        sistemas = {
-            'apu': ['apu', 'auxiliary power unit', 'unidad auxiliar'],
-            'motor': ['motor', 'engine', 'turbina', 'propulsor'],
-            'tren': ['tren', 'landing gear', 'ruedas', 'aterrizaje', 'landing'],
-            'hidraulico': ['hidraulico', 'hydraulic', 'hidráulico', 'fluido'],
-            'electrico': ['electrico', 'eléctrico', 'electric', 'electrical', 'sistema eléctrico'],
-            'cabina': ['cabina', 'cockpit', 'panel', 'instrumentos'],
-            'galley': ['galley', 'cocina', 'catering']
-        }
+        clasificacion = self.clasificador.clasificar(mensaje)
         
-        # Problemas posibles (ampliados y mejorados)
-        problemas = {
-            'NO_ARRANCA': ['no arranca', 'no enciende', 'no prende', 'won\'t start', 'no start'],
-            'NO_FUNCIONA': ['no funciona', 'no opera', 'inoperativo', 'falla', 'not working', 'doesn\'t work', 'fallo'],
-            'ERROR': ['error', 'warning', 'alerta', 'mensaje', 'indicador', 'luz'],
-            'REVISAR': ['revisar', 'verificar', 'check', 'inspeccionar', 'comprobar', 'verificación'],
-            'RESET': ['reset', 'reinicio', 'reiniciar', 'resetear', 'restart']
-        }
-        
-        # Detectar sistema con mayor flexibilidad
-        sistema_detectado = None
-        for sistema, keywords in sistemas.items():
-            for keyword in keywords:
-                if keyword in mensaje_lower:
-                    sistema_detectado = sistema.upper()
-                    break
-            if sistema_detectado:
-                break
-        
-        # Detectar problema con mayor flexibilidad
-        problema_detectado = None
-        for problema, keywords in problemas.items():
-            for keyword in keywords:
-                if keyword in mensaje_lower:
-                    problema_detectado = problema
-                    break
-            if problema_detectado:
-                break
+        # Sistema y problema: el primero declarado entre los encontrados
+        sistema_detectado = clasificacion.primera('sistema')
+        if sistema_detectado:
+            sistema_detectado = sistema_detectado.upper()
+        problema_detectado = clasificacion.primera('problema')
         
         # Caso especial para "check" o "verificar" + sistema
-        if 'check' in mensaje_lower or 'verificar' in mensaje_lower or 'revisar' in mensaje_lower:
+        if clasificacion.primera('revision'):
             problema_detectado = 'REVISAR'
         
         # Si no se detectó un problema específico pero hay palabras como "problema" o "issue"
-        if not problema_detectado and ('problema' in mensaje_lower or 'issue' in mensaje_lower or 'falla' in mensaje_lower):
+        if not problema_detectado and clasificacion.primera('generico'):
             problema_detectado = 'NO_FUNCIONA'  # Asignar un problema genérico
         
-        # Detectar matrícula (formato CC-XXX) con mayor flexibilidad
-        matricula_match = re.search(r'CC-[A-Z]{3}', mensaje.upper())
-        if not matricula_match:
-            # Intentar otros formatos como "CC XXX" o "CCXXX"
-            matricula_match = re.search(r'CC\s+[A-Z]{3}', mensaje.upper())
-            if matricula_match:
-                matricula_detectada = matricula_match.group(0).replace(' ', '-')
-            else:
-                matricula_match = re.search(r'CC[A-Z]{3}', mensaje.upper())
-                if matricula_match:
-                    texto = matricula_match.group(0)
-                    matricula_detectada = f"{texto[:2]}-{texto[2:]}"
-                else:
-                    matricula_detectada = None
-        else:
-            matricula_detectada = matricula_match.group(0)
+        # Matrícula (CC-XXX, CC XXX o CCXXX) detectada en la misma pasada
+        matricula_detectada = clasificacion.matricula
         
         # Imprimir para depuración
         print(f"Sistema detectado: {sistema_detectado}, Problema detectado: {problema_detectado}, Matrícula detectada: {matricula_detectada}")
@@ -314,65 +390,131 @@ class WhatsAppBot:
         return sistema_detectado, problema_detectado, matricula_detectada
 
     def detectar_problema_especifico(self, texto):
-        """Detecta problemas específicos en el texto"""
-        texto = texto.lower()
-        
-        for problema_clave in self.respuestas_especificas.keys():
-            if problema_clave in texto:
-                return problema_clave
-        
-        return None
+        """Detecta problemas específicos en el texto (o en un MensajeAnalizado)"""
+        analisis = texto if isinstance(texto, MensajeAnalizado) else self.analizar(texto)
+        return analisis.problemas_especificos[0] if analisis.problemas_especificos else None
+
+    def obtener_sesion(self, id_usuario, crear=True):
+        """Devuelve la sesión cargada para el mensaje en curso o la busca en el almacén"""
+        sesion = self._sesiones_activas.get(id_usuario)
+        if sesion is None:
+            sesion = self.sesiones.cargar(id_usuario) if crear else self.sesiones.buscar(id_usuario)
+        return sesion
 
     def obtener_contexto(self, id_usuario):
         """Recupera el contexto de la conversación actual"""
         return self.contexto_actual.get(id_usuario, {})
 
     def procesar_mensaje(self, mensaje, id_usuario="web_user"):
+        """Carga la sesión del usuario desde el backend, procesa el mensaje y la guarda"""
+        return self._procesar_mensajes_usuario(id_usuario, [mensaje])[0]
+
+    def procesar_lote(self, mensajes):
+        """Procesa un lote de pares (id_usuario, mensaje) y devuelve las respuestas en el mismo orden.
+        
+        Los mensajes de cada usuario se procesan en orden, los de distintos usuarios en
+        paralelo, y los eventos de estadísticas de todo el lote se escriben juntos al final.
+        No debe llamarse desde un hilo del propio pool del bot.
+        """
+        por_usuario = {}
+        for posicion, (id_usuario, mensaje) in enumerate(mensajes):
+            por_usuario.setdefault(id_usuario, []).append((posicion, mensaje))
+        
+        respuestas = [None] * len(mensajes)
+        with self.escritor.agrupar():
+            futuros = {
+                self.executor.submit(self._procesar_mensajes_usuario, id_usuario, [m for _, m in pendientes]): pendientes
+                for id_usuario, pendientes in por_usuario.items()
+            }
+            for futuro, pendientes in futuros.items():
+                for (posicion, _), respuesta in zip(pendientes, futuro.result()):
+                    respuestas[posicion] = respuesta
+        return respuestas
+
+    def _procesar_mensajes_usuario(self, id_usuario, mensajes):
+        """Procesa en orden mensajes de un usuario cargando y guardando su sesión una sola vez"""
+        # Los mensajes de un mismo usuario se procesan de a uno; los de distintos usuarios en paralelo
+        self.configuracion.iniciar()
+        with self._locks_usuario[hash(id_usuario) % len(self._locks_usuario)]:
+            self._sesiones_activas[id_usuario] = self.sesiones.cargar(id_usuario, en_uso=True)
+            try:
+                return [self._procesar_mensaje(mensaje, id_usuario) for mensaje in mensajes]
+            finally:
+                self.sesiones.guardar(id_usuario, self._sesiones_activas.pop(id_usuario))
+
+    async def aprocesar_mensaje(self, mensaje, id_usuario="web_user"):
+        """Versión asíncrona de procesar_mensaje para servidores ASGI.
+        
+        El procesamiento y la escritura en disco corren en un pool de hilos, de modo
+        que el event loop sigue atendiendo otras conexiones mientras tanto.
+        """
+        # asyncio ya está cargado si hay un event loop; importarlo arriba demoraría el arranque WSGI
+        import asyncio
+
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self.executor, self.procesar_mensaje, mensaje, id_usuario)
+
+    @property
+    def executor(self):
+        """Pool de hilos compartido por la API asíncrona (BOT_HILOS hilos)"""
+        if self._executor is None:
+            with self._lock_executor:
+                if self._executor is None:
+                    self._executor = ThreadPoolExecutor(
+                        max_workers=int(os.environ.get('BOT_HILOS', 32)),
+                        thread_name_prefix='bot'
+                    )
+        return self._executor
+
+    def analizar(self, mensaje):
+        """Normaliza el mensaje y calcula sus rasgos una sola vez (ver MensajeAnalizado)"""
+        return MensajeAnalizado(mensaje, self.detectar_sistema_y_problema, self.respuestas_especificas)
+    
+    def _procesar_mensaje(self, mensaje, id_usuario):
+        """Enruta el mensaje: primero por el estado de la conversación, luego por sus rasgos"""
         # Registrar tiempo de inicio
         tiempo_inicio = time.time()
-        
-        # Inicializar contexto si no existe
-        if id_usuario not in self.contexto_actual:
-            self.contexto_actual[id_usuario] = {}
-        
-        # Verificar si el usuario está en una encuesta de satisfacción
-        if 'en_encuesta' in self.contexto_actual[id_usuario] and self.contexto_actual[id_usuario]['en_encuesta']:
-            # Procesar respuesta de la encuesta
-            respuesta = self.procesar_respuesta_encuesta(mensaje, id_usuario)
-            self.registrar_respuesta(id_usuario, respuesta, tiempo_inicio)
-            return respuesta
-        
-        # Verificar si estamos en proceso de recopilación de información para agente
-        if 'recopilando_info_agente' in self.contexto_actual[id_usuario] and self.contexto_actual[id_usuario]['recopilando_info_agente']:
-            respuesta = self.procesar_recopilacion_info_agente(mensaje, id_usuario)
-            self.registrar_respuesta(id_usuario, respuesta, tiempo_inicio)
-            return respuesta
-        
-        # Verificar si el mensaje es "agente" después de una encuesta negativa
-        if mensaje.lower() == 'agente' and self.contexto_actual[id_usuario].get('encuesta_respondida', False):
-            return self.iniciar_recopilacion_info_agente(id_usuario, tiempo_inicio)
-        
-        # Verificar si el mensaje indica que el usuario no necesita más ayuda
-        if self.es_mensaje_despedida(mensaje):
-            # Verificar si ya se ha enviado una encuesta anteriormente
-            if not self.contexto_actual[id_usuario].get('encuesta_respondida', False):
-                # Enviar la encuesta solo si no se ha respondido antes
-                self.contexto_actual[id_usuario]['en_encuesta'] = True
-                respuesta = "¿El problema o tu consulta fue resuelta? Responde Sí o No."
-                self.registrar_respuesta(id_usuario, respuesta, tiempo_inicio)
-                return respuesta
-            else:
-                # Si ya se respondió, enviar un mensaje de despedida
-                respuesta = "Gracias por usar nuestro servicio. ¡Que tengas un buen día!"
-                self.registrar_respuesta(id_usuario, respuesta, tiempo_inicio)
-                return respuesta
-        
-        # Verificar si el mensaje es "agente" o solicita contacto con agente
-        if mensaje.lower() == 'agente' or 'contactar' in mensaje.lower() or 'hablar con agente' in mensaje.lower():
-            # Iniciar proceso de recopilación de información
-            return self.iniciar_recopilacion_info_agente(id_usuario, tiempo_inicio)
-        
-        # Verificar si es un mensaje repetido
+        self._rama_actual.valor = None
+        contexto = self.contexto_actual[id_usuario]
+        
+        # Encuesta o recopilación para agente en curso: el estado decide la ruta
+        for clave, ruta in self._rutas_por_estado:
+            if contexto.get(clave):
+                return ruta(mensaje, id_usuario, tiempo_inicio)
+        
+        # Un solo análisis del mensaje, compartido por todas las rutas
+        analisis = self.analizar(mensaje)
+        ruta = self._ruta_previa_al_historial(analisis, contexto, id_usuario)
+        if ruta is None:
+            # Guardar mensaje en historial
+            self.conversaciones[id_usuario].append({
+                'mensaje': mensaje,
+                'timestamp': datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
+                'tipo': 'usuario'
+            })
+            ruta = (self._rutas_por_comando.get(analisis.comando) or
+                    (self._ruta_reset if analisis.pide_reset else None) or
+                    self._rutas_por_tema.get(analisis.tema) or
+                    (self._ruta_mensaje_corto if analisis.es_corto else self._ruta_normal))
+        return ruta(analisis, id_usuario, tiempo_inicio)
+    
+    def _ruta_previa_al_historial(self, analisis, contexto, id_usuario):
+        """Rutas que se deciden antes de anotar el mensaje en el historial (o None)"""
+        # "agente" después de una encuesta negativa
+        if analisis.comando == 'agente' and contexto.get('encuesta_respondida', False):
+            return self._ruta_agente
+        # El usuario indica que no necesita más ayuda
+        if analisis.es_despedida:
+            return self._ruta_despedida
+        # Solicitud de contacto con un agente
+        if analisis.pide_agente:
+            return self._ruta_agente
+        if self._es_mensaje_repetido(analisis, id_usuario):
+            return self._ruta_mensaje_repetido
+        return None
+    
+    def _es_mensaje_repetido(self, analisis, id_usuario):
+        """Indica si el mensaje es igual a los dos últimos del usuario"""
         ultimo_mensaje = None
         penultimo_mensaje = None
         if id_usuario in self.conversaciones and len(self.conversaciones[id_usuario]) >= 1:
@@ -383,229 +525,166 @@ class WhatsAppBot:
                     elif penultimo_mensaje is None:
                         penultimo_mensaje = msg.get('mensaje', '')
                         break
+        return bool(ultimo_mensaje and analisis.minusculas == ultimo_mensaje.lower() and
+                    penultimo_mensaje and analisis.minusculas == penultimo_mensaje.lower())
+    
+    def _agregar_encuesta(self, id_usuario, respuesta, condicion=True):
+        """Añade la pregunta de la encuesta si corresponde y aún no se respondió"""
+        if condicion and not self.contexto_actual[id_usuario].get('encuesta_respondida', False):
+            self.contexto_actual[id_usuario]['en_encuesta'] = True
+            respuesta += "\n\n¿El problema o tu consulta fue resuelta? Responde Sí o No."
+        return respuesta
+    
+    def _ruta_encuesta(self, mensaje, id_usuario, tiempo_inicio):
+        respuesta = self.procesar_respuesta_encuesta(mensaje, id_usuario)
+        self.registrar_respuesta(id_usuario, respuesta, tiempo_inicio, rama='encuesta')
+        return respuesta
+    
+    def _ruta_recopilacion(self, mensaje, id_usuario, tiempo_inicio):
+        respuesta = self.procesar_recopilacion_info_agente(mensaje, id_usuario)
+        self.registrar_respuesta(id_usuario, respuesta, tiempo_inicio, rama='agente')
+        return respuesta
+    
+    def _ruta_agente(self, analisis, id_usuario, tiempo_inicio):
+        return self.iniciar_recopilacion_info_agente(id_usuario, tiempo_inicio)
+    
+    def _ruta_despedida(self, analisis, id_usuario, tiempo_inicio):
+        # Verificar si ya se ha enviado una encuesta anteriormente
+        if not self.contexto_actual[id_usuario].get('encuesta_respondida', False):
+            # Enviar la encuesta solo si no se ha respondido antes
+            self.contexto_actual[id_usuario]['en_encuesta'] = True
+            respuesta = "¿El problema o tu consulta fue resuelta? Responde Sí o No."
+            self.registrar_respuesta(id_usuario, respuesta, tiempo_inicio, rama='encuesta')
+        else:
+            # Si ya se respondió, enviar un mensaje de despedida
+            respuesta = "Gracias por usar nuestro servicio. ¡Que tengas un buen día!"
+            self.registrar_respuesta(id_usuario, respuesta, tiempo_inicio, rama='otros')
+        return respuesta
+    
+    def _ruta_mensaje_repetido(self, analisis, id_usuario, tiempo_inicio):
+        # Detectar sistema y problema para dar una respuesta más específica
+        sistema, problema, _ = analisis.deteccion
+        if sistema and problema:
+            # Si podemos detectar sistema y problema, dar una respuesta específica
+            respuesta = f"Veo que estás mencionando un problema con {sistema}. Para ayudarte mejor, necesito más detalles específicos sobre el problema '{problema}'. ¿Podrías proporcionar información adicional como mensajes de error, cuándo comenzó el problema o qué acciones has intentado?"
+        else:
+            # Si no podemos detectar sistema y problema, dar una respuesta genérica
+            respuesta = "Parece que estás enviando el mismo mensaje varias veces. Para ayudarte mejor, necesito más detalles sobre tu consulta. ¿Podrías proporcionar más información o explicar tu problema de otra manera?"
+        self.registrar_respuesta(id_usuario, respuesta, tiempo_inicio, rama='otros')
+        return respuesta
+    
+    def _ruta_nueva_consulta(self, analisis, id_usuario, tiempo_inicio):
+        self.reiniciar_conversacion(id_usuario)
+        respuesta = "Entendido. ¿En qué puedo ayudarte con esta nueva consulta?"
+        self.registrar_respuesta(id_usuario, respuesta, tiempo_inicio, rama='otros')
+        return respuesta
+    
+    def _ruta_ayuda(self, analisis, id_usuario, tiempo_inicio):
+        respuesta = self.mostrar_ayuda()
+        self.registrar_respuesta(id_usuario, respuesta, tiempo_inicio, rama='otros')
+        return respuesta
+    
+    def _ruta_ejemplos(self, analisis, id_usuario, tiempo_inicio):
+        respuesta = self.mostrar_ejemplos()
+        self.registrar_respuesta(id_usuario, respuesta, tiempo_inicio, rama='otros')
+        return respuesta
+    
+    def _ruta_urgente(self, analisis, id_usuario, tiempo_inicio):
+        self.contexto_actual[id_usuario]['es_urgente'] = True
+        respuesta = "He marcado tu caso como urgente. Un agente de mantenimiento te contactará lo antes posible. Mientras tanto, ¿puedes proporcionar más detalles sobre el problema?"
+        self.registrar_respuesta(id_usuario, respuesta, tiempo_inicio, rama='otros')
+        return respuesta
+    
+    def _ruta_reset(self, analisis, id_usuario, tiempo_inicio):
+        # Sistema mencionado en el mensaje o, si no hay, el del contexto
+        sistema = analisis.sistema_en_reset or self.obtener_contexto(id_usuario).get('sistema')
+        respuesta = self.manejar_reset_sistema(id_usuario, sistema)
+        self.registrar_respuesta(id_usuario, respuesta, tiempo_inicio, rama='automatica')
+        return self._agregar_encuesta(id_usuario, respuesta)
+    
+    def _ruta_apu_no_arranca(self, analisis, id_usuario, tiempo_inicio):
+        _, _, matricula = analisis.deteccion
+        # Actualizar contexto con la información detectada
+        contexto = self.obtener_contexto(id_usuario)
+        contexto['sistema'] = 'APU'
+        contexto['problema'] = 'NO_ARRANCA'
+        if matricula:
+            contexto['matricula'] = matricula
+        self.contexto_actual[id_usuario] = contexto
         
-        # Si el mensaje actual es igual al último mensaje del usuario
-        if ultimo_mensaje and mensaje.lower() == ultimo_mensaje.lower():
-            # Verificar si también es igual al penúltimo mensaje (repetición múltiple)
-            if penultimo_mensaje and mensaje.lower() == penultimo_mensaje.lower():
-                # Detectar sistema y problema para dar una respuesta más específica
-                sistema, problema, matricula = self.detectar_sistema_y_problema(mensaje)
-                
-                if sistema and problema:
-                    # Si podemos detectar sistema y problema, dar una respuesta específica
-                    respuesta = f"Veo que estás mencionando un problema con {sistema}. Para ayudarte mejor, necesito más detalles específicos sobre el problema '{problema}'. ¿Podrías proporcionar información adicional como mensajes de error, cuándo comenzó el problema o qué acciones has intentado?"
-                else:
-                    # Si no podemos detectar sistema y problema, dar una respuesta genérica
-                    respuesta = "Parece que estás enviando el mismo mensaje varias veces. Para ayudarte mejor, necesito más detalles sobre tu consulta. ¿Podrías proporcionar más información o explicar tu problema de otra manera?"
-                
-                self.registrar_respuesta(id_usuario, respuesta, tiempo_inicio)
-                return respuesta
-        
-        # Guardar mensaje en historial
-        self.conversaciones[id_usuario].append({
-            'mensaje': mensaje,
-            'timestamp': datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
-            'tipo': 'usuario'
-        })
-        
-        # Variables para registro
-        es_urgente = False
-        derivado_agente = False
-        respuesta_automatica = False
-        
-        # Comandos especiales - verificar primero
-        mensaje_lower = mensaje.lower()
-        
-        # Verificar si el usuario quiere iniciar una nueva consulta
-        if mensaje_lower in ['nueva consulta', 'nuevo problema', 'otra consulta', 'reiniciar']:
-            self.reiniciar_conversacion(id_usuario)
-            respuesta = "Entendido. ¿En qué puedo ayudarte con esta nueva consulta?"
-            self.registrar_respuesta(id_usuario, respuesta, tiempo_inicio)
-            return respuesta
-        
-        # Resto de comandos especiales
-        if mensaje_lower == 'ayuda':
-            respuesta = self.mostrar_ayuda()
-            self.registrar_respuesta(id_usuario, respuesta, tiempo_inicio)
-            return respuesta
-        elif mensaje_lower == 'ejemplos':
-            respuesta = self.mostrar_ejemplos()
-            self.registrar_respuesta(id_usuario, respuesta, tiempo_inicio)
-            return respuesta
-        elif mensaje_lower == 'urgente':
-            es_urgente = True
-            respuesta = "He marcado tu caso como urgente. Un agente de mantenimiento te contactará lo antes posible. Mientras tanto, ¿puedes proporcionar más detalles sobre el problema?"
-            self.registrar_respuesta(id_usuario, respuesta, tiempo_inicio, es_urgente=True)
-            return respuesta
-        
-        # Detectar preguntas sobre reset
-        if ('reset' in mensaje_lower or 'reinicio' in mensaje_lower or 'reiniciar' in mensaje_lower or 
-            'como hago el reset' in mensaje_lower or 'cómo hago el reset' in mensaje_lower):
-            
-            # Detectar sistema mencionado en el mensaje
-            sistema = None
-            if 'apu' in mensaje_lower:
-                sistema = 'APU'
-            elif 'electrico' in mensaje_lower or 'eléctrico' in mensaje_lower:
-                sistema = 'ELECTRICO'
-            elif 'tren' in mensaje_lower or 'aterrizaje' in mensaje_lower:
-                sistema = 'TREN'
-            
-            # Si no se detecta sistema en el mensaje, intentar obtenerlo del contexto
-            if not sistema:
-                contexto = self.obtener_contexto(id_usuario)
-                sistema = contexto.get('sistema')
-            
-            respuesta = self.manejar_reset_sistema(id_usuario, sistema)
-            self.registrar_respuesta(id_usuario, respuesta, tiempo_inicio)
-            
-            # Determinar si debemos enviar la encuesta
-            if not self.contexto_actual[id_usuario].get('encuesta_respondida', False):
-                self.contexto_actual[id_usuario]['en_encuesta'] = True
-                respuesta += "\n\n¿El problema o tu consulta fue resuelta? Responde Sí o No."
-            
-            return respuesta
-        
-        # Detectar sistema, problema y matrícula
-        sistema, problema, matricula = self.detectar_sistema_y_problema(mensaje)
-        
-        # Caso especial para "APU no arranca"
-        if (sistema == 'APU' and problema == 'NO_ARRANCA') or ('apu' in mensaje_lower and ('no arranca' in mensaje_lower or 'no enciende' in mensaje_lower)):
-            # Obtener contexto actual
-            contexto = self.obtener_contexto(id_usuario)
-            
-            # Actualizar contexto con la información detectada
-            contexto['sistema'] = 'APU'
-            contexto['problema'] = 'NO_ARRANCA'
-            if matricula:
-                contexto['matricula'] = matricula
-            
-            # Guardar contexto actualizado
-            self.contexto_actual[id_usuario] = contexto
-            
-            # Si ya tenemos la matrícula, dar la solución completa
-            if matricula or contexto.get('matricula'):
-                matricula_final = matricula or contexto.get('matricula')
-                
-                respuesta = (f"Para solucionar el problema de APU que no arranca en {matricula_final}, verifica lo siguiente:\n\n"
-                            f"1. Comprueba que el interruptor de control del APU esté en posición ON\n"
-                            f"2. Verifica el nivel de combustible y que la válvula de combustible del APU esté abierta\n"
-                            f"3. Revisa los breakers relacionados con el APU en el panel eléctrico\n"
-                            f"4. Comprueba si hay mensajes de error específicos en la ECAM/EICAS\n"
-                            f"5. Verifica que la temperatura exterior esté dentro de los límites operativos del APU\n\n"
-                            f"Si después de estas verificaciones el APU sigue sin arrancar, podría ser necesario realizar un reset del sistema o contactar al equipo de mantenimiento para una inspección más detallada.")
-                
-                self.registrar_respuesta(id_usuario, respuesta, tiempo_inicio)
-                
-                # Determinar si debemos enviar la encuesta
-                if not self.contexto_actual[id_usuario].get('encuesta_respondida', False):
-                    self.contexto_actual[id_usuario]['en_encuesta'] = True
-                    respuesta += "\n\n¿El problema o tu consulta fue resuelta? Responde Sí o No."
-                
-                return respuesta
-            else:
-                # Si no tenemos la matrícula, pedirla
-                respuesta = "Detecto que el APU no arranca. ¿Podrías indicarme la matrícula de la aeronave?"
-                self.registrar_respuesta(id_usuario, respuesta, tiempo_inicio)
-                return respuesta
-        
-        # Caso especial para "Tren de aterrizaje"
-        if (sistema == 'TREN') or ('tren' in mensaje_lower and 'aterrizaje' in mensaje_lower):
-            problema_tren = problema or 'REVISAR'  # Si no detectamos problema específico, asumir REVISAR
-            respuesta = self.manejar_tren_aterrizaje(id_usuario, problema_tren, matricula)
-            self.registrar_respuesta(id_usuario, respuesta, tiempo_inicio)
-            
-            # Determinar si debemos enviar la encuesta
-            if matricula and not self.contexto_actual[id_usuario].get('encuesta_respondida', False):
-                self.contexto_actual[id_usuario]['en_encuesta'] = True
-                respuesta += "\n\n¿El problema o tu consulta fue resuelta? Responde Sí o No."
-            
-            return respuesta
-        
-        # Caso especial para "Sistema eléctrico"
-        if (sistema == 'ELECTRICO') or ('electrico' in mensaje_lower or 'eléctrico' in mensaje_lower):
-            problema_elec = problema or 'REVISAR'  # Si no detectamos problema específico, asumir REVISAR
-            respuesta = self.manejar_sistema_electrico(id_usuario, problema_elec, matricula)
-            self.registrar_respuesta(id_usuario, respuesta, tiempo_inicio)
-            
-            # Determinar si debemos enviar la encuesta
-            if matricula and not self.contexto_actual[id_usuario].get('encuesta_respondida', False):
-                self.contexto_actual[id_usuario]['en_encuesta'] = True
-                respuesta += "\n\n¿El problema o tu consulta fue resuelta? Responde Sí o No."
-            
-            return respuesta
+        # Si ya tenemos la matrícula, dar la solución completa
+        if matricula or contexto.get('matricula'):
+            respuesta = self.manejar_apu_no_arranca(id_usuario, matricula)
+            self.registrar_respuesta(id_usuario, respuesta, tiempo_inicio, rama='automatica')
+            return self._agregar_encuesta(id_usuario, respuesta)
         
-        # Manejar mensajes cortos o ambiguos
-        if len(mensaje.strip()) <= 5:
-            respuesta = self.manejar_mensaje_corto(mensaje, id_usuario)
-            self.registrar_respuesta(id_usuario, respuesta, tiempo_inicio)
-            return respuesta
+        # Si no tenemos la matrícula, pedirla
+        respuesta = "Detecto que el APU no arranca. ¿Podrías indicarme la matrícula de la aeronave?"
+        self.registrar_respuesta(id_usuario, respuesta, tiempo_inicio, rama='otros')
+        return respuesta
+    
+    def _ruta_tren(self, analisis, id_usuario, tiempo_inicio):
+        _, problema, matricula = analisis.deteccion
+        # Si no detectamos problema específico, asumir REVISAR
+        respuesta = self.manejar_tren_aterrizaje(id_usuario, problema or 'REVISAR', matricula)
+        self.registrar_respuesta(id_usuario, respuesta, tiempo_inicio, rama='automatica')
+        return self._agregar_encuesta(id_usuario, respuesta, bool(matricula))
+    
+    def _ruta_electrico(self, analisis, id_usuario, tiempo_inicio):
+        _, problema, matricula = analisis.deteccion
+        # Si no detectamos problema específico, asumir REVISAR
+        respuesta = self.manejar_sistema_electrico(id_usuario, problema or 'REVISAR', matricula)
+        self.registrar_respuesta(id_usuario, respuesta, tiempo_inicio, rama='automatica')
+        return self._agregar_encuesta(id_usuario, respuesta, bool(matricula))
+    
+    def _ruta_mensaje_corto(self, analisis, id_usuario, tiempo_inicio):
+        respuesta = self.manejar_mensaje_corto(analisis.texto, id_usuario)
+        self.registrar_respuesta(id_usuario, respuesta, tiempo_inicio)
+        return respuesta
+    
+    def _ruta_normal(self, analisis, id_usuario, tiempo_inicio):
+        sistema, problema, matricula = analisis.deteccion
         
         # Detectar si hay un cambio de tema
-        if self.detectar_cambio_tema(mensaje, id_usuario):
+        if self.detectar_cambio_tema(analisis.texto, id_usuario, (sistema, problema)):
             # Reiniciar el contexto pero mantener el estado de la encuesta
             encuesta_respondida = self.contexto_actual[id_usuario].get('encuesta_respondida', False)
             self.contexto_actual[id_usuario] = {'encuesta_respondida': encuesta_respondida}
             print(f"Detectado cambio de tema para usuario {id_usuario}")
         
-        # Al final, registrar la respuesta y el tiempo
-        respuesta = self.procesar_mensaje_normal(mensaje, id_usuario, sistema, problema, matricula)
+        respuesta = self.procesar_mensaje_normal(analisis, id_usuario, sistema, problema, matricula)
         self.registrar_respuesta(id_usuario, respuesta, tiempo_inicio)
         
-        # Determinar si la conversación ha terminado y debemos enviar la encuesta
-        # Condiciones para considerar que una conversación ha terminado:
-        # 1. No es una solicitud de agente (porque eso derivaría a un humano)
-        # 2. No es una consulta urgente (porque eso requiere seguimiento)
-        # 3. No es un comando de ayuda o ejemplos (porque son informativos)
-        # 4. La respuesta contiene una solución completa (verificamos por palabras clave)
-        # 5. El usuario ha enviado al menos 2 mensajes (para evitar encuestas prematuras)
-        
+        # La conversación terminó (y corresponde la encuesta) si la respuesta parece una
+        # solución completa y el usuario ya envió al menos 2 mensajes; las solicitudes de
+        # agente, los casos urgentes y los comandos informativos tienen su propia ruta
         conversacion_terminada = (
-            not derivado_agente and 
-            not es_urgente and 
-            not mensaje_lower in ['ayuda', 'ejemplos'] and
             len(self.conversaciones.get(id_usuario, [])) >= 2 and
-            self._es_respuesta_final(respuesta) and
-            not self.contexto_actual[id_usuario].get('encuesta_respondida', False)  # No enviar si ya se respondió
+            self._es_respuesta_final(respuesta)
         )
-        
-        if conversacion_terminada:
-            # Añadir la encuesta al final de la respuesta
-            self.contexto_actual[id_usuario]['en_encuesta'] = True
-            respuesta += "\n\n¿El problema o tu consulta fue resuelta? Responde Sí o No."
-        
-        return respuesta
+        return self._agregar_encuesta(id_usuario, respuesta, conversacion_terminada)
     
-    def procesar_mensaje_normal(self, mensaje, id_usuario, sistema, problema, matricula):
-        """Procesa el mensaje normalmente"""
+    def procesar_mensaje_normal(self, analisis, id_usuario, sistema, problema, matricula):
+        """Procesa el mensaje (ya analizado) normalmente"""
         # Obtener contexto actual
         contexto = self.obtener_contexto(id_usuario)
         
         # Verificar si ya se respondió a la encuesta anteriormente
-        if contexto.get('encuesta_respondida', False) and mensaje.lower() != 'agente':
+        if contexto.get('encuesta_respondida', False) and analisis.comando != 'agente':
             # Si ya se respondió a la encuesta y no es una solicitud de agente,
             # iniciar una nueva conversación
             return "¿En qué más puedo ayudarte hoy? Por favor, describe tu consulta."
         
         # Verificar si el mensaje es una pregunta de seguimiento sobre un tema anterior
-        mensaje_lower = mensaje.lower()
         ultimo_tema = contexto.get('ultimo_tema', '')
         
         # Preguntas de seguimiento sobre reset
-        if ('como' in mensaje_lower or 'cómo' in mensaje_lower) and 'reset' in ultimo_tema:
+        if 'como' in analisis.plano and 'reset' in ultimo_tema:
             sistema = ultimo_tema.replace('reset_', '').upper()
             return self.manejar_reset_sistema(id_usuario, sistema)
         
-        # Lista ampliada de frases que indican que el usuario no necesita más ayuda
-        frases_despedida = [
-            'no', 'no gracias', 'no necesito más ayuda', 'no hay más', 'nada más', 'es todo',
-            'nada mas', 'nada mas gracias', 'eso es todo', 'listo', 'terminamos', 'gracias',
-            'muchas gracias', 'eso sería todo', 'no hay nada más', 'no hay nada mas',
-            'contactar', 'contáctar', 'contactame', 'contáctame'
-        ]
-        
         # Verificar si el mensaje indica que no necesita más ayuda
-        if any(frase in mensaje_lower for frase in frases_despedida):
+        if analisis.es_despedida:
             # Verificar si ya se ha enviado una encuesta anteriormente
             if not contexto.get('encuesta_respondida', False):
                 # Enviar la encuesta solo si no se ha respondido antes
@@ -644,8 +723,13 @@ class WhatsAppBot:
         
         # Si tenemos sistema y problema, generar respuesta
         if sistema and problema:
+            # Los últimos mensajes del usuario ordenan las secciones del manual por relevancia
+            mensajes_usuario = [m['mensaje'] for m in self.conversaciones[id_usuario] if m.get('tipo') == 'usuario']
+            consulta = ' '.join(mensajes_usuario[-5:]) or analisis.texto
+            
             # Generar una respuesta más completa que incluya palabras clave de solución
-            respuesta = self.generar_respuesta_automatica(sistema, problema)
+            respuesta = self.generar_respuesta_automatica(sistema, problema, consulta, matricula)
+            contexto['respuesta_automatica'] = True
             
             # Añadir un cierre que indique que es una respuesta final
             respuesta += "\n\nSi el problema persiste, proporciona más detalles o escribe 'agente' para hablar con un especialista."
@@ -653,6 +737,7 @@ class WhatsAppBot:
             return respuesta
         
         # Si no detectamos ni sistema ni problema, pedir más información
+        self._rama_actual.valor = 'fallback'
         return ("No pude identificar claramente tu consulta. Para ayudarte mejor, por favor especifica:\n"
                 "- El sistema afectado (APU, Motor, Tren, etc.)\n"
                 "- El problema (no arranca, no funciona, error, etc.)\n"
@@ -660,19 +745,18 @@ class WhatsAppBot:
                 "Ejemplo: 'El APU del CC-AWN no arranca'\n"
                 "Escribe 'ejemplos' para ver más casos de uso.")
     
-    def registrar_respuesta(self, id_usuario, respuesta, tiempo_inicio):
-        """Registra la respuesta del bot y el tiempo de respuesta"""
+    def registrar_respuesta(self, id_usuario, respuesta, tiempo_inicio, rama=None):
+        """Registra la respuesta del bot y el tiempo de respuesta en el histograma de su rama.
+        
+        Sin `rama` se usa la que haya marcado el método que armó la respuesta
+        (manual, automática o fallback), u 'otros'.
+        """
         tiempo_respuesta = time.time() - tiempo_inicio
+        rama = rama or getattr(self._rama_actual, 'valor', None) or 'otros'
+        self._rama_actual.valor = None
         
         # Actualizar tiempo promedio de respuesta
-        total_mensajes = self.stats["total_mensajes"]
-        tiempo_promedio_actual = self.stats["tiempo_respuesta_promedio"]
-        
-        if total_mensajes > 0:
-            nuevo_tiempo_promedio = (tiempo_promedio_actual * total_mensajes + tiempo_respuesta) / (total_mensajes + 1)
-            self.stats["tiempo_respuesta_promedio"] = nuevo_tiempo_promedio
-        else:
-            self.stats["tiempo_respuesta_promedio"] = tiempo_respuesta
+        self.registrar_evento({"tipo": "respuesta", "tiempo_respuesta": tiempo_respuesta, "rama": rama})
         
         # Guardar respuesta en historial
         self.conversaciones[id_usuario].append({
@@ -685,13 +769,19 @@ class WhatsAppBot:
     # Añadir un método para obtener estadísticas
     def obtener_estadisticas(self, start_date=None, end_date=None):
         """Devuelve un resumen de las estadísticas, opcionalmente filtrado por fechas"""
+        # Incorporar los eventos pendientes y los registrados por otros workers
+        self.escritor.vaciar()
+        with self._lock_estadisticas:
+            self.diario.actualizar(self.stats, self.aplicar_evento)
+            return self._resumen_estadisticas(start_date, end_date)
+    
+    def _resumen_estadisticas(self, start_date, end_date):
+        """Arma el resumen de estadísticas (requiere _lock_estadisticas)"""
         # Obtener la fecha actual
         fecha_actual = datetime.now().strftime("%Y-%m-%d")
         
-        # Obtener la fecha del primer registro (o usar None si no hay registros)
-        fecha_inicio = None
-        if self.stats["conversaciones"] and len(self.stats["conversaciones"]) > 0:
-            fecha_inicio = self.stats["conversaciones"][0]["fecha"].split()[0]  # Solo la parte de la fecha
+        # Fecha de la primera conversación registrada (None si no hay registros)
+        fecha_inicio = self.stats["fecha_inicio"]
         
         # Si no hay filtros de fecha, devolver todas las estadísticas
         if not start_date and not end_date:
@@ -699,8 +789,8 @@ class WhatsAppBot:
                 "total_conversaciones": self.stats["total_conversaciones"],
                 "total_mensajes": self.stats["total_mensajes"],
                 "tiempo_respuesta_promedio": round(self.stats["tiempo_respuesta_promedio"], 3),
-                "consultas_por_sistema": self.stats["consultas_por_sistema"],
-                "consultas_por_problema": self.stats["consultas_por_problema"],
+                "consultas_por_sistema": dict(self.stats["consultas_por_sistema"]),
+                "consultas_por_problema": dict(self.stats["consultas_por_problema"]),
                 "consultas_urgentes": self.stats["consultas_urgentes"],
                 "derivaciones_agente": self.stats["derivaciones_agente"],
                 "respuestas_automaticas": self.stats["respuestas_automaticas"],
@@ -709,28 +799,51 @@ class WhatsAppBot:
                 "start_date": start_date,
                 "end_date": end_date,
                 "consultas_satisfactorias": self.stats["consultas_satisfactorias"],
-                "total_encuestas": self.stats["total_encuestas"]
+                "total_encuestas": self.stats["total_encuestas"],
+                "latencias": self._resumen_latencias()
             }
         
-        # Para simplificar, si hay filtros de fecha pero no tenemos implementada la lógica completa,
-        # devolvemos las estadísticas completas pero incluimos los filtros en la respuesta
+        # Con filtros de fecha, combinar solo los buckets diarios/horarios del rango
+        rango = consultar_rango(self.stats["agregados"], start_date, end_date)
+        tiempo_promedio = rango["tiempo_respuesta_total"] / rango["respuestas"] if rango["respuestas"] else 0
         return {
-            "total_conversaciones": self.stats["total_conversaciones"],
-            "total_mensajes": self.stats["total_mensajes"],
-            "tiempo_respuesta_promedio": round(self.stats["tiempo_respuesta_promedio"], 3),
-            "consultas_por_sistema": self.stats["consultas_por_sistema"],
-            "consultas_por_problema": self.stats["consultas_por_problema"],
-            "consultas_urgentes": self.stats["consultas_urgentes"],
-            "derivaciones_agente": self.stats["derivaciones_agente"],
-            "respuestas_automaticas": self.stats["respuestas_automaticas"],
+            "total_conversaciones": rango["conversaciones"],
+            "total_mensajes": rango["mensajes"],
+            "tiempo_respuesta_promedio": round(tiempo_promedio, 3),
+            "consultas_por_sistema": rango["sistemas"],
+            "consultas_por_problema": rango["problemas"],
+            "consultas_urgentes": rango["urgentes"],
+            "derivaciones_agente": rango["derivaciones"],
+            "respuestas_automaticas": rango["automaticas"],
             "fecha_actual": fecha_actual,
             "fecha_inicio": fecha_inicio,
             "start_date": start_date,
             "end_date": end_date,
-            "consultas_satisfactorias": self.stats["consultas_satisfactorias"],
-            "total_encuestas": self.stats["total_encuestas"]
+            "consultas_satisfactorias": rango["satisfactorias"],
+            "total_encuestas": rango["encuestas"]
         }
 
+    def _resumen_latencias(self):
+        """p50/p95/p99 por rama y del total de respuestas (requiere _lock_estadisticas)"""
+        latencias = self.stats["latencias"]
+        resumen = {rama: resumir_histograma(histograma) for rama, histograma in latencias.items()}
+        resumen["total"] = resumir_histograma(combinar_histogramas(latencias.values()))
+        return resumen
+    
+    def obtener_metricas(self):
+        """Métricas operativas: latencia por rama, escrituras pendientes, caché de respuestas y configuración"""
+        pendientes = self.escritor.profundidad
+        self.escritor.vaciar()
+        with self._lock_estadisticas:
+            self.diario.actualizar(self.stats, self.aplicar_evento)
+            return {
+                "latencias": self._resumen_latencias(),
+                "total_respuestas": self.stats["total_respuestas"],
+                "escrituras_pendientes": pendientes,
+                "plantillas": self.plantillas.resumen(),
+                "configuracion": self.configuracion.resumen()
+            }
+
     def mostrar_ayuda(self):
         return """🔍 Bot de Mantenimiento MOC
 
@@ -785,48 +898,42 @@ Comandos disponibles:
 
 ¿Cuál es tu consulta?"""
 
-    def generar_respuesta_automatica(self, sistema, problema):
+    def generar_respuesta_automatica(self, sistema, problema, mensaje=None, matricula=None):
         """Genera una respuesta automática basada en el sistema y problema"""
-        # Primero intentar obtener una respuesta del manual
+        # Primero intentar obtener una respuesta del manual del tipo de la aeronave
         manual_response = None
         if hasattr(self, 'manual_knowledge'):
-            manual_response = self.manual_knowledge.get_response(sistema, problema)
+            manual_response = self.manual_knowledge.get_response(sistema, problema, mensaje, matricula)
         
         # Si hay una respuesta en el manual, usarla
         if manual_response:
-            return f"Según el manual de mantenimiento:\n\n{manual_response}\n\nSiguiendo estos pasos deberías resolver el problema. Si necesitas más información, escribe 'agente' para hablar con un especialista."
+            self._rama_actual.valor = 'manual'
+            return self.plantillas.renderizar('manual', seccion=manual_response)
         
         # Si no hay respuesta en el manual, usar las respuestas predefinidas
         key = (sistema, problema)
         if key in self.respuestas_automaticas:
+            self._rama_actual.valor = 'automatica'
             respuesta_base = random.choice(self.respuestas_automaticas[key])
             # Añadir un cierre que indique que es una respuesta final
-            return f"{respuesta_base}\n\nEspero que esto ayude a resolver tu problema. Si necesitas más asistencia, no dudes en proporcionar más detalles."
+            return self.plantillas.renderizar('automatica', respuesta=respuesta_base)
         
         # Si no hay respuesta predefinida, dar una respuesta genérica
-        return (f"He detectado un problema de {problema} en el sistema {sistema}. "
-                f"Para este tipo de situación, te recomiendo verificar lo siguiente:\n\n"
-                f"1. Comprobar las conexiones y suministro eléctrico\n"
-                f"2. Verificar si hay mensajes de error específicos\n"
-                f"3. Revisar el estado de los componentes relacionados\n\n"
-                f"Si el problema persiste, por favor proporciona más detalles o "
-                f"escribe 'agente' para hablar con un especialista de mantenimiento.")
+        self._rama_actual.valor = 'fallback'
+        return self.plantillas.renderizar('generica', sistema=sistema, problema=problema)
 
     def procesar_respuesta_encuesta(self, mensaje, id_usuario):
         """Procesa la respuesta de la encuesta de satisfacción"""
-        respuesta_normalizada = mensaje.lower().strip()
-        
-        # Verificar si la respuesta es válida con una lista más amplia de posibles respuestas
-        respuestas_positivas = ['si', 'sí', 's', 'yes', 'y', 'claro', 'por supuesto', 'afirmativo', 'correcto']
-        respuestas_negativas = ['no', 'n', 'not', 'nope', 'negativo', 'incorrecto', 'para nada']
+        # Sí / No / agente por palabras completas: "sí, gracias" o "no, sigue igual" también valen
+        respuesta_encuesta = self.analizar(mensaje).respuesta_encuesta
         
-        if any(resp == respuesta_normalizada for resp in respuestas_positivas):
+        if respuesta_encuesta == 'si':
             satisfaccion = True
             respuesta = "¡Gracias por tu feedback positivo! Nos alegra haber podido ayudarte. Si necesitas ayuda con otra consulta, escribe 'nueva consulta'."
-        elif any(resp == respuesta_normalizada for resp in respuestas_negativas):
+        elif respuesta_encuesta == 'no':
             satisfaccion = False
             respuesta = "Lamentamos no haber podido resolver tu consulta. ¿Deseas que un agente humano te contacte? Responde 'agente' si es así, o 'nueva consulta' para intentar con otro problema."
-        elif respuesta_normalizada == 'agente':
+        elif respuesta_encuesta == 'agente':
             # Si responde directamente "agente", iniciar recopilación de información
             self.contexto_actual[id_usuario]['en_encuesta'] = False
             self.contexto_actual[id_usuario]['encuesta_respondida'] = True
@@ -836,18 +943,7 @@ Comandos disponibles:
             return "Por favor, responde Sí o No. ¿El problema o tu consulta fue resuelta?"
         
         # Actualizar estadísticas
-        if 'consultas_satisfactorias' not in self.stats:
-            self.stats['consultas_satisfactorias'] = 0
-        
-        if 'total_encuestas' not in self.stats:
-            self.stats['total_encuestas'] = 0
-        
-        self.stats['total_encuestas'] += 1
-        if satisfaccion:
-            self.stats['consultas_satisfactorias'] += 1
-        
-        # Guardar estadísticas
-        self.guardar_estadisticas()
+        self.registrar_evento({"tipo": "encuesta", "satisfactoria": satisfaccion})
         
         # Finalizar la encuesta y marcar que ya se ha respondido
         self.contexto_actual[id_usuario]['en_encuesta'] = False
@@ -886,6 +982,11 @@ Comandos disponibles:
         else:
             self.contexto_actual[id_usuario] = {}
 
+    def manejar_apu_no_arranca(self, id_usuario, matricula=None):
+        """Pasos de verificación para un APU que no arranca"""
+        matricula_final = matricula or self.obtener_contexto(id_usuario).get('matricula')
+        return self.plantillas.renderizar('apu_no_arranca', matricula=matricula_final)
+    
     def manejar_tren_aterrizaje(self, id_usuario, problema, matricula=None):
         """Maneja específicamente casos relacionados con el tren de aterrizaje"""
         contexto = self.obtener_contexto(id_usuario)
@@ -894,28 +995,8 @@ Comandos disponibles:
         if matricula or contexto.get('matricula'):
             matricula_final = matricula or contexto.get('matricula')
             
-            if problema == 'REVISAR':
-                respuesta = (f"Para realizar un check del tren de aterrizaje en {matricula_final}, sigue estos pasos:\n\n"
-                            f"1. Verifica visualmente la condición de los componentes del tren\n"
-                            f"2. Comprueba la presión de los neumáticos (debe estar entre 180-210 PSI)\n"
-                            f"3. Verifica que no haya fugas hidráulicas en los actuadores\n"
-                            f"4. Comprueba el funcionamiento de las luces indicadoras\n"
-                            f"5. Verifica la correcta extensión y retracción del tren\n\n"
-                            f"Si encuentras alguna anomalía, regístrala en el libro de mantenimiento y notifica al equipo técnico.")
-            elif problema == 'NO_FUNCIONA':
-                respuesta = (f"Para problemas con el tren de aterrizaje que no funciona en {matricula_final}, verifica lo siguiente:\n\n"
-                            f"1. Comprueba el sistema hidráulico (presión y nivel de fluido)\n"
-                            f"2. Verifica los breakers relacionados con el sistema del tren\n"
-                            f"3. Inspecciona los actuadores y mecanismos de bloqueo\n"
-                            f"4. Comprueba el funcionamiento del sistema de emergencia\n"
-                            f"5. Verifica los sensores de posición del tren\n\n"
-                            f"Si el problema persiste, considera utilizar el procedimiento de extensión de emergencia y contacta al equipo de mantenimiento.")
-            else:
-                respuesta = (f"Para problemas con el tren de aterrizaje en {matricula_final}, verifica lo siguiente:\n\n"
-                            f"1. Comprueba el sistema hidráulico\n"
-                            f"2. Verifica los componentes mecánicos\n"
-                            f"3. Inspecciona los indicadores y sensores\n\n"
-                            f"Si necesitas asistencia específica, proporciona más detalles sobre el problema exacto.")
+            plantilla = {'REVISAR': 'tren_revisar', 'NO_FUNCIONA': 'tren_no_funciona'}.get(problema, 'tren_otro')
+            respuesta = self.plantillas.renderizar(plantilla, matricula=matricula_final)
             
             # Actualizar contexto
             contexto['sistema'] = 'TREN'
@@ -940,28 +1021,8 @@ Comandos disponibles:
         if matricula or contexto.get('matricula'):
             matricula_final = matricula or contexto.get('matricula')
             
-            if problema == 'REVISAR':
-                respuesta = (f"Para verificar el sistema eléctrico en {matricula_final}, sigue estos pasos:\n\n"
-                            f"1. Comprueba el estado de las baterías y su carga\n"
-                            f"2. Verifica el funcionamiento de los generadores principales\n"
-                            f"3. Inspecciona el panel de breakers y asegúrate de que todos estén en posición correcta\n"
-                            f"4. Comprueba las conexiones y cableado visible\n"
-                            f"5. Verifica el funcionamiento de los sistemas de iluminación\n\n"
-                            f"Si encuentras alguna anomalía, documéntala y notifica al equipo de mantenimiento.")
-            elif problema == 'NO_FUNCIONA':
-                respuesta = (f"Para problemas con el sistema eléctrico en {matricula_final}, verifica lo siguiente:\n\n"
-                            f"1. Comprueba si los generadores están funcionando correctamente\n"
-                            f"2. Verifica el estado de las baterías y su conexión\n"
-                            f"3. Inspecciona los breakers relacionados con el sistema afectado\n"
-                            f"4. Comprueba las conexiones y busca signos de daño en el cableado\n"
-                            f"5. Verifica si el APU puede proporcionar energía eléctrica de respaldo\n\n"
-                            f"Si el problema persiste después de estas verificaciones, contacta al equipo de mantenimiento para una inspección más detallada.")
-            else:
-                respuesta = (f"Para problemas con el sistema eléctrico en {matricula_final}, verifica lo siguiente:\n\n"
-                            f"1. Comprueba las baterías y generadores\n"
-                            f"2. Verifica los breakers y conexiones\n"
-                            f"3. Inspecciona el cableado visible\n\n"
-                            f"Si necesitas asistencia específica, proporciona más detalles sobre el problema exacto.")
+            plantilla = {'REVISAR': 'electrico_revisar', 'NO_FUNCIONA': 'electrico_no_funciona'}.get(problema, 'electrico_otro')
+            respuesta = self.plantillas.renderizar(plantilla, matricula=matricula_final)
             
             # Actualizar contexto
             contexto['sistema'] = 'ELECTRICO'
@@ -992,50 +1053,13 @@ Comandos disponibles:
         
         # Respuestas específicas según el sistema
         if sistema.upper() == 'APU':
-            respuesta = (
-                "Para realizar un reset del sistema APU, sigue estos pasos:\n\n"
-                "1. Asegúrate de que el APU esté completamente apagado (interruptor en posición OFF)\n"
-                "2. Localiza el panel de breakers relacionados con el APU\n"
-                "3. Identifica los breakers específicos del APU (normalmente etiquetados como 'APU CONTROL', 'APU STARTER', etc.)\n"
-                "4. Desconecta (pull) estos breakers y espera 30 segundos\n"
-                "5. Vuelve a conectar (push) los breakers en el mismo orden en que los desconectaste\n"
-                "6. Espera 2 minutos para que el sistema se reinicie completamente\n"
-                "7. Intenta arrancar el APU siguiendo el procedimiento normal\n\n"
-                "Si después del reset el APU sigue sin funcionar, será necesario contactar al equipo de mantenimiento para una inspección más detallada."
-            )
+            respuesta = self.plantillas.renderizar('reset_apu')
         elif sistema.upper() == 'ELECTRICO' or sistema.upper() == 'ELÉCTRICO':
-            respuesta = (
-                "Para realizar un reset del sistema eléctrico, sigue estos pasos:\n\n"
-                "1. Asegúrate de que todos los sistemas no esenciales estén apagados\n"
-                "2. Localiza el panel de breakers principal\n"
-                "3. Identifica los breakers del sistema eléctrico afectado\n"
-                "4. Desconecta (pull) estos breakers y espera 60 segundos\n"
-                "5. Vuelve a conectar (push) los breakers\n"
-                "6. Reinicia los sistemas afectados uno por uno\n\n"
-                "Si el problema persiste después del reset, contacta al equipo de mantenimiento."
-            )
+            respuesta = self.plantillas.renderizar('reset_electrico')
         elif sistema.upper() == 'TREN' or 'ATERRIZAJE' in sistema.upper():
-            respuesta = (
-                "Para realizar un reset del sistema de tren de aterrizaje, sigue estos pasos:\n\n"
-                "1. Asegúrate de que la aeronave esté en tierra y con los frenos aplicados\n"
-                "2. Localiza el panel de control hidráulico y eléctrico relacionado con el tren\n"
-                "3. Desconecta (pull) los breakers específicos del sistema de tren\n"
-                "4. Espera 60 segundos para que el sistema se descargue completamente\n"
-                "5. Vuelve a conectar (push) los breakers\n"
-                "6. Verifica el funcionamiento del sistema mediante las luces indicadoras\n\n"
-                "Nota: Este procedimiento debe realizarse siguiendo el manual de mantenimiento específico de la aeronave."
-            )
+            respuesta = self.plantillas.renderizar('reset_tren')
         else:
-            respuesta = (
-                f"Para realizar un reset del sistema {sistema}, generalmente debes seguir estos pasos:\n\n"
-                f"1. Consulta el manual de mantenimiento específico para {sistema}\n"
-                f"2. Localiza los breakers relacionados con el sistema\n"
-                f"3. Desconecta (pull) los breakers específicos\n"
-                f"4. Espera el tiempo recomendado (generalmente 30-60 segundos)\n"
-                f"5. Vuelve a conectar (push) los breakers\n"
-                f"6. Reinicia el sistema siguiendo el procedimiento normal\n\n"
-                f"Para instrucciones más detalladas, consulta el manual de mantenimiento de la aeronave."
-            )
+            respuesta = self.plantillas.renderizar('reset_otro', sistema=sistema)
         
         # Actualizar contexto para mantener el tema de la conversación
         contexto['ultimo_tema'] = f"reset_{sistema.lower()}"
@@ -1069,7 +1093,7 @@ Comandos disponibles:
             if sistema == 'APU' and problema == 'NO_ARRANCA':
                 return self.manejar_apu_no_arranca(id_usuario, matricula)
             elif sistema == 'APU' and problema == 'NO_FUNCIONA':
-                return self.manejar_apu_no_funciona(id_usuario, matricula)
+                return self.generar_respuesta_automatica(sistema, problema, matricula=matricula)
             elif sistema == 'TREN':
                 return self.manejar_tren_aterrizaje(id_usuario, problema, matricula)
             elif sistema == 'ELECTRICO':
@@ -1082,8 +1106,11 @@ Comandos disponibles:
                 "- La matrícula de la aeronave\n\n"
                 "Ejemplo: 'El APU del CC-AWN no arranca'")
 
-    def detectar_cambio_tema(self, mensaje, id_usuario):
-        """Detecta si el mensaje indica un cambio de tema en la conversación"""
+    def detectar_cambio_tema(self, mensaje, id_usuario, deteccion=None):
+        """Detecta si el mensaje indica un cambio de tema en la conversación.
+        
+        `deteccion` es el (sistema, problema) ya detectado en el mensaje, si lo hay.
+        """
         contexto = self.obtener_contexto(id_usuario)
         
         # Si no hay contexto previo, no hay cambio de tema
@@ -1091,7 +1118,7 @@ Comandos disponibles:
             return False
         
         # Detectar sistema y problema en el mensaje actual
-        sistema_actual, problema_actual, _ = self.detectar_sistema_y_problema(mensaje)
+        sistema_actual, problema_actual = deteccion or self.detectar_sistema_y_problema(mensaje)[:2]
         
         # Si detectamos un sistema o problema diferente al del contexto, es un cambio de tema
         if sistema_actual and sistema_actual != contexto.get('sistema'):
@@ -1103,23 +1130,9 @@ Comandos disponibles:
         return False
 
     def es_mensaje_despedida(self, mensaje):
-        """Detecta si el mensaje es una despedida o indica que no se necesita más ayuda"""
-        mensaje_lower = mensaje.lower()
-        
-        # Lista ampliada de frases que indican que el usuario no necesita más ayuda
-        frases_despedida = [
-            'no', 'no gracias', 'no necesito más ayuda', 'no hay más', 'nada más', 'es todo',
-            'nada mas', 'nada mas gracias', 'eso es todo', 'listo', 'terminamos', 'gracias',
-            'muchas gracias', 'eso sería todo', 'no hay nada más', 'no hay nada mas',
-            'contactar', 'contáctar', 'contactame', 'contáctame'
-        ]
-        
-        # Verificar si alguna de las frases está en el mensaje
-        for frase in frases_despedida:
-            if frase in mensaje_lower:
-                return True
-        
-        return False
+        """Detecta si el mensaje (texto o MensajeAnalizado) es una despedida o indica que no se necesita más ayuda"""
+        analisis = mensaje if isinstance(mensaje, MensajeAnalizado) else self.analizar(mensaje)
+        return analisis.es_despedida
 
     def procesar_recopilacion_info_agente(self, mensaje, id_usuario):
         """Procesa la información recopilada para derivar a un agente"""
@@ -1238,8 +1251,7 @@ Comandos disponibles:
             )
             
             # Marcar como derivado a agente en estadísticas
-            self.stats['derivaciones_agente'] += 1
-            self.guardar_estadisticas()
+            self.registrar_evento({"tipo": "derivacion"})
             
             self.contexto_actual[id_usuario] = contexto
             return resumen
@@ -1270,7 +1282,7 @@ Comandos disponibles:
             mensaje += "Por favor, indica el sistema afectado (APU, Motor, Tren, etc.):\n"
             contexto['paso_recopilacion'] = 'sistema'
             self.contexto_actual[id_usuario] = contexto
-            self.registrar_respuesta(id_usuario, mensaje, tiempo_inicio)
+            self.registrar_respuesta(id_usuario, mensaje, tiempo_inicio, rama='agente')
             return mensaje
         
         if problema:
@@ -1279,7 +1291,7 @@ Comandos disponibles:
             mensaje += "Por favor, describe el problema específico:\n"
             contexto['paso_recopilacion'] = 'problema'
             self.contexto_actual[id_usuario] = contexto
-            self.registrar_respuesta(id_usuario, mensaje, tiempo_inicio)
+            self.registrar_respuesta(id_usuario, mensaje, tiempo_inicio, rama='agente')
             return mensaje
         
         if matricula:
@@ -1292,5 +1304,5 @@ Comandos disponibles:
             contexto['paso_recopilacion'] = 'matricula'
         
         self.contexto_actual[id_usuario] = contexto
-        self.registrar_respuesta(id_usuario, mensaje, tiempo_inicio)
+        self.registrar_respuesta(id_usuario, mensaje, tiempo_inicio, rama='agente')
         return mensaje
\ No newline at end of file
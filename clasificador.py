@@ -0,0 +1,128 @@
+import re
+
+# Formatos de matrícula aceptados, en orden de preferencia: CC-XXX, CC XXX, CCXXX
+PATRON_MATRICULA = r'cc(?:-|\s+)?[a-z]{3}'
+_PATRON_MATRICULA_CAPTURA = r'cc(?P<separador>-|\s+)?[a-z]{3}'
+
+
+def _construir_trie(palabras):
+    """Construye un trie de caracteres a partir de una lista de palabras clave"""
+    trie = {}
+    for palabra in palabras:
+        nodo = trie
+        for caracter in palabra:
+            nodo = nodo.setdefault(caracter, {})
+        nodo[''] = palabra
+    return trie
+
+
+def _trie_a_patron(nodo):
+    """Convierte un nodo del trie en una expresión regular que prefiere la coincidencia más larga"""
+    ramas = [re.escape(caracter) + _trie_a_patron(hijo)
+             for caracter, hijo in sorted(nodo.items()) if caracter]
+    if not ramas:
+        return ''
+    patron = ramas[0] if len(ramas) == 1 else '(?:' + '|'.join(ramas) + ')'
+    if '' in nodo:
+        # Palabra terminal: el resto es opcional, pero se intenta primero el camino más largo
+        patron = '(?:' + patron + ')?'
+    return patron
+
+
+class Clasificacion:
+    """Resultado de clasificar un mensaje: categorías encontradas por grupo y matrícula"""
+
+    def __init__(self, encontrados, orden, matricula):
+        self.encontrados = encontrados
+        self.matricula = matricula
+        self._orden = orden
+
+    def primera(self, grupo):
+        """Devuelve la categoría del grupo declarada primero entre las encontradas"""
+        categorias = self.encontrados.get(grupo)
+        if not categorias:
+            return None
+        orden = self._orden[grupo]
+        return min(categorias, key=orden.__getitem__)
+
+    def contiene(self, grupo, categoria):
+        """Indica si la categoría del grupo aparece en el mensaje"""
+        return categoria in self.encontrados.get(grupo, ())
+
+
+class ClasificadorMensajes:
+    """Clasificador de palabras clave compilado una sola vez.
+
+    Todas las palabras clave de todos los grupos se combinan en una única
+    expresión regular con forma de trie (estilo Aho-Corasick), de modo que
+    el costo por mensaje depende del largo del mensaje y no del tamaño del
+    vocabulario. Una sola pasada encuentra todas las coincidencias de
+    sistemas, problemas y matrícula.
+    """
+
+    def __init__(self, grupos):
+        # grupos: {'sistema': {'APU': ['apu', ...], ...}, 'problema': {...}}
+        self.grupos = grupos
+        self._orden = {}
+        etiquetas_por_palabra = {}
+        for grupo, categorias in grupos.items():
+            self._orden[grupo] = {categoria: i for i, categoria in enumerate(categorias)}
+            for categoria, palabras in categorias.items():
+                for palabra in palabras:
+                    etiquetas_por_palabra.setdefault(palabra.lower(), set()).add((grupo, categoria))
+
+        trie = _construir_trie(etiquetas_por_palabra)
+
+        # En cada posición la expresión devuelve solo la palabra más larga; como toda
+        # palabra que empieza en esa posición es prefijo de la más larga, se le asignan
+        # también las etiquetas de sus prefijos para no perder ninguna coincidencia.
+        self._etiquetas = {}
+        for palabra in etiquetas_por_palabra:
+            etiquetas = set()
+            nodo = trie
+            for caracter in palabra:
+                nodo = nodo[caracter]
+                if '' in nodo:
+                    etiquetas |= etiquetas_por_palabra[nodo['']]
+            self._etiquetas[palabra] = frozenset(etiquetas)
+
+        patron_palabras = _trie_a_patron(trie) if trie else '(?!)'
+        self._patron = re.compile(
+            rf'(?={patron_palabras}|{PATRON_MATRICULA})'
+            rf'(?:(?=(?P<palabra>{patron_palabras})))?'
+            rf'(?:(?=(?P<matricula>{_PATRON_MATRICULA_CAPTURA})))?'
+        )
+
+    def clasificar(self, mensaje):
+        """Recorre el mensaje una sola vez y devuelve todas las categorías encontradas"""
+        texto = mensaje.lower()
+        encontrados = {}
+        mejor_matricula = None
+        for coincidencia in self._patron.finditer(texto):
+            palabra = coincidencia.group('palabra')
+            if palabra:
+                for grupo, categoria in self._etiquetas[palabra]:
+                    encontrados.setdefault(grupo, set()).add(categoria)
+            if coincidencia.group('matricula') and (
+                    mejor_matricula is None or
+                    self._prioridad_matricula(coincidencia) < self._prioridad_matricula(mejor_matricula)):
+                mejor_matricula = coincidencia
+        matricula = self._formatear_matricula(mejor_matricula) if mejor_matricula else None
+        return Clasificacion(encontrados, self._orden, matricula)
+
+    @staticmethod
+    def _prioridad_matricula(coincidencia):
+        separador = coincidencia.group('separador')
+        if separador == '-':
+            return 0
+        return 1 if separador else 2
+
+    @staticmethod
+    def _formatear_matricula(coincidencia):
+        texto = coincidencia.group('matricula').upper()
+        separador = coincidencia.group('separador')
+        if separador == '-':
+            return texto
+        if separador:
+            return texto.replace(' ', '-')
+        return f"{texto[:2]}-{texto[2:]}"
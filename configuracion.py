@@ -0,0 +1,168 @@
+import os
+import json
+import threading
+import time
+
+from clasificador import ClasificadorMensajes
+from plantillas import compilar_plantilla
+
+RUTA_POR_DEFECTO = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'configuracion.json')
+
+# Vocabularios {categoría: [palabras]} obligatorios en el archivo
+VOCABULARIOS = ('sistemas', 'problemas', 'sistemas_deteccion', 'problemas_deteccion')
+
+
+def _validar_vocabulario(nombre, vocabulario):
+    if not isinstance(vocabulario, dict) or not all(
+            isinstance(palabras, list) and all(isinstance(p, str) and p for p in palabras)
+            for palabras in vocabulario.values()):
+        raise ValueError(f"'{nombre}' debe ser un objeto {{categoría: [palabras]}}")
+
+
+def _validar_textos(nombre, textos):
+    if not isinstance(textos, list) or not textos or not all(isinstance(t, str) and t for t in textos):
+        raise ValueError(f"'{nombre}' debe ser una lista de textos no vacía")
+
+
+class Configuracion:
+    """Vocabulario y respuestas de una versión del archivo, ya compilados.
+
+    Es inmutable una vez creada: una recarga arma una instancia nueva y la
+    reemplaza entera, así quien tomó la anterior la puede seguir usando
+    hasta terminar su mensaje sin ver una mezcla de versiones.
+    """
+
+    __slots__ = ('version', 'sistemas', 'problemas', 'sistemas_deteccion', 'problemas_deteccion',
+                 'clasificador', 'respuestas_automaticas', 'respuestas_especificas', 'plantillas')
+
+    def __init__(self, datos):
+        if not isinstance(datos, dict):
+            raise ValueError("la configuración debe ser un objeto JSON")
+        version = datos.get('version')
+        if not isinstance(version, int) or isinstance(version, bool):
+            raise ValueError("falta 'version' (entero)")
+        for nombre in VOCABULARIOS:
+            _validar_vocabulario(nombre, datos.get(nombre))
+        revision = datos.get('palabras_revision', [])
+        genericas = datos.get('palabras_genericas', [])
+        _validar_vocabulario('palabras_revision', {'REVISAR': revision})
+        _validar_vocabulario('palabras_genericas', {'NO_FUNCIONA': genericas})
+
+        automaticas = {}
+        for sistema, por_problema in datos.get('respuestas_automaticas', {}).items():
+            for problema, textos in por_problema.items():
+                _validar_textos(f"respuestas_automaticas.{sistema}.{problema}", textos)
+                automaticas[(sistema, problema)] = tuple(textos)
+        especificas = datos.get('respuestas_especificas', {})
+        for clave, texto in especificas.items():
+            _validar_textos(f"respuestas_especificas.{clave}", [texto])
+        plantillas = {nombre: compilar_plantilla(nombre, texto)
+                      for nombre, texto in datos.get('plantillas', {}).items()}
+
+        self.version = version
+        self.sistemas = datos['sistemas']
+        self.problemas = datos['problemas']
+        self.sistemas_deteccion = datos['sistemas_deteccion']
+        self.problemas_deteccion = datos['problemas_deteccion']
+        # Clasificador compilado una sola vez con todo el vocabulario de detección
+        self.clasificador = ClasificadorMensajes({
+            'sistema': self.sistemas_deteccion,
+            'problema': self.problemas_deteccion,
+            'revision': {'REVISAR': revision},
+            'generico': {'NO_FUNCIONA': genericas}
+        })
+        self.respuestas_automaticas = automaticas
+        self.respuestas_especificas = dict(especificas)
+        self.plantillas = plantillas
+
+
+def leer_configuracion(ruta):
+    """Lee y compila el archivo; lanza ValueError/OSError si no sirve"""
+    with open(ruta, 'r', encoding='utf-8') as f:
+        return Configuracion(json.load(f))
+
+
+class ConfiguracionRecargable:
+    """Configuración del bot que se recarga sola cuando cambia el archivo.
+
+    `actual` es siempre una `Configuracion` completa: leerla no toma ningún
+    lock. Un hilo de cada proceso revisa el archivo cada `intervalo`
+    segundos; si cambió, lo compila aparte y recién entonces reemplaza
+    `actual` (copy-on-write), así los mensajes en curso no esperan ni notan
+    la recarga. Si el archivo nuevo tiene errores se informa y se sigue con
+    la versión anterior. `al_cambiar(nueva)` se llama después de cada cambio.
+    """
+
+    def __init__(self, ruta=None, intervalo=2.0, al_cambiar=None):
+        self.ruta = ruta or RUTA_POR_DEFECTO
+        self.intervalo = intervalo
+        self.al_cambiar = al_cambiar
+        self.recargas = 0
+        self.errores = 0
+        self._firma = self._firma_archivo()
+        self.actual = leer_configuracion(self.ruta)
+        self.cargada = time.time()
+        self._lock_recarga = threading.Lock()
+        self._detener = threading.Event()
+        self._hilo = None
+
+    def _firma_archivo(self):
+        try:
+            estado = os.stat(self.ruta)
+        except OSError:
+            return None
+        return estado.st_mtime_ns, estado.st_size
+
+    def iniciar(self):
+        """Arranca el hilo que vigila el archivo (en cada worker, después del fork)"""
+        if self._hilo is None and self.intervalo > 0:
+            with self._lock_recarga:
+                if self._hilo is None:
+                    self._hilo = threading.Thread(target=self._vigilar, name='configuracion', daemon=True)
+                    self._hilo.start()
+
+    def _vigilar(self):
+        while not self._detener.wait(self.intervalo):
+            self.revisar()
+
+    def revisar(self):
+        """Recarga si el archivo cambió desde la última lectura; devuelve True si hubo cambio"""
+        firma = self._firma_archivo()
+        if firma is None or firma == self._firma:
+            return False
+        return self.recargar(firma)
+
+    def recargar(self, firma=None):
+        with self._lock_recarga:
+            firma = firma or self._firma_archivo()
+            anterior = self.actual
+            try:
+                nueva = leer_configuracion(self.ruta)
+            except Exception as e:
+                # Se anota la firma igual: un archivo a medio escribir cambiará de nuevo al terminar
+                self._firma = firma
+                self.errores += 1
+                print(f"Error al recargar la configuración {self.ruta}: {e}")
+                return False
+            self._firma = firma
+            self.actual = nueva
+            self.recargas += 1
+            self.cargada = time.time()
+            if self.al_cambiar:
+                try:
+                    self.al_cambiar(nueva)
+                except Exception as e:
+                    print(f"Error al aplicar la configuración nueva: {e}")
+        print(f"Configuración recargada: versión {anterior.version} -> {nueva.version}")
+        return True
+
+    def detener(self):
+        self._detener.set()
+        if self._hilo is not None:
+            self._hilo.join()
+            self._hilo = None
+
+    def resumen(self):
+        return {"version": self.actual.version, "ruta": self.ruta, "recargas": self.recargas,
+                "errores": self.errores,
+                "cargada": time.strftime('%Y-%m-%d %H:%M:%S', time.localtime(self.cargada))}
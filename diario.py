@@ -0,0 +1,133 @@
+import os
+import json
+import time
+
+
+class DiarioEventos:
+    """Diario de eventos de solo anexado con snapshots compactados.
+
+    Cada cambio de estado se escribe como una línea JSON (un delta) al final
+    del diario, por lo que el costo de persistir un evento es O(1) sin importar
+    cuánta historia exista. El fsync se hace por lotes (cada `lote_fsync`
+    eventos o cada `intervalo_fsync` segundos) y cada `eventos_por_snapshot`
+    eventos el estado completo se guarda en un snapshot y el diario se trunca.
+    Al cargar se lee el snapshot y se reproducen los eventos posteriores.
+    """
+
+    def __init__(self, ruta_snapshot, ruta_diario, obtener_estado, lote_fsync=32,
+                 intervalo_fsync=1.0, eventos_por_snapshot=1000):
+        self.ruta_snapshot = ruta_snapshot
+        self.ruta_diario = ruta_diario
+        self.obtener_estado = obtener_estado
+        self.lote_fsync = lote_fsync
+        self.intervalo_fsync = intervalo_fsync
+        self.eventos_por_snapshot = eventos_por_snapshot
+
+        self.secuencia = 0
+        self._archivo = None
+        self._pendientes_fsync = 0
+        self._ultimo_fsync = time.monotonic()
+        self._eventos_desde_snapshot = 0
+
+    def cargar(self, estado_inicial, aplicar):
+        """Carga el último snapshot y reproduce los eventos del diario sobre él"""
+        estado = estado_inicial()
+        if os.path.exists(self.ruta_snapshot):
+            try:
+                with open(self.ruta_snapshot, 'r', encoding='utf-8') as f:
+                    snapshot = json.load(f)
+                # Los snapshots antiguos (volcado completo de estadísticas) no tienen secuencia
+                self.secuencia = snapshot.pop("_secuencia", 0)
+                estado.update(snapshot)
+            except Exception as e:
+                print(f"Error al cargar snapshot de estadísticas: {e}")
+
+        if os.path.exists(self.ruta_diario):
+            completo = 0
+            with open(self.ruta_diario, 'rb') as f:
+                for linea in f:
+                    if not linea.endswith(b"\n"):
+                        # Última línea a medio escribir por una caída: se descarta del archivo
+                        # para que el próximo evento no quede pegado a ella
+                        print("Se descartó una línea incompleta al final del diario de estadísticas")
+                        break
+                    completo += len(linea)
+                    try:
+                        registro = json.loads(linea.decode('utf-8'))
+                    except ValueError:
+                        print("Se omitió una línea ilegible del diario de estadísticas")
+                        continue
+                    if registro["seq"] <= self.secuencia:
+                        continue
+                    aplicar(estado, registro["evento"])
+                    self.secuencia = registro["seq"]
+                    self._eventos_desde_snapshot += 1
+            if completo < os.path.getsize(self.ruta_diario):
+                with open(self.ruta_diario, 'r+b') as f:
+                    f.truncate(completo)
+        return estado
+
+    def registrar(self, evento):
+        """Anexa un evento al diario"""
+        self.registrar_lote([evento])
+
+    def registrar_lote(self, eventos):
+        """Anexa varios eventos al diario con una sola escritura"""
+        if not eventos:
+            return
+        if self._archivo is None:
+            self._archivo = open(self.ruta_diario, 'a', encoding='utf-8')
+        lineas = []
+        for evento in eventos:
+            self.secuencia += 1
+            lineas.append(json.dumps({"seq": self.secuencia, "evento": evento}, ensure_ascii=False) + "\n")
+        self._archivo.write("".join(lineas))
+        self._archivo.flush()
+        self._pendientes_fsync += len(eventos)
+        self._eventos_desde_snapshot += len(eventos)
+
+        if (self._pendientes_fsync >= self.lote_fsync or
+                time.monotonic() - self._ultimo_fsync >= self.intervalo_fsync):
+            self.sincronizar()
+
+        if self._eventos_desde_snapshot >= self.eventos_por_snapshot:
+            self.compactar()
+
+    def actualizar(self, estado, aplicar):
+        """Un diario en archivo tiene un solo escritor: no hay eventos ajenos que aplicar"""
+
+    def sincronizar(self):
+        """Fuerza a disco los eventos escritos desde el último fsync"""
+        if self._archivo is not None and self._pendientes_fsync:
+            os.fsync(self._archivo.fileno())
+        self._pendientes_fsync = 0
+        self._ultimo_fsync = time.monotonic()
+
+    def compactar(self):
+        """Guarda un snapshot del estado actual y trunca el diario"""
+        snapshot = dict(self.obtener_estado())
+        snapshot["_secuencia"] = self.secuencia
+        ruta_temporal = self.ruta_snapshot + ".tmp"
+        try:
+            with open(ruta_temporal, 'w', encoding='utf-8') as f:
+                json.dump(snapshot, f, ensure_ascii=False)
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(ruta_temporal, self.ruta_snapshot)
+        except Exception as e:
+            print(f"Error al guardar snapshot de estadísticas: {e}")
+            return
+
+        # El snapshot ya contiene todos los eventos; el diario puede empezar vacío
+        if self._archivo is not None:
+            self._archivo.close()
+        self._archivo = open(self.ruta_diario, 'w', encoding='utf-8')
+        self._pendientes_fsync = 0
+        self._eventos_desde_snapshot = 0
+
+    def cerrar(self):
+        """Sincroniza y cierra el diario"""
+        if self._archivo is not None:
+            self.sincronizar()
+            self._archivo.close()
+            self._archivo = None
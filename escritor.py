@@ -0,0 +1,112 @@
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+
+
+class EscritorDiferido:
+    """Cola de escritura diferida (write-behind) con un hilo escritor propio.
+
+    Los hilos que atienden mensajes solo encolan; el hilo escritor junta todo
+    lo pendiente y llama a `persistir(pendientes)` una vez cada `intervalo`
+    segundos, o antes si la cola llega a `umbral` elementos. `vaciar()` hace
+    lo mismo en el hilo que lo llama (para leer lo recién registrado) y
+    `cerrar()` detiene el hilo dejando todo escrito. Con `intervalo <= 0` no
+    hay hilo y cada `encolar` persiste en el momento. `agrupar()` retiene la
+    cola mientras dura un lote, pero nunca más allá de `umbral` elementos ni
+    de `max_retencion` segundos: lotes superpuestos no frenan la escritura.
+    """
+
+    def __init__(self, persistir, intervalo=1.0, umbral=256, max_retencion=5.0):
+        self.persistir = persistir
+        self.intervalo = intervalo
+        self.umbral = umbral
+        self.max_retencion = max_retencion
+
+        self._cola = deque()
+        self._condicion = threading.Condition()
+        self._lock_vaciado = threading.Lock()
+        self._agrupados = 0
+        self._retenido_desde = time.monotonic()
+        self._hilo = None
+        self._cerrado = False
+
+    @property
+    def profundidad(self):
+        """Elementos encolados que todavía no se escribieron"""
+        return len(self._cola)
+
+    def encolar(self, elemento):
+        self._cola.append(elemento)
+        if self.intervalo <= 0 or self._cerrado:
+            if not self._retener():
+                self.vaciar()
+            return
+        if self._hilo is None:
+            self._iniciar()
+        if len(self._cola) >= self.umbral:
+            with self._condicion:
+                self._condicion.notify()
+
+    def _iniciar(self):
+        with self._condicion:
+            # El hilo se crea al primer uso: después del fork de cada worker de gunicorn
+            if self._hilo is None:
+                self._hilo = threading.Thread(target=self._bucle, name='escritor', daemon=True)
+                self._hilo.start()
+
+    def _bucle(self):
+        while True:
+            with self._condicion:
+                self._condicion.wait_for(self._hay_que_escribir, self.intervalo)
+                if self._cerrado:
+                    return
+            if not self._retener():
+                self.vaciar()
+
+    def _hay_que_escribir(self):
+        return self._cerrado or len(self._cola) >= self.umbral
+
+    def _retener(self):
+        """Indica si un lote en curso todavía puede retener la cola"""
+        return bool(self._agrupados and len(self._cola) < self.umbral and
+                    time.monotonic() - self._retenido_desde < self.max_retencion)
+
+    def vaciar(self):
+        """Persiste ahora todo lo encolado, en orden de llegada"""
+        with self._lock_vaciado:
+            self._retenido_desde = time.monotonic()
+            pendientes = []
+            while self._cola:
+                pendientes.append(self._cola.popleft())
+            if not pendientes:
+                return
+            try:
+                self.persistir(pendientes)
+            except Exception as e:
+                print(f"Error en la escritura diferida: {e}")
+
+    @contextmanager
+    def agrupar(self):
+        """Retiene las escrituras mientras dura el bloque (con los límites de arriba); al salir se escribe todo junto"""
+        with self._condicion:
+            if not self._agrupados:
+                self._retenido_desde = time.monotonic()
+            self._agrupados += 1
+        try:
+            yield
+        finally:
+            with self._condicion:
+                self._agrupados -= 1
+            if not self._agrupados:
+                self.vaciar()
+
+    def cerrar(self):
+        """Detiene el hilo escritor y escribe lo que quede en la cola"""
+        with self._condicion:
+            self._cerrado = True
+            self._condicion.notify()
+        if self._hilo is not None:
+            self._hilo.join()
+            self._hilo = None
+        self.vaciar()
@@ -0,0 +1,161 @@
+import re
+import math
+import heapq
+import unicodedata
+
+# Palabras, números y códigos con guiones o barras (ej. "21-51-00", "p/n")
+PATRON_TOKEN = re.compile(r'[a-z0-9]+(?:[-/.][a-z0-9]+)*')
+
+PALABRAS_VACIAS = frozenset([
+    'a', 'al', 'con', 'de', 'del', 'el', 'en', 'es', 'la', 'las', 'lo', 'los', 'no', 'o', 'para',
+    'por', 'que', 'se', 'su', 'un', 'una', 'y', 'and', 'for', 'in', 'is', 'of', 'on', 'or', 'the', 'to'
+])
+
+
+def normalizar(texto):
+    """Minúsculas y sin tildes"""
+    texto = unicodedata.normalize('NFD', texto.lower())
+    return ''.join(c for c in texto if unicodedata.category(c) != 'Mn')
+
+
+def tokenizar(texto):
+    """Tokens normalizados del texto, sin palabras vacías"""
+    return [token for token in PATRON_TOKEN.findall(normalizar(texto)) if token not in PALABRAS_VACIAS]
+
+
+class BuscadorBM25:
+    """Ranking BM25 sobre postings con los pesos ya calculados.
+
+    Las subclases indican de dónde se leen los postings, las secciones y los
+    candidatos de cada (sistema, problema): de memoria (IndiceBM25) o de un
+    archivo mapeado (BaseBinaria). Ofrece la misma interfaz de consulta que
+    ManualKnowledge, así sirve de lector de solo lectura para el bot.
+    """
+
+    def _postings(self, termino):
+        """Pares (sección, peso) del término"""
+        raise NotImplementedError
+
+    def _candidatos(self, sistema, problema):
+        """Secciones del par (sistema, problema) en su orden original y como conjunto"""
+        raise NotImplementedError
+
+    def _seccion(self, doc_id):
+        raise NotImplementedError
+
+    def buscar(self, consulta, sistema=None, problema=None, k=3):
+        """Devuelve hasta k secciones ordenadas por relevancia.
+
+        Si se indican sistema y problema, solo se consideran las secciones
+        clasificadas con ese par; las que no comparten términos con la consulta
+        quedan al final en su orden original.
+        """
+        candidatos = permitidos = None
+        if sistema and problema:
+            candidatos, permitidos = self._candidatos(sistema, problema)
+            if not candidatos:
+                return []
+
+        puntajes = {}
+        for termino in set(tokenizar(consulta or '')):
+            for doc_id, peso in self._postings(termino):
+                if permitidos is None or doc_id in permitidos:
+                    puntajes[doc_id] = puntajes.get(doc_id, 0.0) + peso
+
+        mejores = heapq.nlargest(k, puntajes.items(), key=lambda item: (item[1], -item[0]))
+        resultado = [self._seccion(doc_id) for doc_id, _ in mejores]
+        if len(resultado) < k and candidatos is not None:
+            for doc_id in candidatos:
+                if doc_id not in puntajes:
+                    resultado.append(self._seccion(doc_id))
+                    if len(resultado) == k:
+                        break
+        return resultado
+
+    def get_response(self, system, problem, message=None):
+        """Obtiene una respuesta para un sistema y problema específicos"""
+        if message:
+            resultados = self.buscar(message, system, problem, k=1)
+            return resultados[0] if resultados else None
+        candidatos, _ = self._candidatos(system, problem)
+        return self._seccion(candidatos[0]) if candidatos else None
+
+    def get_all_responses(self, system, problem):
+        """Obtiene todas las respuestas para un sistema y problema específicos"""
+        candidatos, _ = self._candidatos(system, problem)
+        return [self._seccion(doc_id) for doc_id in candidatos or ()]
+
+    def search(self, message, system=None, problem=None, k=3):
+        """Devuelve las k secciones más relevantes para el mensaje del usuario"""
+        return self.buscar(message, system, problem, k)
+
+
+class IndiceBM25(BuscadorBM25):
+    """Índice invertido con ranking BM25 sobre las secciones del manual.
+
+    Los pesos BM25 de cada (término, sección) se calculan al construir el
+    índice, así una consulta solo suma los pesos de las listas de postings de
+    sus propios términos, sin volver a tokenizar las secciones. Cada lista
+    abarca todo el manual (el filtro por sistema y problema se aplica al
+    recorrerla), por lo que el costo crece con la cantidad de secciones que
+    contienen esos términos.
+    """
+
+    def __init__(self, secciones, por_etiqueta=None, k1=1.5, b=0.75):
+        # secciones: lista de textos; por_etiqueta: (sistema, problema) -> posiciones en `secciones`
+        self.secciones = secciones
+        self.postings = {}
+        self.por_etiqueta = por_etiqueta or {}
+        self._conjuntos = {etiqueta: frozenset(docs) for etiqueta, docs in self.por_etiqueta.items()}
+
+        frecuencias = []
+        longitudes = []
+        for seccion in secciones:
+            tokens = tokenizar(seccion)
+            longitudes.append(len(tokens))
+            frecuencia = {}
+            for token in tokens:
+                frecuencia[token] = frecuencia.get(token, 0) + 1
+            frecuencias.append(frecuencia)
+
+        total = len(secciones)
+        promedio = (sum(longitudes) / total) if total else 0
+        documentos_por_termino = {}
+        for frecuencia in frecuencias:
+            for termino in frecuencia:
+                documentos_por_termino[termino] = documentos_por_termino.get(termino, 0) + 1
+
+        for doc_id, frecuencia in enumerate(frecuencias):
+            normalizacion = k1 * (1 - b + b * longitudes[doc_id] / promedio) if promedio else k1
+            for termino, tf in frecuencia.items():
+                df = documentos_por_termino[termino]
+                idf = math.log(1 + (total - df + 0.5) / (df + 0.5))
+                peso = idf * tf * (k1 + 1) / (tf + normalizacion)
+                self.postings.setdefault(termino, []).append((doc_id, peso))
+
+    @classmethod
+    def desde_base(cls, knowledge_base):
+        """Construye el índice desde {sistema: {problema: [secciones]}}, sin repetir secciones"""
+        posiciones = {}
+        secciones = []
+        por_etiqueta = {}
+        for sistema, problemas in knowledge_base.items():
+            for problema, textos in problemas.items():
+                documentos = por_etiqueta[(sistema, problema)] = []
+                for texto in textos:
+                    doc_id = posiciones.get(texto)
+                    if doc_id is None:
+                        doc_id = posiciones[texto] = len(secciones)
+                        secciones.append(texto)
+                    documentos.append(doc_id)
+        return cls(secciones, por_etiqueta)
+
+    def _postings(self, termino):
+        return self.postings.get(termino, ())
+
+    def _candidatos(self, sistema, problema):
+        etiqueta = (sistema, problema)
+        return self.por_etiqueta.get(etiqueta), self._conjuntos.get(etiqueta)
+
+    def _seccion(self, doc_id):
+        return self.secciones[doc_id]
@@ -0,0 +1,366 @@
+import os
+import re
+import json
+import time
+import hashlib
+from itertools import repeat
+from concurrent.futures import ProcessPoolExecutor
+
+# Una sección que no terminó en su página se une con el texto de la siguiente,
+# salvo que ya sea más larga que esto (texto sin puntuación que nunca cierra)
+MAX_ARRASTRE = 5000
+
+# PyPDF2 y NLTK solo se importan al ingerir: el bot no los necesita para responder
+_sent_tokenize = None
+
+
+def tokenizador_oraciones():
+    """Carga NLTK (y descarga el modelo punkt si falta) la primera vez que se usa"""
+    global _sent_tokenize
+    if _sent_tokenize is None:
+        import nltk
+        from nltk.tokenize import sent_tokenize
+        try:
+            nltk.data.find('tokenizers/punkt')
+        except LookupError:
+            nltk.download('punkt')
+        _sent_tokenize = sent_tokenize
+    return _sent_tokenize
+
+
+def huella_texto(texto):
+    """Huella corta de un texto, para comparar sin guardarlo"""
+    return hashlib.sha1(texto.encode('utf-8')).hexdigest() if texto else ""
+
+
+def huellas_paginas(ruta_pdf):
+    """Huella del contenido de cada página, sin extraer su texto.
+
+    Se calcula sobre el stream de contenido de la página, que es mucho más
+    barato de leer que `extract_text`, y cambia cuando cambia lo que se dibuja.
+    """
+    import PyPDF2
+
+    huellas = []
+    with open(ruta_pdf, 'rb') as f:
+        for pagina in PyPDF2.PdfReader(f).pages:
+            contenido = pagina.get_contents()
+            datos = contenido.get_data() if contenido is not None else b""
+            huellas.append(hashlib.sha256(datos).hexdigest())
+    return huellas
+
+
+def extraer_paginas(ruta_pdf, inicio, fin):
+    """Genera el texto de las páginas [inicio, fin) del PDF, una a la vez"""
+    import PyPDF2
+
+    with open(ruta_pdf, 'rb') as f:
+        reader = PyPDF2.PdfReader(f)
+        for numero in range(inicio, fin):
+            try:
+                yield reader.pages[numero].extract_text() or ""
+            except Exception as e:
+                print(f"Error al extraer la página {numero + 1}: {e}")
+                yield ""
+
+
+def dividir_en_secciones(texto):
+    """Divide el texto en secciones (párrafos)"""
+    # Eliminar saltos de línea múltiples
+    texto = re.sub(r'\n+', '\n', texto)
+
+    # Dividir por párrafos (bloques separados por líneas en blanco)
+    parrafos = re.split(r'\n\s*\n', texto)
+
+    # Dividir párrafos largos en oraciones
+    secciones = []
+    for parrafo in parrafos:
+        if len(parrafo.split()) > 50:  # Si el párrafo es muy largo
+            secciones.extend(tokenizador_oraciones()(parrafo))
+        else:
+            secciones.append(parrafo)
+
+    return [s.strip() for s in secciones if s.strip()]
+
+
+def clasificar_seccion(seccion, palabras_sistema, palabras_problema):
+    """Devuelve los sistemas y problemas mencionados en la sección"""
+    texto = seccion.lower()
+    sistemas = [sistema for sistema, palabras in palabras_sistema.items()
+                if any(palabra in texto for palabra in palabras)]
+    problemas = [problema for problema, palabras in palabras_problema.items()
+                 if any(palabra in texto for palabra in palabras)]
+    return sistemas, problemas
+
+
+def agregar_seccion(base, seccion, sistemas, problemas):
+    """Agrega la sección a la base bajo cada par (sistema, problema)"""
+    for sistema in sistemas:
+        por_problema = base.setdefault(sistema, {})
+        for problema in problemas:
+            por_problema.setdefault(problema, []).append(seccion)
+
+
+def combinar_bases(destino, parcial):
+    """Agrega las secciones de una base parcial al final de las de `destino`"""
+    for sistema, problemas in parcial.items():
+        por_problema = destino.setdefault(sistema, {})
+        for problema, secciones in problemas.items():
+            por_problema.setdefault(problema, []).extend(secciones)
+    return destino
+
+
+def nuevos_tiempos():
+    """Segundos acumulados por etapa dentro de las tareas"""
+    return {"extraccion": 0.0, "division": 0.0, "clasificacion": 0.0}
+
+
+def procesar_pagina(texto, arrastre, palabras_sistema, palabras_problema, tiempos=None):
+    """Divide y clasifica una página.
+
+    `arrastre` es la última sección de la página anterior, que puede continuar
+    en esta. Devuelve las secciones clasificadas como [texto, sistemas,
+    problemas], la última sección (que queda pendiente para la página
+    siguiente) y cuántas secciones se cerraron en la página.
+    """
+    inicio = time.perf_counter()
+    if arrastre:
+        texto = arrastre + "\n" + texto
+    secciones = dividir_en_secciones(texto)
+    salida = ""
+    if secciones and len(secciones[-1]) <= MAX_ARRASTRE:
+        salida = secciones.pop()
+    divididas = time.perf_counter()
+    clasificadas = []
+    for seccion in secciones:
+        sistemas, problemas = clasificar_seccion(seccion, palabras_sistema, palabras_problema)
+        if sistemas and problemas:
+            clasificadas.append([seccion, sistemas, problemas])
+    if tiempos is not None:
+        tiempos["division"] += divididas - inicio
+        tiempos["clasificacion"] += time.perf_counter() - divididas
+    return clasificadas, salida, len(secciones)
+
+
+def procesar_rango(ruta_pdf, inicio, fin, arrastre, palabras_sistema, palabras_problema):
+    """Tarea de un proceso: extrae, divide y clasifica las páginas [inicio, fin).
+
+    Devuelve el texto de la primera página (por si el arrastre supuesto para
+    ella resulta incorrecto), un registro por página y el tiempo de cada etapa.
+    """
+    tiempos = nuevos_tiempos()
+    primer_texto = None
+    registros = []
+    paginas = extraer_paginas(ruta_pdf, inicio, fin)
+    while True:
+        comienzo = time.perf_counter()
+        texto = next(paginas, None)
+        tiempos["extraccion"] += time.perf_counter() - comienzo
+        if texto is None:
+            break
+        if primer_texto is None:
+            primer_texto = texto
+        secciones, salida, total = procesar_pagina(texto, arrastre, palabras_sistema, palabras_problema, tiempos)
+        registros.append({"entrada": huella_texto(arrastre), "secciones": secciones, "salida": salida,
+                          "total": total})
+        arrastre = salida
+    return primer_texto, registros, tiempos
+
+
+def cargar_manifiesto(ruta_manifiesto, firma):
+    """Registros de la ingesta anterior indexados por (huella de página, huella del arrastre)"""
+    if not ruta_manifiesto or not os.path.exists(ruta_manifiesto):
+        return {}
+    try:
+        with open(ruta_manifiesto, 'r', encoding='utf-8') as f:
+            manifiesto = json.load(f)
+    except Exception as e:
+        print(f"Error al cargar el manifiesto de ingesta: {e}")
+        return {}
+    if manifiesto.get("firma") != firma:
+        # Cambiaron las palabras clave: las clasificaciones guardadas ya no sirven
+        return {}
+    return {(pagina["hash"], pagina["entrada"]): pagina for pagina in manifiesto["paginas"]}
+
+
+def guardar_json_atomico(ruta, datos, **opciones):
+    """Escribe el JSON en un temporal y lo reemplaza, así un lector nunca ve un archivo a medias"""
+    ruta_temporal = ruta + ".tmp"
+    with open(ruta_temporal, 'w', encoding='utf-8') as f:
+        json.dump(datos, f, ensure_ascii=False, **opciones)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(ruta_temporal, ruta)
+
+
+def guardar_manifiesto(ruta_manifiesto, firma, paginas):
+    """Guarda el manifiesto de forma atómica"""
+    try:
+        guardar_json_atomico(ruta_manifiesto, {"firma": firma, "paginas": paginas})
+    except Exception as e:
+        print(f"Error al guardar el manifiesto de ingesta: {e}")
+
+
+def _tareas_pendientes(huellas, cache, paginas_por_tarea):
+    """Agrupa en tareas de hasta `paginas_por_tarea` las páginas que no están en el manifiesto"""
+    conocidas = {huella for huella, _ in cache}
+    salidas = {huella: registro["salida"] for (huella, _), registro in cache.items()}
+    tareas = []
+    numero = 0
+    while numero < len(huellas):
+        if huellas[numero] in conocidas:
+            numero += 1
+            continue
+        fin = numero
+        while fin < len(huellas) and fin - numero < paginas_por_tarea and huellas[fin] not in conocidas:
+            fin += 1
+        # Se supone el arrastre guardado de la página anterior; se verifica al armar la base
+        arrastre = salidas.get(huellas[numero - 1], "") if numero else ""
+        tareas.append((numero, fin, arrastre))
+        numero = fin
+    return tareas
+
+
+def ingerir_pdf(ruta_pdf, palabras_sistema, palabras_problema, procesos=None, paginas_por_tarea=16,
+                ruta_manifiesto=None):
+    """Ingiere el PDF en un pool de procesos, reutilizando las páginas sin cambios.
+
+    Con `ruta_manifiesto` se guarda, por huella de contenido de cada página,
+    el resultado de dividirla y clasificarla; en la siguiente ingesta solo se
+    extraen las páginas cuya huella no está en el manifiesto (aunque hayan
+    cambiado de posición). Las páginas a extraer se reparten en tareas por
+    tramos y luego la base se arma en orden de página, verificando el texto
+    arrastrado entre páginas, así el resultado es el mismo que el de una
+    ingesta secuencial completa. Devuelve la base y las estadísticas de la
+    corrida.
+    """
+    inicio = time.perf_counter()
+    etapas = nuevos_tiempos()
+    huellas = huellas_paginas(ruta_pdf)
+    firma = huella_texto(json.dumps([palabras_sistema, palabras_problema, MAX_ARRASTRE], sort_keys=True))
+    cache = cargar_manifiesto(ruta_manifiesto, firma)
+    tareas = _tareas_pendientes(huellas, cache, paginas_por_tarea)
+    procesos = min(procesos or os.cpu_count() or 1, len(tareas)) or 1
+    etapas["huellas"] = time.perf_counter() - inicio
+
+    comienzo = time.perf_counter()
+    argumentos = (repeat(ruta_pdf), [t[0] for t in tareas], [t[1] for t in tareas], [t[2] for t in tareas],
+                  repeat(palabras_sistema), repeat(palabras_problema))
+    nuevos = {}
+    textos = {}
+    if procesos == 1:
+        resultados = map(procesar_rango, *argumentos)
+    else:
+        executor = ProcessPoolExecutor(max_workers=procesos)
+        resultados = executor.map(procesar_rango, *argumentos)
+    try:
+        for (primera, _, _), (texto, registros, tiempos) in zip(tareas, resultados):
+            textos[primera] = texto
+            for desplazamiento, registro in enumerate(registros):
+                nuevos[primera + desplazamiento] = registro
+            for etapa, segundos in tiempos.items():
+                etapas[etapa] += segundos
+    finally:
+        if procesos > 1:
+            executor.shutdown()
+    extraidas = len(nuevos)
+    etapas["tareas"] = time.perf_counter() - comienzo
+
+    comienzo = time.perf_counter()
+    base = {}
+    paginas = []
+    arrastre = ""
+    secciones_totales = 0
+    for numero, huella in enumerate(huellas):
+        entrada = huella_texto(arrastre)
+        registro = nuevos.get(numero)
+        if registro is None or registro["entrada"] != entrada:
+            registro = cache.get((huella, entrada))
+        if registro is None:
+            # La página anterior arrastró un texto distinto al supuesto: se divide de nuevo
+            texto = textos.get(numero)
+            if texto is None:
+                texto = next(extraer_paginas(ruta_pdf, numero, numero + 1))
+                extraidas += 1
+            secciones, salida, total = procesar_pagina(texto, arrastre, palabras_sistema, palabras_problema, etapas)
+            registro = {"entrada": entrada, "secciones": secciones, "salida": salida, "total": total}
+        paginas.append({"hash": huella, "entrada": entrada, "secciones": registro["secciones"],
+                        "salida": registro["salida"], "total": registro.get("total", len(registro["secciones"]))})
+        secciones_totales += paginas[-1]["total"]
+        for seccion, sistemas, problemas in registro["secciones"]:
+            agregar_seccion(base, seccion, sistemas, problemas)
+        arrastre = registro["salida"]
+
+    clasificadas = [registro["secciones"] for registro in paginas]
+    if arrastre:
+        secciones_totales += 1
+        sistemas, problemas = clasificar_seccion(arrastre, palabras_sistema, palabras_problema)
+        if sistemas and problemas:
+            agregar_seccion(base, arrastre, sistemas, problemas)
+            clasificadas.append([[arrastre, sistemas, problemas]])
+    etapas["armado"] = time.perf_counter() - comienzo
+
+    if ruta_manifiesto:
+        comienzo = time.perf_counter()
+        guardar_manifiesto(ruta_manifiesto, firma, paginas)
+        etapas["manifiesto"] = time.perf_counter() - comienzo
+
+    por_sistema = {}
+    por_problema = {}
+    total_clasificadas = 0
+    for secciones in clasificadas:
+        for _, sistemas, problemas in secciones:
+            total_clasificadas += 1
+            for sistema in sistemas:
+                por_sistema[sistema] = por_sistema.get(sistema, 0) + 1
+            for problema in problemas:
+                por_problema[problema] = por_problema.get(problema, 0) + 1
+
+    total = len(huellas)
+    segundos = time.perf_counter() - inicio
+    estadisticas = {
+        "manual": ruta_pdf,
+        "paginas": total,
+        "extraidas": extraidas,
+        "reutilizadas": total - extraidas,
+        "procesos": procesos,
+        "secciones": secciones_totales,
+        "clasificadas": total_clasificadas,
+        "por_sistema": por_sistema,
+        "por_problema": por_problema,
+        "etapas": {etapa: round(valor, 3) for etapa, valor in etapas.items()},
+        "segundos": round(segundos, 3),
+        "paginas_por_segundo": round(total / segundos, 1) if segundos else 0.0
+    }
+    print(f"Ingesta de {ruta_pdf}: {total} páginas ({extraidas} extraídas, {total - extraidas} sin cambios) "
+          f"en {segundos:.1f} s ({estadisticas['paginas_por_segundo']} páginas/s, {procesos} procesos)")
+    return base, estadisticas
+
+
+def ingerir_manuales(rutas_pdf, ruta_base, palabras_sistema, palabras_problema, procesos=None,
+                     paginas_por_tarea=16, carpeta_manifiestos=None):
+    """Ingiere varios manuales en una sola base y la guarda en `ruta_base`.
+
+    Se escriben el JSON y la versión binaria (.mkb) que abre el bot, ambos de
+    forma atómica. Los manifiestos van a `carpeta_manifiestos` (por defecto la
+    carpeta de la base), uno por manual. Devuelve las estadísticas de cada
+    manual y los segundos que llevó escribir la base.
+    """
+    from base_binaria import escribir_base_binaria
+
+    carpeta_manifiestos = carpeta_manifiestos or os.path.dirname(os.path.abspath(ruta_base))
+    os.makedirs(carpeta_manifiestos, exist_ok=True)
+    base = {}
+    estadisticas = []
+    for ruta_pdf in rutas_pdf:
+        nombre = os.path.splitext(os.path.basename(ruta_pdf))[0]
+        parcial, estadistica = ingerir_pdf(
+            ruta_pdf, palabras_sistema, palabras_problema, procesos, paginas_por_tarea,
+            ruta_manifiesto=os.path.join(carpeta_manifiestos, nombre + '.manifest.json'))
+        combinar_bases(base, parcial)
+        estadisticas.append(estadistica)
+
+    inicio = time.perf_counter()
+    guardar_json_atomico(ruta_base, base, indent=2)
+    escribir_base_binaria(os.path.splitext(ruta_base)[0] + '.mkb', base)
+    return estadisticas, time.perf_counter() - inicio
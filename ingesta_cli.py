@@ -0,0 +1,101 @@
+import os
+import sys
+import time
+import argparse
+
+from ingesta import ingerir_manuales
+
+ETAPAS = (
+    ("huellas", "huellas de páginas"),
+    ("extraccion", "extracción de texto*"),
+    ("division", "división en secciones*"),
+    ("clasificacion", "clasificación*"),
+    ("tareas", "tareas en paralelo"),
+    ("armado", "armado de la base"),
+    ("manifiesto", "manifiesto"),
+)
+
+
+def crear_parser():
+    parser = argparse.ArgumentParser(
+        description="Ingiere manuales en PDF y escribe la base de conocimiento que usa el bot.")
+    parser.add_argument("pdfs", nargs="+", help="manuales a ingerir (AMM, TSM, MEL...)")
+    parser.add_argument("--tipo", help="tipo de aeronave (ej. A320); sin tipo se escribe la base general")
+    parser.add_argument("--logs", default="logs", help="directorio de datos del bot (por defecto: logs)")
+    parser.add_argument("--procesos", type=int, default=None, help="procesos de extracción (por defecto: CPUs)")
+    parser.add_argument("--paginas-por-tarea", type=int, default=16, help="páginas por tarea (por defecto: 16)")
+    return parser
+
+
+def destino(logs, tipo):
+    """Ruta de la base y carpeta de manifiestos donde las busca el bot"""
+    if tipo:
+        carpeta = os.path.join(logs, 'manuales', tipo)
+        return os.path.join(carpeta, 'knowledge_base.json'), carpeta
+    return os.path.join(logs, 'knowledge_base.json'), os.path.join(logs, 'manifiestos')
+
+
+def porcentaje(parte, total):
+    return (100.0 * parte / total) if total else 0.0
+
+
+def imprimir_reporte(estadisticas, segundos_escritura, segundos_totales):
+    """Resumen por manual, tiempos por etapa y tasas de clasificación"""
+    print()
+    print(f"{'Manual':<32} {'Páginas':>8} {'Extraídas':>10} {'Secciones':>10} {'Clasif.':>8} {'Tasa':>7} {'Págs/s':>8}")
+    for e in estadisticas:
+        print(f"{os.path.basename(e['manual'])[:32]:<32} {e['paginas']:>8} {e['extraidas']:>10} "
+              f"{e['secciones']:>10} {e['clasificadas']:>8} {porcentaje(e['clasificadas'], e['secciones']):>6.1f}% "
+              f"{e['paginas_por_segundo']:>8}")
+
+    paginas = sum(e['paginas'] for e in estadisticas)
+    secciones = sum(e['secciones'] for e in estadisticas)
+    clasificadas = sum(e['clasificadas'] for e in estadisticas)
+    print(f"{'TOTAL':<32} {paginas:>8} {sum(e['extraidas'] for e in estadisticas):>10} {secciones:>10} "
+          f"{clasificadas:>8} {porcentaje(clasificadas, secciones):>6.1f}% "
+          f"{round(paginas / segundos_totales, 1) if segundos_totales else 0.0:>8}")
+
+    print("\nTiempo por etapa (s):")
+    for clave, nombre in ETAPAS:
+        print(f"  {nombre:<26} {sum(e['etapas'].get(clave, 0.0) for e in estadisticas):8.2f}")
+    print(f"  {'escritura de la base':<26} {segundos_escritura:8.2f}")
+    print(f"  {'total':<26} {segundos_totales:8.2f}")
+    print("  (*) suma de todos los procesos; corre dentro de las tareas en paralelo")
+
+    for campo, titulo in (("por_sistema", "sistema"), ("por_problema", "problema")):
+        conteo = {}
+        for e in estadisticas:
+            for clave, cantidad in e[campo].items():
+                conteo[clave] = conteo.get(clave, 0) + cantidad
+        print(f"\nSecciones clasificadas por {titulo}:")
+        for clave, cantidad in sorted(conteo.items(), key=lambda item: -item[1]):
+            print(f"  {clave:<14} {cantidad:>8}  ({porcentaje(cantidad, secciones):.1f}% de las secciones)")
+
+
+def main(argv=None):
+    argumentos = crear_parser().parse_args(argv)
+    faltantes = [ruta for ruta in argumentos.pdfs if not os.path.exists(ruta)]
+    if faltantes:
+        print(f"Error: no se encontraron los archivos {', '.join(faltantes)}")
+        return 1
+
+    # El stack de extracción solo se carga aquí, nunca en el arranque del bot
+    from pdf_knowledge import ManualKnowledge
+    plantilla = ManualKnowledge()
+    ruta_base, carpeta_manifiestos = destino(argumentos.logs, argumentos.tipo)
+
+    inicio = time.perf_counter()
+    try:
+        estadisticas, segundos_escritura = ingerir_manuales(
+            argumentos.pdfs, ruta_base, plantilla.system_keywords, plantilla.problem_keywords,
+            argumentos.procesos, argumentos.paginas_por_tarea, carpeta_manifiestos)
+    except Exception as e:
+        print(f"Error al ingerir los manuales: {e}")
+        return 1
+    imprimir_reporte(estadisticas, segundos_escritura, time.perf_counter() - inicio)
+    print(f"\nBase de conocimiento guardada en {ruta_base} (y {os.path.splitext(ruta_base)[0]}.mkb)")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,53 @@
+import bisect
+
+# Límites superiores (segundos) de buckets logarítmicos: 0.1 ms a ~105 s con cuatro buckets por
+# duplicación, así un percentil se informa con un error relativo menor al 19 %
+LIMITES = [0.0001 * 2 ** (i / 4) for i in range(81)]
+PERCENTILES = (50, 95, 99)
+
+
+def nuevo_histograma():
+    """Histograma vacío; el último conteo acumula lo que supera el mayor límite"""
+    return {"conteos": [0] * (len(LIMITES) + 1), "cantidad": 0, "suma": 0.0, "maximo": 0.0}
+
+
+def registrar_latencia(histograma, segundos):
+    histograma["conteos"][bisect.bisect_left(LIMITES, segundos)] += 1
+    histograma["cantidad"] += 1
+    histograma["suma"] += segundos
+    histograma["maximo"] = max(histograma["maximo"], segundos)
+
+
+def combinar_histogramas(histogramas):
+    total = nuevo_histograma()
+    for histograma in histogramas:
+        total["conteos"] = [a + b for a, b in zip(total["conteos"], histograma["conteos"])]
+        total["cantidad"] += histograma["cantidad"]
+        total["suma"] += histograma["suma"]
+        total["maximo"] = max(total["maximo"], histograma["maximo"])
+    return total
+
+
+def percentil(histograma, p):
+    """Límite superior del bucket donde cae el percentil p (acotado por el máximo observado)"""
+    if not histograma["cantidad"]:
+        return 0.0
+    objetivo = histograma["cantidad"] * p / 100.0
+    acumulado = 0
+    for indice, conteo in enumerate(histograma["conteos"]):
+        acumulado += conteo
+        if conteo and acumulado >= objetivo:
+            limite = LIMITES[indice] if indice < len(LIMITES) else histograma["maximo"]
+            return min(limite, histograma["maximo"])
+    return histograma["maximo"]
+
+
+def resumir_histograma(histograma):
+    """Cantidad, promedio, p50/p95/p99 y máximo, en milisegundos"""
+    cantidad = histograma["cantidad"]
+    resumen = {"cantidad": cantidad,
+               "promedio_ms": round(1000 * histograma["suma"] / cantidad, 3) if cantidad else 0.0}
+    for p in PERCENTILES:
+        resumen[f"p{p}_ms"] = round(1000 * percentil(histograma, p), 3)
+    resumen["maximo_ms"] = round(1000 * histograma["maximo"], 3)
+    return resumen
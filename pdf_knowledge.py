@@ -1,20 +1,15 @@
 import os
-import PyPDF2
-import re
 import json
-import nltk
-from nltk.tokenize import sent_tokenize
-
-# Descargar recursos necesarios de NLTK
-try:
-    nltk.data.find('tokenizers/punkt')
-except LookupError:
-    nltk.download('punkt')
+from indice_manual import IndiceBM25
+from ingesta import ingerir_pdf, dividir_en_secciones, clasificar_seccion, agregar_seccion, combinar_bases
 
 class ManualKnowledge:
-    def __init__(self, pdf_path=None):
+    def __init__(self, pdf_path=None, processes=None):
         self.pdf_path = pdf_path
+        self.processes = processes
         self.knowledge_base = {}
+        self.ingestion_stats = None
+        self._indice = None
         self.system_keywords = {
             'APU': ['apu', 'auxiliary power unit', 'unidad auxiliar'],
             'MOTOR': ['motor', 'engine', 'turbina', 'propulsor', 'powerplant'],
@@ -41,79 +36,35 @@ class ManualKnowledge:
             print(f"Error: No se puede encontrar el archivo PDF en {self.pdf_path}")
             return
         
-        # Extraer texto del PDF
-        text = self._extract_text_from_pdf()
-        
-        # Dividir en secciones (párrafos)
-        sections = self._split_into_sections(text)
-        
-        # Clasificar secciones por sistema y problema
-        self._classify_sections(sections)
-        
-        # Guardar la base de conocimiento
-        self._save_knowledge_base()
-    
-    def _extract_text_from_pdf(self):
-        """Extrae todo el texto del PDF"""
-        text = ""
+        # Extraer, dividir y clasificar en paralelo solo las páginas que cambiaron
+        manifest_path = os.path.splitext(self.pdf_path)[0] + '.manifest.json'
         try:
-            with open(self.pdf_path, 'rb') as file:
-                reader = PyPDF2.PdfReader(file)
-                for page_num in range(len(reader.pages)):
-                    page = reader.pages[page_num]
-                    text += page.extract_text() + "\n"
-            return text
+            partial_base, self.ingestion_stats = ingerir_pdf(
+                self.pdf_path, self.system_keywords, self.problem_keywords, self.processes,
+                ruta_manifiesto=manifest_path)
         except Exception as e:
             print(f"Error al extraer texto del PDF: {e}")
-            return ""
+            partial_base = {}
+        combinar_bases(self.knowledge_base, partial_base)
+        self._indice = None
+        
+        # Guardar la base de conocimiento
+        self._save_knowledge_base()
     
     def _split_into_sections(self, text):
         """Divide el texto en secciones (párrafos)"""
-        # Eliminar saltos de línea múltiples
-        text = re.sub(r'\n+', '\n', text)
-        
-        # Dividir por párrafos (bloques separados por líneas en blanco)
-        paragraphs = re.split(r'\n\s*\n', text)
-        
-        # Dividir párrafos largos en oraciones
-        sections = []
-        for paragraph in paragraphs:
-            if len(paragraph.split()) > 50:  # Si el párrafo es muy largo
-                sentences = sent_tokenize(paragraph)
-                sections.extend(sentences)
-            else:
-                sections.append(paragraph)
-        
-        return [s.strip() for s in sections if s.strip()]
+        return dividir_en_secciones(text)
     
     def _classify_sections(self, sections):
         """Clasifica las secciones por sistema y problema"""
         for section in sections:
-            section_lower = section.lower()
-            
-            # Detectar sistemas mencionados
-            systems_found = []
-            for system, keywords in self.system_keywords.items():
-                if any(keyword in section_lower for keyword in keywords):
-                    systems_found.append(system)
-            
-            # Detectar problemas mencionados
-            problems_found = []
-            for problem, keywords in self.problem_keywords.items():
-                if any(keyword in section_lower for keyword in keywords):
-                    problems_found.append(problem)
+            systems_found, problems_found = clasificar_seccion(
+                section, self.system_keywords, self.problem_keywords)
             
             # Si se encontró al menos un sistema y un problema, guardar la sección
             if systems_found and problems_found:
-                for system in systems_found:
-                    if system not in self.knowledge_base:
-                        self.knowledge_base[system] = {}
-                    
-                    for problem in problems_found:
-                        if problem not in self.knowledge_base[system]:
-                            self.knowledge_base[system][problem] = []
-                        
-                        self.knowledge_base[system][problem].append(section)
+                self._indice = None
+                agregar_seccion(self.knowledge_base, section, systems_found, problems_found)
     
     def _save_knowledge_base(self):
         """Guarda la base de conocimiento en un archivo JSON"""
@@ -130,17 +81,33 @@ class ManualKnowledge:
         try:
             with open(json_path, 'r', encoding='utf-8') as f:
                 self.knowledge_base = json.load(f)
+            self._indice = None
             print(f"Base de conocimiento cargada desde {json_path}")
             return True
         except Exception as e:
             print(f"Error al cargar la base de conocimiento: {e}")
             return False
     
-    def get_response(self, system, problem):
+    @property
+    def indice(self):
+        """Índice BM25 de las secciones, construido al primer uso"""
+        if self._indice is None:
+            self._indice = IndiceBM25.desde_base(self.knowledge_base)
+        return self._indice
+    
+    def search(self, message, system=None, problem=None, k=3):
+        """Devuelve las k secciones más relevantes para el mensaje del usuario"""
+        return self.indice.buscar(message, system, problem, k)
+    
+    def get_response(self, system, problem, message=None):
         """Obtiene una respuesta para un sistema y problema específicos"""
         if system in self.knowledge_base and problem in self.knowledge_base[system]:
-            # Devolver la sección más relevante (la primera por ahora)
-            return self.knowledge_base[system][problem][0]
+            if message:
+                # Devolver la sección mejor rankeada para las palabras del usuario
+                resultados = self.search(message, system, problem, k=1)
+                return resultados[0] if resultados else None
+            secciones = self.knowledge_base[system][problem]
+            return secciones[0] if secciones else None
         return None
     
     def get_all_responses(self, system, problem):
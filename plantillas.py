@@ -0,0 +1,166 @@
+import threading
+from string import Formatter
+
+# Campos que pueden usar las plantillas de respuesta
+CAMPOS = frozenset(('sistema', 'problema', 'matricula', 'seccion', 'respuesta'))
+
+PLANTILLAS = {
+    'apu_no_arranca': (
+        "Para solucionar el problema de APU que no arranca en {matricula}, verifica lo siguiente:\n\n"
+        "1. Comprueba que el interruptor de control del APU esté en posición ON\n"
+        "2. Verifica el nivel de combustible y que la válvula de combustible del APU esté abierta\n"
+        "3. Revisa los breakers relacionados con el APU en el panel eléctrico\n"
+        "4. Comprueba si hay mensajes de error específicos en la ECAM/EICAS\n"
+        "5. Verifica que la temperatura exterior esté dentro de los límites operativos del APU\n\n"
+        "Si después de estas verificaciones el APU sigue sin arrancar, podría ser necesario realizar un reset del sistema o contactar al equipo de mantenimiento para una inspección más detallada."),
+    'tren_revisar': (
+        "Para realizar un check del tren de aterrizaje en {matricula}, sigue estos pasos:\n\n"
+        "1. Verifica visualmente la condición de los componentes del tren\n"
+        "2. Comprueba la presión de los neumáticos (debe estar entre 180-210 PSI)\n"
+        "3. Verifica que no haya fugas hidráulicas en los actuadores\n"
+        "4. Comprueba el funcionamiento de las luces indicadoras\n"
+        "5. Verifica la correcta extensión y retracción del tren\n\n"
+        "Si encuentras alguna anomalía, regístrala en el libro de mantenimiento y notifica al equipo técnico."),
+    'tren_no_funciona': (
+        "Para problemas con el tren de aterrizaje que no funciona en {matricula}, verifica lo siguiente:\n\n"
+        "1. Comprueba el sistema hidráulico (presión y nivel de fluido)\n"
+        "2. Verifica los breakers relacionados con el sistema del tren\n"
+        "3. Inspecciona los actuadores y mecanismos de bloqueo\n"
+        "4. Comprueba el funcionamiento del sistema de emergencia\n"
+        "5. Verifica los sensores de posición del tren\n\n"
+        "Si el problema persiste, considera utilizar el procedimiento de extensión de emergencia y contacta al equipo de mantenimiento."),
+    'tren_otro': (
+        "Para problemas con el tren de aterrizaje en {matricula}, verifica lo siguiente:\n\n"
+        "1. Comprueba el sistema hidráulico\n"
+        "2. Verifica los componentes mecánicos\n"
+        "3. Inspecciona los indicadores y sensores\n\n"
+        "Si necesitas asistencia específica, proporciona más detalles sobre el problema exacto."),
+    'electrico_revisar': (
+        "Para verificar el sistema eléctrico en {matricula}, sigue estos pasos:\n\n"
+        "1. Comprueba el estado de las baterías y su carga\n"
+        "2. Verifica el funcionamiento de los generadores principales\n"
+        "3. Inspecciona el panel de breakers y asegúrate de que todos estén en posición correcta\n"
+        "4. Comprueba las conexiones y cableado visible\n"
+        "5. Verifica el funcionamiento de los sistemas de iluminación\n\n"
+        "Si encuentras alguna anomalía, documéntala y notifica al equipo de mantenimiento."),
+    'electrico_no_funciona': (
+        "Para problemas con el sistema eléctrico en {matricula}, verifica lo siguiente:\n\n"
+        "1. Comprueba si los generadores están funcionando correctamente\n"
+        "2. Verifica el estado de las baterías y su conexión\n"
+        "3. Inspecciona los breakers relacionados con el sistema afectado\n"
+        "4. Comprueba las conexiones y busca signos de daño en el cableado\n"
+        "5. Verifica si el APU puede proporcionar energía eléctrica de respaldo\n\n"
+        "Si el problema persiste después de estas verificaciones, contacta al equipo de mantenimiento para una inspección más detallada."),
+    'electrico_otro': (
+        "Para problemas con el sistema eléctrico en {matricula}, verifica lo siguiente:\n\n"
+        "1. Comprueba las baterías y generadores\n"
+        "2. Verifica los breakers y conexiones\n"
+        "3. Inspecciona el cableado visible\n\n"
+        "Si necesitas asistencia específica, proporciona más detalles sobre el problema exacto."),
+    'reset_apu': (
+        "Para realizar un reset del sistema APU, sigue estos pasos:\n\n"
+        "1. Asegúrate de que el APU esté completamente apagado (interruptor en posición OFF)\n"
+        "2. Localiza el panel de breakers relacionados con el APU\n"
+        "3. Identifica los breakers específicos del APU (normalmente etiquetados como 'APU CONTROL', 'APU STARTER', etc.)\n"
+        "4. Desconecta (pull) estos breakers y espera 30 segundos\n"
+        "5. Vuelve a conectar (push) los breakers en el mismo orden en que los desconectaste\n"
+        "6. Espera 2 minutos para que el sistema se reinicie completamente\n"
+        "7. Intenta arrancar el APU siguiendo el procedimiento normal\n\n"
+        "Si después del reset el APU sigue sin funcionar, será necesario contactar al equipo de mantenimiento para una inspección más detallada."),
+    'reset_electrico': (
+        "Para realizar un reset del sistema eléctrico, sigue estos pasos:\n\n"
+        "1. Asegúrate de que todos los sistemas no esenciales estén apagados\n"
+        "2. Localiza el panel de breakers principal\n"
+        "3. Identifica los breakers del sistema eléctrico afectado\n"
+        "4. Desconecta (pull) estos breakers y espera 60 segundos\n"
+        "5. Vuelve a conectar (push) los breakers\n"
+        "6. Reinicia los sistemas afectados uno por uno\n\n"
+        "Si el problema persiste después del reset, contacta al equipo de mantenimiento."),
+    'reset_tren': (
+        "Para realizar un reset del sistema de tren de aterrizaje, sigue estos pasos:\n\n"
+        "1. Asegúrate de que la aeronave esté en tierra y con los frenos aplicados\n"
+        "2. Localiza el panel de control hidráulico y eléctrico relacionado con el tren\n"
+        "3. Desconecta (pull) los breakers específicos del sistema de tren\n"
+        "4. Espera 60 segundos para que el sistema se descargue completamente\n"
+        "5. Vuelve a conectar (push) los breakers\n"
+        "6. Verifica el funcionamiento del sistema mediante las luces indicadoras\n\n"
+        "Nota: Este procedimiento debe realizarse siguiendo el manual de mantenimiento específico de la aeronave."),
+    'reset_otro': (
+        "Para realizar un reset del sistema {sistema}, generalmente debes seguir estos pasos:\n\n"
+        "1. Consulta el manual de mantenimiento específico para {sistema}\n"
+        "2. Localiza los breakers relacionados con el sistema\n"
+        "3. Desconecta (pull) los breakers específicos\n"
+        "4. Espera el tiempo recomendado (generalmente 30-60 segundos)\n"
+        "5. Vuelve a conectar (push) los breakers\n"
+        "6. Reinicia el sistema siguiendo el procedimiento normal\n\n"
+        "Para instrucciones más detalladas, consulta el manual de mantenimiento de la aeronave."),
+    'manual': (
+        "Según el manual de mantenimiento:\n\n{seccion}\n\n"
+        "Siguiendo estos pasos deberías resolver el problema. Si necesitas más información, escribe 'agente' para hablar con un especialista."),
+    'automatica': (
+        "{respuesta}\n\n"
+        "Espero que esto ayude a resolver tu problema. Si necesitas más asistencia, no dudes en proporcionar más detalles."),
+    'generica': (
+        "He detectado un problema de {problema} en el sistema {sistema}. "
+        "Para este tipo de situación, te recomiendo verificar lo siguiente:\n\n"
+        "1. Comprobar las conexiones y suministro eléctrico\n"
+        "2. Verificar si hay mensajes de error específicos\n"
+        "3. Revisar el estado de los componentes relacionados\n\n"
+        "Si el problema persiste, por favor proporciona más detalles o "
+        "escribe 'agente' para hablar con un especialista de mantenimiento."),
+}
+
+
+def compilar_plantilla(nombre, texto):
+    """Valida la plantilla una sola vez: sintaxis de str.format y campos conocidos"""
+    try:
+        campos = {campo for _, campo, _, _ in Formatter().parse(texto) if campo is not None}
+    except ValueError as e:
+        raise ValueError(f"Plantilla '{nombre}' inválida: {e}")
+    desconocidos = campos - CAMPOS
+    if desconocidos:
+        raise ValueError(f"Plantilla '{nombre}' usa campos desconocidos: {', '.join(sorted(desconocidos))}")
+    return texto
+
+
+class RegistroPlantillas:
+    """Plantillas de respuesta validadas al registrarlas, en caché por nombre.
+
+    La caché guarda una plantilla compilada por nombre, no los textos ya
+    armados: con la matrícula o el sistema en la clave casi ninguna entrada
+    se volvería a usar. `renderizar(nombre, sistema=..., matricula=...)` solo
+    busca la plantilla y la completa, sin tomar ningún lock, así los hilos del
+    bot no se esperan entre sí. `actualizar` arma un diccionario nuevo y lo
+    reemplaza entero, así un render en curso usa la versión anterior o la
+    nueva, nunca una mezcla.
+    """
+
+    def __init__(self, plantillas=None):
+        self.version = 0
+        self._plantillas = {}
+        # Solo serializa las actualizaciones; la lectura no lo necesita
+        self._lock = threading.Lock()
+        if plantillas:
+            self.actualizar(plantillas)
+
+    def __contains__(self, nombre):
+        return nombre in self._plantillas
+
+    def __len__(self):
+        return len(self._plantillas)
+
+    def actualizar(self, plantillas):
+        """Agrega o reemplaza plantillas (copy-on-write)"""
+        with self._lock:
+            compiladas = dict(self._plantillas)
+            for nombre, texto in plantillas.items():
+                compiladas[nombre] = compilar_plantilla(nombre, texto)
+            self._plantillas = compiladas
+            self.version += 1
+
+    def renderizar(self, nombre, **campos):
+        return self._plantillas[nombre].format_map(campos)
+
+    def resumen(self):
+        """Versión y cantidad de plantillas en caché"""
+        return {"version": self.version, "en_cache": len(self._plantillas)}
@@ -0,0 +1,168 @@
+import time
+import threading
+from collections import OrderedDict, deque
+from collections.abc import MutableMapping
+
+
+class Sesion:
+    """Estado de un usuario: contexto de la conversación e historial reciente"""
+
+    __slots__ = ('contexto', 'historial', 'ultimo_acceso', 'en_uso')
+
+    def __init__(self, max_historial, contexto=None, historial=(), ultimo_acceso=None):
+        self.contexto = contexto if contexto is not None else {}
+        self.historial = deque(historial, maxlen=max_historial)
+        self.ultimo_acceso = ultimo_acceso if ultimo_acceso is not None else time.monotonic()
+        # Mensajes en proceso que tomaron la sesión con cargar(..., en_uso=True)
+        self.en_uso = 0
+
+
+class AlmacenSesiones:
+    """Almacén de sesiones acotado en memoria.
+
+    Las sesiones se mantienen en orden de último acceso (LRU). Una sesión se
+    expulsa cuando lleva más de `ttl` segundos sin actividad o cuando se supera
+    `capacidad`; antes de descartarla se entrega a `al_expirar` para que pueda
+    persistirse. El historial de cada usuario se limita a `max_historial`
+    mensajes.
+
+    Una sesión cargada con `en_uso=True` no se expulsa hasta su `guardar`,
+    aunque se exceda la capacidad: archivarla a mitad de un mensaje partiría
+    la conversación en dos registros del archivo.
+
+    Es el almacén de sesiones de un solo proceso: `cargar` devuelve el objeto
+    vivo, por lo que `guardar` solo necesita reinsertarlo si fue expulsado
+    mientras se procesaba el mensaje (por ejemplo, con `vaciar`).
+    """
+
+    def __init__(self, ttl=1800, capacidad=10000, max_historial=50, al_expirar=None):
+        self.ttl = ttl
+        self.capacidad = capacidad
+        self.max_historial = max_historial
+        self.al_expirar = al_expirar
+        self._sesiones = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._sesiones)
+
+    def __contains__(self, id_usuario):
+        return id_usuario in self._sesiones
+
+    def __iter__(self):
+        return iter(list(self._sesiones))
+
+    def buscar(self, id_usuario):
+        """Devuelve la sesión del usuario o None, sin crearla"""
+        with self._lock:
+            return self._sesiones.get(id_usuario)
+
+    def cargar(self, id_usuario, en_uso=False):
+        """Devuelve la sesión del usuario (creándola si no existe) y la marca como usada.
+
+        Con `en_uso=True` la sesión queda protegida de las purgas hasta `guardar`.
+        """
+        with self._lock:
+            sesion = self._sesiones.get(id_usuario)
+            if sesion is None:
+                sesion = self._sesiones[id_usuario] = Sesion(self.max_historial)
+            else:
+                self._sesiones.move_to_end(id_usuario)
+            sesion.ultimo_acceso = time.monotonic()
+            if en_uso:
+                sesion.en_uso += 1
+        self.purgar()
+        return sesion
+
+    def guardar(self, id_usuario, sesion):
+        """Confirma la sesión después de procesar un mensaje"""
+        with self._lock:
+            if sesion.en_uso:
+                sesion.en_uso -= 1
+            if self._sesiones.get(id_usuario) is not sesion:
+                self._sesiones[id_usuario] = sesion
+            self._sesiones.move_to_end(id_usuario)
+
+    def purgar(self):
+        """Expulsa las sesiones inactivas y las que excedan la capacidad, salvo las que están en uso"""
+        limite = time.monotonic() - self.ttl
+        expulsadas = []
+        with self._lock:
+            exceso = len(self._sesiones) - self.capacidad
+            for id_usuario, sesion in self._sesiones.items():
+                if sesion.ultimo_acceso > limite and exceso <= 0:
+                    break
+                if not sesion.en_uso:
+                    expulsadas.append((id_usuario, sesion))
+                    exceso -= 1
+            for id_usuario, _ in expulsadas:
+                del self._sesiones[id_usuario]
+        self._expulsar(expulsadas)
+
+    def vaciar(self):
+        """Expulsa todas las sesiones (por ejemplo, al detener el bot)"""
+        with self._lock:
+            expulsadas = list(self._sesiones.items())
+            self._sesiones.clear()
+        self._expulsar(expulsadas)
+
+    def _expulsar(self, expulsadas):
+        # Se persisten fuera del lock para no frenar a los demás hilos
+        for id_usuario, sesion in expulsadas:
+            if self.al_expirar:
+                try:
+                    self.al_expirar(id_usuario, sesion)
+                except Exception as e:
+                    print(f"Error al guardar sesión expirada de {id_usuario}: {e}")
+
+
+class VistaContextos(MutableMapping):
+    """Vista tipo diccionario id_usuario -> contexto.
+
+    `obtener_sesion(id_usuario, crear)` resuelve la sesión del usuario; así el
+    código del bot puede seguir usando `contexto_actual[id_usuario]` sin saber
+    en qué almacén vive la sesión.
+    """
+
+    def __init__(self, obtener_sesion, usuarios=None):
+        self._obtener_sesion = obtener_sesion
+        self._usuarios = usuarios
+
+    def __getitem__(self, id_usuario):
+        sesion = self._obtener_sesion(id_usuario, False)
+        if sesion is None:
+            raise KeyError(id_usuario)
+        return sesion.contexto
+
+    def __setitem__(self, id_usuario, contexto):
+        self._obtener_sesion(id_usuario, True).contexto = contexto
+
+    def __delitem__(self, id_usuario):
+        self[id_usuario].clear()
+
+    def __contains__(self, id_usuario):
+        return self._obtener_sesion(id_usuario, False) is not None
+
+    def __iter__(self):
+        return iter(list(self._usuarios()) if self._usuarios else [])
+
+    def __len__(self):
+        return len(list(self))
+
+
+class VistaHistoriales(VistaContextos):
+    """Vista id_usuario -> historial; como un defaultdict, crea la sesión al indexar"""
+
+    def __getitem__(self, id_usuario):
+        return self._obtener_sesion(id_usuario, True).historial
+
+    def __setitem__(self, id_usuario, historial):
+        sesion = self._obtener_sesion(id_usuario, True)
+        sesion.historial = deque(historial, maxlen=sesion.historial.maxlen)
+
+    def __delitem__(self, id_usuario):
+        self[id_usuario].clear()
+
+    def get(self, id_usuario, default=None):
+        sesion = self._obtener_sesion(id_usuario, False)
+        return sesion.historial if sesion is not None else default
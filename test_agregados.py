@@ -0,0 +1,106 @@
+import pytest
+
+from agregados import inicializar_agregados, acumular_evento, consultar_rango, reconstruir_conversaciones
+
+
+def conversacion(fecha, sistema, urgente=False):
+    return {"tipo": "conversacion", "conversacion": {
+        "fecha": fecha, "sistema": sistema, "problema": "NO_ARRANCA", "mensajes": [{}, {}],
+        "es_urgente": urgente, "derivado_agente": False, "respuesta_automatica": True
+    }}
+
+
+def crear_agregados():
+    agregados = inicializar_agregados()
+    acumular_evento(agregados, conversacion("2024-03-01 08:15:00", "APU"))
+    acumular_evento(agregados, conversacion("2024-03-01 17:40:00", "TREN", urgente=True))
+    acumular_evento(agregados, conversacion("2024-03-03 09:00:00", "APU"))
+    acumular_evento(agregados, {"tipo": "encuesta", "satisfactoria": True, "fecha": "2024-03-03 09:05:00"})
+    acumular_evento(agregados, {"tipo": "respuesta", "tiempo_respuesta": 0.5, "fecha": "2024-03-03 09:00:01"})
+    acumular_evento(agregados, {"tipo": "derivacion"})  # sin fecha: no se agrega
+    return agregados
+
+
+def test_rango_por_dias():
+    agregados = crear_agregados()
+    rango = consultar_rango(agregados, "2024-03-01", "2024-03-02")
+    assert rango["conversaciones"] == 2
+    assert rango["sistemas"] == {"APU": 1, "TREN": 1}
+    assert rango["urgentes"] == 1
+    assert consultar_rango(agregados, "2024-03-03", "2024-03-03")["encuestas"] == 1
+
+
+def test_rango_con_horas_parciales():
+    agregados = crear_agregados()
+    rango = consultar_rango(agregados, "2024-03-01 12:00", "2024-03-03 08:59")
+    assert rango["conversaciones"] == 1
+    assert rango["sistemas"] == {"TREN": 1}
+
+
+def test_rango_abierto():
+    agregados = crear_agregados()
+    rango = consultar_rango(agregados, "2024-03-02")
+    assert rango["conversaciones"] == 1
+    assert rango["respuestas"] == 1
+    assert consultar_rango(agregados)["conversaciones"] == 3
+    assert consultar_rango(inicializar_agregados(), "2024-01-01")["conversaciones"] == 0
+
+
+class DiasSinRecorrer(dict):
+    """Buckets diarios que fallan si alguien los recorre enteros"""
+
+    def __iter__(self):
+        raise AssertionError("la consulta no debe recorrer todos los días")
+
+
+def test_rango_acotado_a_los_buckets():
+    agregados = crear_agregados()
+    assert (agregados["primero"], agregados["ultimo"]) == ("2024-03-01", "2024-03-03")
+    agregados["dia"] = DiasSinRecorrer(agregados["dia"])
+    rango = consultar_rango(agregados, "0001-01-01", "9999-12-31")
+    assert rango["conversaciones"] == 3
+    assert consultar_rango(agregados)["conversaciones"] == 3
+    assert consultar_rango(agregados, "2030-01-01")["conversaciones"] == 0
+    with pytest.raises(ValueError):
+        consultar_rango(agregados, "01/03/2024")
+    with pytest.raises(ValueError):
+        consultar_rango(inicializar_agregados(), None, "2024-13-01")
+
+
+def test_marcas_de_snapshot_antiguo():
+    agregados = crear_agregados()
+    del agregados["primero"], agregados["ultimo"]
+    acumular_evento(agregados, conversacion("2024-02-10 10:00:00", "APU"))
+    assert (agregados["primero"], agregados["ultimo"]) == ("2024-02-10", "2024-03-03")
+    assert consultar_rango(agregados, "2024-01-01")["conversaciones"] == 4
+
+
+def test_reconstruir_desde_snapshot_antiguo():
+    antiguas = [conversacion("2024-02-28 10:00:00", "MOTOR")["conversacion"],
+                dict(conversacion("2024-03-01 08:15:00", "APU")["conversacion"], derivado_agente=True)]
+    # Sin buckets previos: se agregan todas, con sus derivaciones
+    agregados = inicializar_agregados()
+    reconstruir_conversaciones(agregados, antiguas)
+    rango = consultar_rango(agregados, "2024-02-28", "2024-03-01")
+    assert (rango["conversaciones"], rango["derivaciones"]) == (2, 1)
+
+    # Buckets que ya tenían las conversaciones posteriores a su creación: la anterior se
+    # agrega y las demás no se cuentan dos veces
+    agregados = crear_agregados()
+    completas = [conversacion(fecha, sistema, urgente)["conversacion"] for fecha, sistema, urgente in (
+        ("2024-02-28 10:00:00", "MOTOR", False), ("2024-03-01 08:15:00", "APU", False),
+        ("2024-03-01 17:40:00", "TREN", True), ("2024-03-03 09:00:00", "APU", False))]
+    reconstruir_conversaciones(agregados, completas)
+    rango = consultar_rango(agregados)
+    assert rango["conversaciones"] == 4 and rango["urgentes"] == 1
+    assert rango["sistemas"] == {"MOTOR": 1, "APU": 2, "TREN": 1}
+    assert rango["encuestas"] == 1 and rango["respuestas"] == 1
+
+
+if __name__ == "__main__":
+    test_rango_por_dias()
+    test_rango_con_horas_parciales()
+    test_rango_abierto()
+    test_rango_acotado_a_los_buckets()
+    test_marcas_de_snapshot_antiguo()
+    test_reconstruir_desde_snapshot_antiguo()
@@ -0,0 +1,79 @@
+import os
+import json
+import tempfile
+
+import almacen_manuales
+from almacen_manuales import AlmacenManuales
+
+
+def escribir(ruta, datos):
+    os.makedirs(os.path.dirname(ruta), exist_ok=True)
+    with open(ruta, 'w', encoding='utf-8') as f:
+        json.dump(datos, f)
+
+
+def crear_almacen(directorio, max_particiones=8):
+    manuales = os.path.join(directorio, 'manuales')
+    escribir(os.path.join(manuales, 'flota.json'), {"A320": ["CC-BAA"], "B787": ["CC-BGA"]})
+    escribir(os.path.join(manuales, 'A320', 'knowledge_base.json'),
+             {"APU": {"NO_ARRANCA": ["APU A320: verifique el APU MASTER SW."]}})
+    escribir(os.path.join(manuales, 'B787', 'knowledge_base.json'),
+             {"APU": {"NO_ARRANCA": ["APU B787: revise el APU controller."]}})
+    general = os.path.join(directorio, 'knowledge_base.json')
+    escribir(general, {"APU": {"NO_ARRANCA": ["APU general"]}, "TREN": {"ERROR": ["Tren general"]}})
+    return AlmacenManuales(manuales, general, max_particiones=max_particiones)
+
+
+def test_consulta_por_tipo_de_aeronave():
+    with tempfile.TemporaryDirectory() as directorio:
+        almacen = crear_almacen(directorio)
+        assert almacen.tipos() == ["A320", "B787"]
+        assert almacen.tipo_de("cc baa") == "A320"
+        assert almacen.get_response("APU", "NO_ARRANCA", matricula="CC-BAA").startswith("APU A320")
+        assert almacen.get_response("APU", "NO_ARRANCA", matricula="CC-BGA").startswith("APU B787")
+        # Matrícula desconocida o sin matrícula: base general
+        assert almacen.get_response("APU", "NO_ARRANCA", matricula="CC-XYZ") == "APU general"
+        assert almacen.get_response("APU", "NO_ARRANCA") == "APU general"
+        # Si la partición del tipo no tiene respuesta se usa la general
+        assert almacen.get_response("TREN", "ERROR", matricula="CC-BAA") == "Tren general"
+
+
+def test_particiones_se_cargan_solo_al_usarse():
+    with tempfile.TemporaryDirectory() as directorio:
+        almacen = crear_almacen(directorio, max_particiones=1)
+        assert list(almacen._particiones) == []
+        almacen.get_response("APU", "NO_ARRANCA", matricula="CC-BAA")
+        assert list(almacen._particiones) == ["A320"]
+        almacen.get_response("APU", "NO_ARRANCA", matricula="CC-BGA")
+        assert list(almacen._particiones) == ["B787"]
+
+
+
+def test_no_reintenta_bases_que_faltan(monkeypatch):
+    aperturas = []
+    abrir_base = almacen_manuales.abrir_base
+    monkeypatch.setattr(almacen_manuales, 'abrir_base', lambda ruta: aperturas.append(ruta) or abrir_base(ruta))
+    with tempfile.TemporaryDirectory() as directorio:
+        manuales = os.path.join(directorio, 'manuales')
+        escribir(os.path.join(manuales, 'flota.json'), {"A320": ["CC-BAA"]})
+        general = os.path.join(directorio, 'general', 'knowledge_base.json')
+        almacen = AlmacenManuales(manuales, general)
+        for _ in range(5):
+            assert almacen.get_response("APU", "NO_ARRANCA", matricula="CC-BAA") is None
+        assert len(aperturas) == 2
+
+        # Al aparecer la base cambia su carpeta y se vuelve a intentar
+        escribir(os.path.join(manuales, 'A320', 'knowledge_base.json'),
+                 {"APU": {"NO_ARRANCA": ["APU A320: verifique el APU MASTER SW."]}})
+        assert almacen.get_response("APU", "NO_ARRANCA", matricula="CC-BAA").startswith("APU A320")
+        assert len(aperturas) == 3
+
+        almacen.recargar()
+        almacen.get_response("TREN", "ERROR", matricula="CC-BAA")
+        assert len(aperturas) == 5
+
+
+if __name__ == "__main__":
+    test_consulta_por_tipo_de_aeronave()
+    test_particiones_se_cargan_solo_al_usarse()
+    print("Pruebas del almacén de manuales completadas")
@@ -0,0 +1,64 @@
+from analisis import MensajeAnalizado
+from backends import BackendMemoria
+from bot_simple import WhatsAppBot
+
+
+def test_deteccion_perezosa_y_unica():
+    llamadas = []
+
+    def detectar(texto):
+        llamadas.append(texto)
+        return 'TREN', None, 'CC-AWN'
+
+    analisis = MensajeAnalizado("Reset del TREN de aterrizaje", detectar)
+    assert analisis.pide_reset and analisis.sistema_en_reset == 'TREN'
+    assert llamadas == []
+    assert analisis.tema == 'TREN'
+    assert analisis.deteccion == ('TREN', None, 'CC-AWN')
+    assert len(llamadas) == 1
+
+
+def test_rasgos_calculados_una_vez():
+    analisis = MensajeAnalizado("Reset del sistema ELÉCTRICO, ¿cómo lo hago?", None)
+    assert analisis.plano == "reset del sistema electrico, ¿como lo hago?"
+    assert analisis.tokens == ("reset", "del", "sistema", "electrico", "como", "lo", "hago")
+    assert analisis.pide_reset and analisis.sistema_en_reset == 'ELECTRICO'
+    assert analisis.comando is None and not analisis.es_corto
+
+    assert MensajeAnalizado("Eso sería todo", None).es_despedida
+    assert MensajeAnalizado("Nueva consulta", None).comando == 'nueva_consulta'
+    contacto = MensajeAnalizado("contáctame", None)
+    assert contacto.pide_agente and not contacto.es_despedida
+    especificos = MensajeAnalizado("APU OVERHEAT y cargo door", None, ['apu overheat', 'low oil pressure', 'cargo door'])
+    assert especificos.problemas_especificos == ('apu overheat', 'cargo door')
+    # Sin __dict__: los rasgos viven en slots
+    assert not hasattr(especificos, '__dict__')
+
+
+def test_una_deteccion_por_mensaje():
+    bot = WhatsAppBot(backend=BackendMemoria())
+    llamadas = []
+    detectar = bot.detectar_sistema_y_problema
+    bot.detectar_sistema_y_problema = lambda mensaje: (llamadas.append(mensaje), detectar(mensaje))[1]
+
+    # El cambio de tema (motor -> hidráulico) antes volvía a detectar sobre el mismo mensaje
+    mensajes = ["El motor tiene un error", "Ahora el hidraulico falla", "ayuda", "ok", "el tren del CC-ABC falla"]
+    for mensaje in mensajes:
+        bot.procesar_mensaje(mensaje, "analisis")
+    # Los comandos no necesitan detección y los demás la hacen una sola vez
+    assert sorted(llamadas) == sorted(m for m in mensajes if m != "ayuda")
+
+
+def test_respuesta_sin_historial(monkeypatch):
+    # Sin historial la consulta al manual usa el texto del mensaje actual
+    monkeypatch.setenv('SESION_MAX_HISTORIAL', '0')
+    bot = WhatsAppBot(backend=BackendMemoria())
+    respuesta = bot.procesar_mensaje("El motor del CC-AWN no arranca", "sin_historial")
+    assert respuesta.startswith("Para problemas de arranque de motor")
+
+
+if __name__ == "__main__":
+    test_deteccion_perezosa_y_unica()
+    test_rasgos_calculados_una_vez()
+    test_una_deteccion_por_mensaje()
+    print("Pruebas del análisis de mensajes completadas")
@@ -0,0 +1,146 @@
+import os
+import json
+import tempfile
+
+from archivo_conversaciones import ArchivoConversaciones
+
+
+def conversacion(numero, fecha="2024-03-01 10:00:00"):
+    return {"id": f"conv-{numero}", "fecha": fecha, "sistema": "APU", "problema": "NO_ARRANCA",
+            "matricula": "CC-ABC", "mensajes": [{"mensaje": f"mensaje {numero} ñandú", "tipo": "usuario"}]}
+
+
+def test_guardar_y_obtener_por_id():
+    for comprimir in (False, True):
+        with tempfile.TemporaryDirectory() as directorio:
+            archivo = ArchivoConversaciones(directorio, max_segmento=400, comprimir=comprimir)
+            for numero in range(20):
+                archivo.guardar(conversacion(numero))
+            archivo.guardar(conversacion(99, fecha="2024-03-02 08:00:00"))
+
+            assert len(archivo) == 21
+            assert archivo.obtener("conv-7") == conversacion(7)
+            assert archivo.obtener("conv-99")["fecha"].startswith("2024-03-02")
+            assert archivo.obtener("no-existe") is None
+            # Los segmentos rotan por tamaño y se separan por día
+            segmentos = os.listdir(os.path.join(directorio, "2024-03-01"))
+            assert len(segmentos) > 1
+            assert os.listdir(os.path.join(directorio, "2024-03-02")) == [
+                "seg_00001.jsonl.gz" if comprimir else "seg_00001.jsonl"]
+
+
+def test_recorrer_por_rango_de_dias():
+    with tempfile.TemporaryDirectory() as directorio:
+        archivo = ArchivoConversaciones(directorio, max_segmento=300)
+        for numero in range(5):
+            archivo.guardar(conversacion(numero, fecha=f"2024-03-0{numero + 1} 12:00:00"))
+        assert [c["id"] for c in archivo.recorrer()] == [f"conv-{n}" for n in range(5)]
+        assert [c["id"] for c in archivo.recorrer("2024-03-02", "2024-03-03")] == ["conv-1", "conv-2"]
+
+
+def test_reabrir_continua_el_segmento():
+    with tempfile.TemporaryDirectory() as directorio:
+        ArchivoConversaciones(directorio).guardar(conversacion(1))
+        archivo = ArchivoConversaciones(directorio)
+        archivo.guardar(conversacion(2))
+        assert os.listdir(os.path.join(directorio, "2024-03-01")) == ["seg_00001.jsonl"]
+        assert archivo.obtener("conv-1")["id"] == "conv-1"
+
+
+def caso(numero, matricula, sistema, problema, fecha, texto):
+    return {"id": f"caso-{numero}", "fecha": fecha, "id_usuario": "moc", "matricula": matricula,
+            "sistema": sistema, "problema": problema, "es_urgente": False, "derivado_agente": False,
+            "mensajes": [{"mensaje": texto, "tipo": "usuario"},
+                         {"mensaje": "Respuesta con batería y válvula", "tipo": "bot"}]}
+
+
+CASOS = [
+    caso(1, "CC-AWN", "APU", "NO_ARRANCA", "2024-05-03 10:00:00", "El APU no arranca, falla de ignición"),
+    caso(2, "CC-AWN", "APU", "ERROR", "2024-05-20 08:30:00", "Mensaje APU FAULT en ECAM"),
+    caso(3, "CC-ABC", "APU", "NO_ARRANCA", "2024-05-21 12:00:00", "APU no arranca después del vuelo"),
+    caso(4, "CC-AWN", "TREN", "ERROR", "2024-06-02 09:00:00", "Luz del tren de aterrizaje encendida"),
+]
+
+
+def test_buscar_por_matricula_sistema_y_fecha():
+    with tempfile.TemporaryDirectory() as directorio:
+        archivo = ArchivoConversaciones(directorio)
+        for conversacion in CASOS:
+            archivo.guardar(conversacion)
+
+        ids = lambda resultados: [r["id"] for r in resultados]
+        # La matrícula se normaliza y los resultados van del más reciente al más antiguo
+        assert ids(archivo.buscar(matricula="cc awn", sistema="APU")) == ["caso-2", "caso-1"]
+        assert ids(archivo.buscar(matricula="CC-AWN", desde="2024-05-01", hasta="2024-05-31")) == ["caso-2", "caso-1"]
+        assert ids(archivo.buscar(sistema="APU", problema="NO_ARRANCA")) == ["caso-3", "caso-1"]
+        assert ids(archivo.buscar(hasta="2024-05-20")) == ["caso-2", "caso-1"]
+        assert ids(archivo.buscar(limite=1)) == ["caso-4"]
+        assert archivo.buscar(limite=-1) == []
+        assert archivo.buscar(matricula="CC-XYZ") == []
+
+        # Texto: solo mensajes del usuario, sin acentos ni mayúsculas
+        assert ids(archivo.buscar(texto="ignicion")) == ["caso-1"]
+        assert ids(archivo.buscar(texto="apu fault")) == ["caso-2"]
+        assert archivo.buscar(texto="batería") == []
+        assert ids(archivo.buscar(matricula="CC-AWN", texto='"no arranca')) == ["caso-1"]
+
+        resumen = archivo.buscar(matricula="CC-ABC")[0]
+        assert resumen["matricula"] == "CCABC" and resumen["fecha"] == "2024-05-21 12:00:00"
+        assert archivo.buscar(matricula="CC-ABC", completas=True) == [CASOS[2]]
+        # Paginado estable
+        assert ids(archivo.buscar(limite=2)) + ids(archivo.buscar(limite=2, desplazamiento=2)) == \
+            ids(archivo.buscar())
+
+
+def test_reindexar_desde_los_segmentos():
+    with tempfile.TemporaryDirectory() as directorio:
+        archivo = ArchivoConversaciones(directorio, max_segmento=500, comprimir=True)
+        for conversacion in CASOS:
+            archivo.guardar(conversacion)
+        antes = archivo.buscar(limite=10)
+
+        with archivo.indice.conexion(escritura=True) as conexion:
+            conexion.execute("UPDATE conversaciones SET fecha = NULL")
+        # Al abrir un índice incompleto se reconstruye leyendo los segmentos
+        archivo = ArchivoConversaciones(directorio, max_segmento=500, comprimir=True)
+        assert archivo.buscar(limite=10) == antes
+        assert archivo.obtener("caso-3") == CASOS[2]
+        assert [r["id"] for r in archivo.buscar(texto="aterrizaje")] == ["caso-4"]
+
+
+def test_snapshot_antiguo_pasa_las_conversaciones_al_archivo(monkeypatch):
+    from bot_simple import WhatsAppBot
+
+    with tempfile.TemporaryDirectory() as directorio:
+        monkeypatch.chdir(directorio)
+        os.makedirs("logs")
+        antiguas = [dict(CASOS[1], respuesta_automatica=False), dict(CASOS[0], respuesta_automatica=False)]
+        with open(os.path.join("logs", "conversation_stats.json"), 'w', encoding='utf-8') as f:
+            json.dump({"total_conversaciones": 2, "conversaciones": antiguas}, f)
+
+        bot = WhatsAppBot()
+        assert "conversaciones" not in bot.stats
+        assert bot.obtener_estadisticas()["fecha_inicio"] == "2024-05-03"
+        assert bot.obtener_conversacion("caso-1") == antiguas[1]
+        bot.cerrar()
+
+        # El snapshot reescrito ya no lleva las conversaciones y no se vuelven a importar
+        with open(os.path.join("logs", "conversation_stats.json"), encoding='utf-8') as f:
+            snapshot = json.load(f)
+        assert "conversaciones" not in snapshot and snapshot["fecha_inicio"] == "2024-05-03"
+        bot = WhatsAppBot()
+        assert len(bot.archivo_conversaciones) == 2
+        assert bot.obtener_estadisticas()["total_conversaciones"] == 2
+        # Las conversaciones migradas también cuentan en las estadísticas por rango de fechas
+        fechas = sorted(c["fecha"].split()[0] for c in antiguas)
+        assert bot.obtener_estadisticas(fechas[0], fechas[-1])["total_conversaciones"] == 2
+        bot.cerrar()
+
+
+if __name__ == "__main__":
+    test_guardar_y_obtener_por_id()
+    test_recorrer_por_rango_de_dias()
+    test_reabrir_continua_el_segmento()
+    test_buscar_por_matricula_sistema_y_fecha()
+    test_reindexar_desde_los_segmentos()
+    print("Pruebas del archivo de conversaciones completadas")
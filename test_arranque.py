@@ -0,0 +1,12 @@
+from benchmark_arranque import medir_arranque
+
+
+def test_arranque_no_importa_stack_de_ingesta():
+    tiempos = medir_arranque()
+    assert tiempos["pesados"] == []
+    assert tiempos["primera_respuesta"] > 0
+
+
+if __name__ == "__main__":
+    test_arranque_no_importa_stack_de_ingesta()
+    print("Prueba de arranque completada")
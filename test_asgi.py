@@ -0,0 +1,94 @@
+import json
+import asyncio
+import asgi
+
+
+def llamar(metodo, ruta, cuerpo=b'', consulta=b''):
+    enviados = []
+
+    async def receive():
+        return {'type': 'http.request', 'body': cuerpo, 'more_body': False}
+
+    async def send(mensaje):
+        enviados.append(mensaje)
+
+    scope = {'type': 'http', 'method': metodo, 'path': ruta, 'query_string': consulta}
+    asyncio.run(asgi.app(scope, receive, send))
+    return enviados[0]['status'], enviados[1]['body']
+
+
+def test_mensajes_concurrentes():
+    async def enviar_varios():
+        return await asyncio.gather(*[
+            asgi.bot.aprocesar_mensaje("ayuda", f"asgi_{i}") for i in range(20)
+        ])
+
+    respuestas = asyncio.run(enviar_varios())
+    assert all("Bot de Mantenimiento MOC" in respuesta for respuesta in respuestas)
+
+
+def test_endpoint_mensaje():
+    estado, cuerpo = llamar('POST', '/api/message', json.dumps({'message': 'ayuda', 'user_id': 'asgi'}).encode())
+    assert estado == 200
+    assert "Bot de Mantenimiento MOC" in json.loads(cuerpo)['response']
+    assert llamar('POST', '/api/message', b'{no es json')[0] == 400
+    assert llamar('POST', '/api/message', b'[]')[0] == 400
+    assert llamar('POST', '/api/message', b'"hola"')[0] == 400
+    assert llamar('GET', '/')[0] == 200
+    assert llamar('GET', '/no-existe')[0] == 404
+
+
+def test_endpoint_lote():
+    lote = {'messages': [{'user_id': 'asgi_lote_1', 'message': 'ayuda'},
+                         {'user_id': 'asgi_lote_2', 'message': 'El APU de CC-AWN no arranca'},
+                         {'user_id': 'asgi_lote_1', 'message': 'ayuda'}]}
+    estado, cuerpo = llamar('POST', '/api/messages', json.dumps(lote).encode())
+    assert estado == 200
+    respuestas = json.loads(cuerpo)['responses']
+    assert [r['user_id'] for r in respuestas] == ['asgi_lote_1', 'asgi_lote_2', 'asgi_lote_1']
+    assert "Bot de Mantenimiento MOC" in respuestas[0]['response']
+    assert "APU" in respuestas[1]['response']
+    assert llamar('POST', '/api/messages', b'{"messages": [1, 2]}')[0] == 400
+    assert llamar('POST', '/api/messages', b'{no es json')[0] == 400
+
+
+def test_endpoint_conversaciones():
+    asgi.bot.registrar_conversacion("asgi_moc", [{"mensaje": "El APU de CC-QWE no arranca", "tipo": "usuario"}],
+                                    sistema="APU", problema="NO_ARRANCA", matricula="CC-QWE")
+    estado, cuerpo = llamar('GET', '/api/conversaciones', consulta=b'matricula=cc-qwe&sistema=APU&limite=5')
+    assert estado == 200
+    conversaciones = json.loads(cuerpo)['conversaciones']
+    assert conversaciones and all(c['matricula'] == 'CCQWE' for c in conversaciones)
+
+    asgi.bot.registrar_conversacion("asgi_moc", [{"mensaje": "El APU de CC-QWE sigue sin arrancar", "tipo": "usuario"}],
+                                    sistema="APU", problema="NO_ARRANCA", matricula="CC-QWE")
+    estado, cuerpo = llamar('GET', '/api/conversaciones', consulta=b'matricula=CC-QWE&limite=-1')
+    assert estado == 200
+    assert len(json.loads(cuerpo)['conversaciones']) == 1
+
+
+def test_endpoint_metricas():
+    llamar('POST', '/api/message', json.dumps({'message': 'ayuda', 'user_id': 'asgi_metricas'}).encode())
+    estado, cuerpo = llamar('GET', '/api/metricas')
+    assert estado == 200
+    metricas = json.loads(cuerpo)
+    assert metricas['latencias']['otros']['cantidad'] >= 1
+    assert {'p50_ms', 'p95_ms', 'p99_ms'} <= set(metricas['latencias']['total'])
+
+
+def test_endpoint_estadisticas():
+    estado, cuerpo = llamar('GET', '/api/estadisticas', consulta=b'start_date=0001-01-01&end_date=9999-12-31')
+    assert estado == 200
+    assert json.loads(cuerpo)['start_date'] == '0001-01-01'
+    estado, cuerpo = llamar('GET', '/api/estadisticas', consulta=b'start_date=ayer')
+    assert estado == 400
+    assert 'ayer' in json.loads(cuerpo)['error']
+
+
+if __name__ == "__main__":
+    test_mensajes_concurrentes()
+    test_endpoint_mensaje()
+    test_endpoint_lote()
+    test_endpoint_conversaciones()
+    test_endpoint_metricas()
+    test_endpoint_estadisticas()
@@ -0,0 +1,118 @@
+import os
+import tempfile
+from backends import BackendMemoria, BackendSQLite
+from bot_simple import WhatsAppBot
+
+
+def aplicar(estado, evento):
+    estado["total"] += evento["valor"]
+
+
+def test_workers_comparten_estado_de_encuesta():
+    backend = BackendMemoria()
+    worker_1 = WhatsAppBot(backend=backend)
+    worker_2 = WhatsAppBot(backend=backend)
+
+    worker_1.procesar_mensaje("listo", "usuario")
+    assert worker_1.contexto_actual["usuario"]["en_encuesta"]
+
+    # La respuesta a la encuesta llega a otro worker, que continúa la misma sesión
+    worker_2.procesar_mensaje("Sí", "usuario")
+    assert worker_2.obtener_estadisticas()["total_encuestas"] == 1
+    assert worker_1.obtener_estadisticas()["total_encuestas"] == 1
+
+
+def test_sesiones_sqlite_entre_procesos():
+    with tempfile.TemporaryDirectory() as directorio:
+        ruta = os.path.join(directorio, "estado.db")
+        sesiones_1 = BackendSQLite(ruta).abrir_sesiones(1800, 100, 10, None)
+        sesiones_2 = BackendSQLite(ruta).abrir_sesiones(1800, 100, 10, None)
+
+        sesion = sesiones_1.cargar("u")
+        sesion.contexto["paso_recopilacion"] = "matricula"
+        sesion.historial.append({"mensaje": "agente", "tipo": "usuario"})
+        sesiones_1.guardar("u", sesion)
+
+        recuperada = sesiones_2.cargar("u")
+        assert recuperada.contexto == {"paso_recopilacion": "matricula"}
+        assert list(recuperada.historial) == [{"mensaje": "agente", "tipo": "usuario"}]
+
+
+def test_sesiones_sqlite_guardados_concurrentes():
+    with tempfile.TemporaryDirectory() as directorio:
+        ruta = os.path.join(directorio, "estado.db")
+        sesiones_1 = BackendSQLite(ruta).abrir_sesiones(1800, 100, 10, None)
+        sesiones_2 = BackendSQLite(ruta).abrir_sesiones(1800, 100, 10, None)
+        inicial = sesiones_1.cargar("u")
+        inicial.contexto["sistema"] = "APU"
+        inicial.historial.append({"mensaje": "hola", "tipo": "usuario"})
+        sesiones_1.guardar("u", inicial)
+
+        # Dos workers cargan la misma versión y guardan cambios distintos
+        sesion_1 = sesiones_1.cargar("u")
+        sesion_2 = sesiones_2.cargar("u")
+        sesion_1.contexto["matricula"] = "CC-AWN"
+        sesion_1.historial.append({"mensaje": "CC-AWN", "tipo": "usuario"})
+        sesion_2.contexto["es_urgente"] = True
+        del sesion_2.contexto["sistema"]
+        sesion_2.historial.append({"mensaje": "urgente", "tipo": "usuario"})
+        sesiones_1.guardar("u", sesion_1)
+        sesiones_2.guardar("u", sesion_2)
+
+        final = sesiones_1.cargar("u")
+        assert final.contexto == {"matricula": "CC-AWN", "es_urgente": True}
+        assert [m["mensaje"] for m in final.historial] == ["hola", "CC-AWN", "urgente"]
+        assert final.version == 3
+
+
+def test_sesion_purgada_mientras_se_usa_no_se_archiva_dos_veces():
+    with tempfile.TemporaryDirectory() as directorio:
+        ruta = os.path.join(directorio, "estado.db")
+        archivadas = []
+        def al_expirar(id_usuario, sesion):
+            archivadas.append([m["mensaje"] for m in sesion.historial])
+
+        sesiones_1 = BackendSQLite(ruta).abrir_sesiones(1800, 100, 10, al_expirar)
+        sesiones_2 = BackendSQLite(ruta).abrir_sesiones(1800, 0, 10, al_expirar)
+        sesion = sesiones_1.cargar("u")
+        sesion.historial.append({"mensaje": "primero", "tipo": "usuario"})
+        sesiones_1.guardar("u", sesion)
+
+        # El worker 1 sigue con la sesión mientras la purga del worker 2 la archiva
+        sesion = sesiones_1.cargar("u")
+        sesiones_2.purgar()
+        sesion.historial.append({"mensaje": "segundo", "tipo": "usuario"})
+        sesiones_1.guardar("u", sesion)
+        sesiones_2.purgar()
+        assert archivadas == [["primero"], ["segundo"]]
+
+
+def test_diario_sqlite_entre_procesos():
+    with tempfile.TemporaryDirectory() as directorio:
+        ruta = os.path.join(directorio, "estado.db")
+        estado_1 = {"total": 0}
+        estado_2 = {"total": 0}
+        diario_1 = BackendSQLite(ruta).abrir_diario(lambda: estado_1)
+        diario_2 = BackendSQLite(ruta).abrir_diario(lambda: estado_2)
+        estado_1.update(diario_1.cargar(lambda: {"total": 0}, aplicar))
+        estado_2.update(diario_2.cargar(lambda: {"total": 0}, aplicar))
+
+        for diario, estado, valor in ((diario_1, estado_1, 1), (diario_2, estado_2, 10), (diario_1, estado_1, 100)):
+            aplicar(estado, {"valor": valor})
+            diario.registrar({"valor": valor})
+        diario_2.compactar()
+
+        diario_1.actualizar(estado_1, aplicar)
+        diario_2.actualizar(estado_2, aplicar)
+        assert estado_1["total"] == estado_2["total"] == 111
+
+        nuevo = BackendSQLite(ruta).abrir_diario(lambda: None).cargar(lambda: {"total": 0}, aplicar)
+        assert nuevo["total"] == 111
+
+
+if __name__ == "__main__":
+    test_workers_comparten_estado_de_encuesta()
+    test_sesiones_sqlite_entre_procesos()
+    test_sesiones_sqlite_guardados_concurrentes()
+    test_sesion_purgada_mientras_se_usa_no_se_archiva_dos_veces()
+    test_diario_sqlite_entre_procesos()
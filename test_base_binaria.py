@@ -0,0 +1,69 @@
+import os
+import tempfile
+
+from base_binaria import BaseBinaria, escribir_base_binaria
+from indice_manual import IndiceBM25
+
+COMPARTIDA = "Verifique la presión hidráulica antes de energizar el sistema."
+BASE = {
+    "APU": {
+        "NO_ARRANCA": ["Si el APU no arranca verifique el voltaje de la batería.",
+                       "Revise la válvula de combustible del APU.", COMPARTIDA],
+        "ERROR": ["Mensaje ECAM: APU FAULT — reinicie el ECB."]
+    },
+    "HIDRAULICO": {"ERROR": [COMPARTIDA, "Indicación de baja presión en el sistema verde."]},
+    "CABINA": {}
+}
+
+
+def test_lectura_igual_a_la_base_json():
+    with tempfile.TemporaryDirectory() as directorio:
+        ruta = os.path.join(directorio, "knowledge_base.mkb")
+        escribir_base_binaria(ruta, BASE)
+        base = BaseBinaria(ruta)
+        try:
+            assert base.directorio["secciones"] == 5  # la sección compartida se guarda una vez
+            for sistema, problemas in BASE.items():
+                for problema, secciones in problemas.items():
+                    assert base.get_all_responses(sistema, problema) == secciones
+                    assert base.get_response(sistema, problema) == secciones[0]
+            assert base.get_response("MOTOR", "ERROR") is None
+            assert base.get_all_responses("APU", "REVISAR") == []
+        finally:
+            base.cerrar()
+
+
+def test_ranking_igual_al_indice_en_memoria():
+    indice = IndiceBM25.desde_base(BASE)
+    with tempfile.TemporaryDirectory() as directorio:
+        ruta = os.path.join(directorio, "knowledge_base.mkb")
+        escribir_base_binaria(ruta, BASE)
+        base = BaseBinaria(ruta)
+        try:
+            for consulta in ("combustible", "presión hidráulica", "ECB fault", "batería válvula", "nada"):
+                assert base.search(consulta, k=3) == indice.buscar(consulta, k=3)
+                assert base.search(consulta, "APU", "NO_ARRANCA", k=2) == \
+                    indice.buscar(consulta, "APU", "NO_ARRANCA", k=2)
+            assert base.get_response("APU", "NO_ARRANCA", "la válvula de combustible") == \
+                "Revise la válvula de combustible del APU."
+        finally:
+            base.cerrar()
+
+
+def test_base_vacia():
+    with tempfile.TemporaryDirectory() as directorio:
+        ruta = os.path.join(directorio, "vacia.mkb")
+        escribir_base_binaria(ruta, {})
+        base = BaseBinaria(ruta)
+        try:
+            assert base.search("apu") == []
+            assert base.get_response("APU", "ERROR") is None
+        finally:
+            base.cerrar()
+
+
+if __name__ == "__main__":
+    test_lectura_igual_a_la_base_json()
+    test_ranking_igual_al_indice_en_memoria()
+    test_base_vacia()
+    print("Pruebas de la base binaria completadas")
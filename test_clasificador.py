@@ -0,0 +1,42 @@
+from clasificador import ClasificadorMensajes
+
+
+def crear_clasificador():
+    return ClasificadorMensajes({
+        'sistema': {
+            'APU': ['apu', 'auxiliary power unit'],
+            'ELECTRICO': ['power', 'electrico'],
+            'TREN': ['tren', 'landing gear', 'landing']
+        },
+        'problema': {
+            'NO_ARRANCA': ['no arranca', "won't start"],
+            'ERROR': ['error', 'luz']
+        }
+    })
+
+
+def test_encuentra_todas_las_categorias():
+    clasificacion = crear_clasificador().clasificar("El APU no arranca y hay luz de error en el tren")
+    assert clasificacion.encontrados['sistema'] == {'APU', 'TREN'}
+    assert clasificacion.encontrados['problema'] == {'NO_ARRANCA', 'ERROR'}
+    assert clasificacion.primera('sistema') == 'APU'
+
+
+def test_prefijos_de_otras_categorias():
+    # "power" (ELECTRICO) es prefijo de "power unit" dentro de "auxiliary power unit" (APU)
+    clasificacion = crear_clasificador().clasificar("auxiliary power unit")
+    assert clasificacion.encontrados['sistema'] == {'APU', 'ELECTRICO'}
+
+
+def test_matricula_prefiere_formato_con_guion():
+    clasificador = crear_clasificador()
+    assert clasificador.clasificar("ccbaw y CC-AWN").matricula == 'CC-AWN'
+    assert clasificador.clasificar("tren del cc awn").matricula == 'CC-AWN'
+    assert clasificador.clasificar("tren del ccawn").matricula == 'CC-AWN'
+    assert clasificador.clasificar("tren sin matrícula").matricula is None
+
+
+if __name__ == "__main__":
+    test_encuentra_todas_las_categorias()
+    test_prefijos_de_otras_categorias()
+    test_matricula_prefiere_formato_con_guion()
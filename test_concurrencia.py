@@ -0,0 +1,29 @@
+import threading
+from backends import BackendMemoria
+from bot_simple import WhatsAppBot
+
+
+def test_encuestas_concurrentes_no_pierden_actualizaciones():
+    bot = WhatsAppBot(backend=BackendMemoria())
+    usuarios = [f"usuario_{i}" for i in range(40)]
+
+    def conversar(id_usuario):
+        for _ in range(5):
+            bot.procesar_mensaje("listo", id_usuario)
+            bot.procesar_mensaje("Sí", id_usuario)
+            bot.procesar_mensaje("nueva consulta", id_usuario)
+            bot.contexto_actual[id_usuario] = {}
+
+    hilos = [threading.Thread(target=conversar, args=(id_usuario,)) for id_usuario in usuarios]
+    for hilo in hilos:
+        hilo.start()
+    for hilo in hilos:
+        hilo.join()
+
+    stats = bot.obtener_estadisticas()
+    assert stats["total_encuestas"] == len(usuarios) * 5
+    assert stats["consultas_satisfactorias"] == len(usuarios) * 5
+
+
+if __name__ == "__main__":
+    test_encuestas_concurrentes_no_pierden_actualizaciones()
@@ -0,0 +1,95 @@
+import os
+import json
+import time
+import tempfile
+
+from backends import BackendMemoria
+from bot_simple import WhatsAppBot
+from configuracion import RUTA_POR_DEFECTO, ConfiguracionRecargable
+
+
+def leer_base():
+    with open(RUTA_POR_DEFECTO, 'r', encoding='utf-8') as f:
+        return json.load(f)
+
+
+def escribir(ruta, datos):
+    """Escribe el archivo y adelanta su fecha para que el cambio se note aunque sea en el mismo instante"""
+    anterior = os.stat(ruta).st_mtime if os.path.exists(ruta) else time.time()
+    with open(ruta, 'w', encoding='utf-8') as f:
+        f.write(datos if isinstance(datos, str) else json.dumps(datos, ensure_ascii=False))
+    os.utime(ruta, (anterior + 1, anterior + 1))
+
+
+def test_recarga_copy_on_write():
+    with tempfile.TemporaryDirectory() as directorio:
+        ruta = os.path.join(directorio, 'configuracion.json')
+        datos = leer_base()
+        escribir(ruta, datos)
+        configuracion = ConfiguracionRecargable(ruta, intervalo=0)
+        anterior = configuracion.actual
+        assert configuracion.revisar() is False
+
+        datos['version'] = 2
+        datos['sistemas_deteccion']['pitot'] = ['pitot', 'tubo pitot']
+        escribir(ruta, datos)
+        assert configuracion.revisar() is True
+        assert configuracion.actual.version == 2
+        assert configuracion.actual.clasificador.clasificar("el tubo pitot falla").primera('sistema') == 'pitot'
+        # La versión anterior queda intacta para quien la estaba usando
+        assert anterior.version == 1
+        assert anterior.clasificador.clasificar("el tubo pitot falla").primera('sistema') is None
+
+        # Un archivo con errores no reemplaza la configuración vigente
+        escribir(ruta, '{"version": 3, "sistemas": ')
+        assert configuracion.revisar() is False
+        datos_invalidos = dict(datos, version=3, sistemas_deteccion={'apu': 'apu'})
+        escribir(ruta, datos_invalidos)
+        assert configuracion.revisar() is False
+        assert configuracion.actual.version == 2
+        assert configuracion.resumen()["errores"] == 2
+
+
+def test_hilo_vigila_el_archivo():
+    with tempfile.TemporaryDirectory() as directorio:
+        ruta = os.path.join(directorio, 'configuracion.json')
+        datos = leer_base()
+        escribir(ruta, datos)
+        configuracion = ConfiguracionRecargable(ruta, intervalo=0.02)
+        configuracion.iniciar()
+        try:
+            escribir(ruta, dict(datos, version=5))
+            limite = time.time() + 5
+            while configuracion.actual.version != 5 and time.time() < limite:
+                time.sleep(0.01)
+            assert configuracion.actual.version == 5
+        finally:
+            configuracion.detener()
+
+
+def test_bot_usa_la_configuracion_nueva(monkeypatch):
+    with tempfile.TemporaryDirectory() as directorio:
+        ruta = os.path.join(directorio, 'configuracion.json')
+        datos = leer_base()
+        escribir(ruta, datos)
+        monkeypatch.setenv('BOT_CONFIG', ruta)
+        monkeypatch.setenv('BOT_CONFIG_INTERVALO', '0')
+        bot = WhatsAppBot(backend=BackendMemoria())
+        assert bot.detectar_problema_especifico("bleed leak en el motor") is None
+        assert bot.manejar_reset_sistema("u1", 'APU').startswith("Para realizar un reset del sistema APU")
+
+        datos['version'] = 2
+        datos['respuestas_especificas']['bleed leak'] = "Para un BLEED LEAK: aísla el sistema."
+        datos['plantillas'] = {'reset_apu': "Reset del APU: consulta la tarea 49-00."}
+        escribir(ruta, datos)
+        assert bot.configuracion.revisar()
+
+        assert bot.detectar_problema_especifico("bleed leak en el motor") == 'bleed leak'
+        assert bot.manejar_reset_sistema("u1", 'APU') == "Reset del APU: consulta la tarea 49-00."
+        assert bot.obtener_metricas()["configuracion"]["version"] == 2
+
+
+if __name__ == "__main__":
+    test_recarga_copy_on_write()
+    test_hilo_vigila_el_archivo()
+    print("Pruebas de configuración completadas")
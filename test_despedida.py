@@ -0,0 +1,116 @@
+import time
+
+from analisis import MensajeAnalizado
+from backends import BackendMemoria
+from bot_simple import WhatsAppBot
+
+# Corpus etiquetado: (mensaje, ¿es despedida?)
+CORPUS_DESPEDIDA = [
+    ("no", True),
+    ("No.", True),
+    ("no, gracias", True),
+    ("No gracias!", True),
+    ("gracias", True),
+    ("Muchas gracias por la ayuda", True),
+    ("ok, muchas gracias", True),
+    ("listo", True),
+    ("Listo, gracias", True),
+    ("eso es todo", True),
+    ("Eso sería todo, gracias", True),
+    ("nada más", True),
+    ("no necesito más ayuda", True),
+    ("no hay nada más", True),
+    ("terminamos", True),
+    ("perfecto, gracias, hasta luego", True),
+    ("chao", True),
+    ("El APU no arranca", False),
+    ("El APU del CC-AWN no arranca", False),
+    ("el motor no funciona", False),
+    ("APU no funciona en CC-AWN", False),
+    ("El apu no enciende", False),
+    ("no hay energía en el bus eléctrico", False),
+    ("gracias, pero sigue fallando", False),
+    ("tengo una nota de mantenimiento", False),
+    ("contactar", False),
+    ("hablar con agente", False),
+    ("ninguno", False),
+    ("hola", False),
+    ("necesito ayuda con el tren", False),
+]
+
+# Corpus etiquetado: (respuesta a la encuesta, 'si' / 'no' / 'agente' / None)
+CORPUS_ENCUESTA = [
+    ("Sí", 'si'),
+    ("si", 'si'),
+    ("s", 'si'),
+    ("sí, gracias", 'si'),
+    ("claro", 'si'),
+    ("por supuesto", 'si'),
+    ("ok, sí", 'si'),
+    ("No", 'no'),
+    ("n", 'no'),
+    ("no, sigue igual", 'no'),
+    ("para nada", 'no'),
+    ("negativo", 'no'),
+    ("agente", 'agente'),
+    ("no, quiero un agente", 'agente'),
+    ("El apu no enciende", None),
+    ("sí, pero sigue fallando", None),
+    ("no sé", None),
+    ("no quiero agente", None),
+    ("no, no necesito un agente", None),
+    ("sin agente, gracias", None),
+    ("quiero hablar con un agente", 'agente'),
+    ("nota", None),
+    ("hola", None),
+    ("sin novedad", None),
+]
+
+
+def precision(corpus, rasgo):
+    aciertos = sum(getattr(MensajeAnalizado(mensaje, None), rasgo) == esperado for mensaje, esperado in corpus)
+    return aciertos / len(corpus)
+
+
+def test_corpus_despedida():
+    fallos = [m for m, esperado in CORPUS_DESPEDIDA if MensajeAnalizado(m, None).es_despedida != esperado]
+    assert fallos == []
+
+
+def test_corpus_encuesta():
+    fallos = [m for m, esperado in CORPUS_ENCUESTA if MensajeAnalizado(m, None).respuesta_encuesta != esperado]
+    assert fallos == []
+
+
+def test_velocidad_deteccion():
+    mensajes = [m for m, _ in CORPUS_DESPEDIDA + CORPUS_ENCUESTA] * 200
+    inicio = time.perf_counter()
+    for mensaje in mensajes:
+        MensajeAnalizado(mensaje, None)
+    por_mensaje = (time.perf_counter() - inicio) / len(mensajes)
+    # Cota holgada: el análisis completo de un mensaje corto toma microsegundos
+    assert por_mensaje < 0.001
+
+
+def test_problema_con_no_no_dispara_encuesta():
+    bot = WhatsAppBot(backend=BackendMemoria())
+    respuesta = bot.procesar_mensaje("El APU del CC-AWN no arranca", "u1")
+    assert "interruptor de control del APU" in respuesta
+
+    assert respuesta.endswith("fue resuelta? Responde Sí o No.")
+    # Durante la encuesta, un mensaje que no empieza con sí/no vuelve a preguntar
+    assert bot.procesar_mensaje("El apu no enciende", "u1").startswith("Por favor, responde Sí o No")
+    assert "feedback positivo" in bot.procesar_mensaje("sí, gracias", "u1")
+
+    assert "fue resuelta" in bot.procesar_mensaje("no, gracias", "u2")
+
+
+if __name__ == "__main__":
+    for nombre, corpus, rasgo in (("despedida", CORPUS_DESPEDIDA, 'es_despedida'),
+                                  ("encuesta", CORPUS_ENCUESTA, 'respuesta_encuesta')):
+        print(f"Precisión {nombre}: {precision(corpus, rasgo):.1%}")
+    mensajes = [m for m, _ in CORPUS_DESPEDIDA + CORPUS_ENCUESTA] * 1000
+    inicio = time.perf_counter()
+    for mensaje in mensajes:
+        MensajeAnalizado(mensaje, None)
+    print(f"{1e6 * (time.perf_counter() - inicio) / len(mensajes):.1f} µs por mensaje")
@@ -0,0 +1,79 @@
+import os
+import json
+import tempfile
+from diario import DiarioEventos
+
+
+def aplicar(estado, evento):
+    estado["total"] += evento["valor"]
+
+
+def crear_diario(directorio, estado, eventos_por_snapshot=1000):
+    return DiarioEventos(
+        os.path.join(directorio, "stats.json"),
+        os.path.join(directorio, "stats.jsonl"),
+        lambda: estado,
+        eventos_por_snapshot=eventos_por_snapshot
+    )
+
+
+def test_reproduce_eventos_al_cargar():
+    with tempfile.TemporaryDirectory() as directorio:
+        estado = {"total": 0}
+        diario = crear_diario(directorio, estado, eventos_por_snapshot=3)
+        for valor in range(1, 6):
+            aplicar(estado, {"valor": valor})
+            diario.registrar({"valor": valor})
+        diario.cerrar()
+
+        # Tras la compactación el diario solo contiene los eventos posteriores al snapshot
+        with open(os.path.join(directorio, "stats.jsonl"), encoding='utf-8') as f:
+            assert len(f.readlines()) == 2
+
+        recargado = crear_diario(directorio, {}).cargar(lambda: {"total": 0}, aplicar)
+        assert recargado["total"] == 15
+
+
+def test_ignora_linea_truncada():
+    with tempfile.TemporaryDirectory() as directorio:
+        diario = crear_diario(directorio, {"total": 0})
+        diario.registrar({"valor": 2})
+        diario.cerrar()
+        with open(os.path.join(directorio, "stats.jsonl"), 'a', encoding='utf-8') as f:
+            f.write('{"seq": 2, "evento": {"val')
+
+        recargado = crear_diario(directorio, {}).cargar(lambda: {"total": 0}, aplicar)
+        assert recargado["total"] == 2
+
+
+def test_anexa_despues_de_una_caida():
+    with tempfile.TemporaryDirectory() as directorio:
+        diario = crear_diario(directorio, {"total": 0})
+        diario.registrar_lote([{"valor": 2}, {"valor": 3}])
+        diario.cerrar()
+        with open(os.path.join(directorio, "stats.jsonl"), 'a', encoding='utf-8') as f:
+            f.write('{"seq": 3, "evento": {"val')
+
+        # Tras recuperarse el proceso sigue anexando eventos al mismo diario
+        diario = crear_diario(directorio, {})
+        assert diario.cargar(lambda: {"total": 0}, aplicar)["total"] == 5
+        diario.registrar_lote([{"valor": 4}, {"valor": 5}])
+        diario.cerrar()
+
+        recargado = crear_diario(directorio, {}).cargar(lambda: {"total": 0}, aplicar)
+        assert recargado["total"] == 14
+
+
+def test_snapshot_antiguo_sin_secuencia():
+    with tempfile.TemporaryDirectory() as directorio:
+        with open(os.path.join(directorio, "stats.json"), 'w', encoding='utf-8') as f:
+            json.dump({"total": 7}, f)
+        recargado = crear_diario(directorio, {}).cargar(lambda: {"total": 0, "otro": 1}, aplicar)
+        assert recargado == {"total": 7, "otro": 1}
+
+
+if __name__ == "__main__":
+    test_reproduce_eventos_al_cargar()
+    test_ignora_linea_truncada()
+    test_anexa_despues_de_una_caida()
+    test_snapshot_antiguo_sin_secuencia()
@@ -0,0 +1,115 @@
+import time
+import threading
+
+from backends import BackendMemoria
+from bot_simple import WhatsAppBot
+from escritor import EscritorDiferido
+
+
+def test_junta_lo_pendiente_en_una_escritura():
+    escrituras = []
+    escritor = EscritorDiferido(escrituras.append, intervalo=60, umbral=1000)
+    for numero in range(10):
+        escritor.encolar(numero)
+    assert escritor.profundidad == 10 and escrituras == []
+
+    escritor.vaciar()
+    assert escrituras == [list(range(10))]
+    assert escritor.profundidad == 0
+    escritor.cerrar()
+
+
+def test_umbral_e_intervalo_despiertan_al_escritor():
+    escrito = threading.Event()
+    escrituras = []
+    escritor = EscritorDiferido(lambda pendientes: (escrituras.append(pendientes), escrito.set()),
+                                intervalo=60, umbral=3)
+    for numero in range(3):
+        escritor.encolar(numero)
+    assert escrito.wait(5)
+    assert escrituras == [[0, 1, 2]]
+    escritor.cerrar()
+
+    escrito.clear()
+    escritor = EscritorDiferido(lambda pendientes: (escrituras.append(pendientes), escrito.set()),
+                                intervalo=0.05, umbral=1000)
+    escritor.encolar("a")
+    assert escrito.wait(5)
+    assert escrituras[-1] == ["a"]
+    escritor.cerrar()
+
+
+def test_cerrar_escribe_lo_que_queda_y_agrupar_retiene():
+    escrituras = []
+    escritor = EscritorDiferido(escrituras.append, intervalo=0.01, umbral=100)
+    with escritor.agrupar():
+        for numero in range(5):
+            escritor.encolar(numero)
+        time.sleep(0.05)
+        assert escrituras == []
+    assert escrituras == [[0, 1, 2, 3, 4]]
+
+    escritor.encolar(5)
+    escritor.cerrar()
+    assert [n for lote in escrituras for n in lote] == list(range(6))
+    # Cerrado, cada elemento se escribe en el momento
+    escritor.encolar(6)
+    assert escrituras[-1] == [6]
+
+
+def test_agrupar_no_retiene_sin_limite():
+    escrito = threading.Event()
+    escrituras = []
+    escritor = EscritorDiferido(lambda pendientes: (escrituras.append(pendientes), escrito.set()),
+                                intervalo=0.01, umbral=3, max_retencion=60)
+    # Dos lotes superpuestos: al llegar al umbral se escribe igual
+    with escritor.agrupar(), escritor.agrupar():
+        for numero in range(3):
+            escritor.encolar(numero)
+        assert escrito.wait(5)
+        assert escrituras == [[0, 1, 2]]
+
+        # Por debajo del umbral se escribe al vencer la retención máxima
+        escrito.clear()
+        escritor.max_retencion = 0.05
+        escritor.encolar(3)
+        assert escrito.wait(5)
+        assert escrituras[-1] == [3]
+    escritor.cerrar()
+
+
+def test_sin_intervalo_escribe_en_el_momento():
+    escrituras = []
+    escritor = EscritorDiferido(escrituras.append, intervalo=0)
+    escritor.encolar("a")
+    assert escrituras == [["a"]]
+
+
+def test_el_bot_no_escribe_en_el_camino_de_la_respuesta(monkeypatch):
+    monkeypatch.setenv('BOT_ESCRITURA_INTERVALO', '60')
+    bot = WhatsAppBot(backend=BackendMemoria())
+    escrituras = []
+    registrar_lote = bot.diario.registrar_lote
+    bot.diario.registrar_lote = lambda eventos: (escrituras.append(len(eventos)), registrar_lote(eventos))
+
+    for _ in range(3):
+        bot.procesar_mensaje("listo", "escritor")
+        bot.procesar_mensaje("Sí", "escritor")
+        bot.procesar_mensaje("nueva consulta", "escritor")
+        bot.contexto_actual["escritor"] = {}
+    assert escrituras == []
+    assert bot.escritor.profundidad == 12
+
+    # Leer las estadísticas incorpora lo pendiente en una sola escritura
+    assert bot.obtener_estadisticas()["total_encuestas"] == 3
+    assert escrituras == [12]
+    bot.cerrar()
+
+
+if __name__ == "__main__":
+    test_junta_lo_pendiente_en_una_escritura()
+    test_umbral_e_intervalo_despiertan_al_escritor()
+    test_cerrar_escribe_lo_que_queda_y_agrupar_retiene()
+    test_agrupar_no_retiene_sin_limite()
+    test_sin_intervalo_escribe_en_el_momento()
+    print("Pruebas del escritor diferido completadas")
@@ -0,0 +1,66 @@
+from indice_manual import IndiceBM25, tokenizar
+from pdf_knowledge import ManualKnowledge
+
+
+BASE = {
+    "APU": {
+        "NO_ARRANCA": [
+            "Si el APU no arranca verifique el voltaje de la batería y el fusible del starter.",
+            "Revise la válvula de combustible del APU y el filtro de combustible.",
+            "Consulte el mensaje ECAM APU FAULT antes de intentar un nuevo arranque."
+        ],
+        "FALLA": ["Revise la válvula de combustible del APU y el filtro de combustible."]
+    },
+    "TREN": {
+        "NO_FUNCIONA": ["El tren de aterrizaje no retrae: revise la presión hidráulica del sistema verde."]
+    }
+}
+
+
+def test_tokenizar_normaliza_tildes_y_codigos():
+    assert tokenizar("Válvula de COMBUSTIBLE 21-51-00") == ["valvula", "combustible", "21-51-00"]
+
+
+def test_ranking_por_relevancia():
+    indice = IndiceBM25.desde_base(BASE)
+    mejores = indice.buscar("sospecho del filtro de combustible", "APU", "NO_ARRANCA", k=1)
+    assert mejores == ["Revise la válvula de combustible del APU y el filtro de combustible."]
+    assert indice.buscar("batería baja", "APU", "NO_ARRANCA", k=1)[0].startswith("Si el APU no arranca")
+
+
+def test_filtra_por_sistema_y_problema():
+    indice = IndiceBM25.desde_base(BASE)
+    # La sección del tren no puede aparecer en resultados del APU aunque coincidan términos
+    resultados = indice.buscar("presión hidráulica", "APU", "NO_ARRANCA", k=3)
+    assert len(resultados) == 3
+    assert all("tren" not in r for r in resultados)
+    assert indice.buscar("presión hidráulica", k=1)[0].startswith("El tren")
+    assert indice.buscar("algo", "MOTOR", "FALLA") == []
+
+
+def test_sin_coincidencias_conserva_orden_original():
+    indice = IndiceBM25.desde_base(BASE)
+    assert indice.buscar("xyz", "APU", "NO_ARRANCA", k=2) == BASE["APU"]["NO_ARRANCA"][:2]
+
+
+def test_secciones_repetidas_se_indexan_una_vez():
+    indice = IndiceBM25.desde_base(BASE)
+    assert len(indice.secciones) == 4
+
+
+
+def test_respuesta_sin_secciones():
+    manual = ManualKnowledge()
+    manual.knowledge_base = {"APU": {"NO_ARRANCA": []}}
+    assert manual.get_response("APU", "NO_ARRANCA", "el apu no arranca") is None
+    assert manual.get_response("APU", "NO_ARRANCA") is None
+
+
+if __name__ == "__main__":
+    test_tokenizar_normaliza_tildes_y_codigos()
+    test_ranking_por_relevancia()
+    test_filtra_por_sistema_y_problema()
+    test_sin_coincidencias_conserva_orden_original()
+    test_secciones_repetidas_se_indexan_una_vez()
+    test_respuesta_sin_secciones()
+    print("Pruebas del índice del manual completadas")
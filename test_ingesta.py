@@ -0,0 +1,113 @@
+import os
+import re
+import tempfile
+
+import ingesta
+import ingesta_cli
+from base_binaria import abrir_base
+from ingesta import combinar_bases, ingerir_pdf
+
+PALABRAS_SISTEMA = {'APU': ['apu'], 'TREN': ['tren']}
+PALABRAS_PROBLEMA = {'NO_ARRANCA': ['no arranca'], 'ERROR': ['error']}
+
+RELLENO = " ".join(f"Procedimiento general de mantenimiento {i} con varias palabras extra." for i in range(6))
+
+PAGINAS = [
+    "Si el APU no arranca revise la batería. " + RELLENO + " El tren muestra un error",
+    "de posición en la cabina. " + RELLENO,
+    "El APU muestra un error de EGT. " + RELLENO,
+]
+
+BASE_ESPERADA = {
+    'APU': {'NO_ARRANCA': ["Si el APU no arranca revise la batería."],
+            'ERROR': ["El APU muestra un error de EGT."]},
+    'TREN': {'ERROR': ["El tren muestra un error\nde posición en la cabina."]}
+}
+
+
+def simular_pdf(monkeypatch, paginas):
+    """Reemplaza la lectura del PDF por una lista de textos y anota las páginas extraídas"""
+    extraidas = []
+
+    def extraer_paginas(ruta, inicio, fin):
+        for numero in range(inicio, fin):
+            extraidas.append(numero)
+            yield paginas[numero]
+
+    monkeypatch.setattr(ingesta, 'huellas_paginas', lambda ruta: [ingesta.huella_texto(p) for p in paginas])
+    monkeypatch.setattr(ingesta, 'extraer_paginas', extraer_paginas)
+    # Separador de oraciones simple para no depender del modelo punkt de NLTK
+    monkeypatch.setattr(ingesta, '_sent_tokenize', lambda texto: re.split(r'(?<=[.!?])\s+', texto.strip()))
+    return extraidas
+
+
+def test_combinar_bases_conserva_orden():
+    base = {'APU': {'ERROR': ['a']}}
+    combinar_bases(base, {'APU': {'ERROR': ['b'], 'NO_ARRANCA': ['c']}, 'TREN': {'ERROR': ['d']}})
+    assert base == {'APU': {'ERROR': ['a', 'b'], 'NO_ARRANCA': ['c']}, 'TREN': {'ERROR': ['d']}}
+
+
+def test_ingesta_por_tareas_igual_a_secuencial(monkeypatch):
+    simular_pdf(monkeypatch, PAGINAS)
+    for paginas_por_tarea in (1, 2, 16):
+        base, estadisticas = ingerir_pdf("manual.pdf", PALABRAS_SISTEMA, PALABRAS_PROBLEMA,
+                                         procesos=1, paginas_por_tarea=paginas_por_tarea)
+        # La sección que cruza de página se une aunque las páginas queden en tareas distintas
+        assert base == BASE_ESPERADA
+    assert estadisticas["paginas"] == 3
+    assert estadisticas["paginas_por_segundo"] > 0
+
+
+def test_reingesta_solo_extrae_paginas_cambiadas(monkeypatch):
+    with tempfile.TemporaryDirectory() as directorio:
+        manifiesto = os.path.join(directorio, "manual.manifest.json")
+        simular_pdf(monkeypatch, PAGINAS)
+        ingerir_pdf("manual.pdf", PALABRAS_SISTEMA, PALABRAS_PROBLEMA, procesos=1, ruta_manifiesto=manifiesto)
+
+        # Revisión: se inserta una página y se modifica la última
+        revision = [PAGINAS[0], "Nueva tarea: el APU no arranca con frío. " + RELLENO, PAGINAS[1],
+                    "El APU muestra un error de EGT alto. " + RELLENO]
+        extraidas = simular_pdf(monkeypatch, revision)
+        base, estadisticas = ingerir_pdf("manual.pdf", PALABRAS_SISTEMA, PALABRAS_PROBLEMA,
+                                         procesos=1, ruta_manifiesto=manifiesto)
+        assert 0 not in extraidas
+        assert estadisticas["extraidas"] < len(revision)
+
+        completa, _ = ingerir_pdf("manual.pdf", PALABRAS_SISTEMA, PALABRAS_PROBLEMA, procesos=1)
+        assert base == completa
+        assert "El APU muestra un error de EGT alto." in base['APU']['ERROR']
+
+        # Sin cambios no se vuelve a extraer ninguna página
+        del extraidas[:]
+        _, estadisticas = ingerir_pdf("manual.pdf", PALABRAS_SISTEMA, PALABRAS_PROBLEMA,
+                                      procesos=1, ruta_manifiesto=manifiesto)
+        assert extraidas == []
+        assert estadisticas["reutilizadas"] == len(revision)
+
+
+def test_cli_escribe_base_y_reporta(monkeypatch, capsys):
+    simular_pdf(monkeypatch, PAGINAS)
+    with tempfile.TemporaryDirectory() as directorio:
+        manual = os.path.join(directorio, "AMM.pdf")
+        open(manual, 'wb').close()
+        logs = os.path.join(directorio, "logs")
+
+        assert ingesta_cli.main([manual, "--tipo", "A320", "--logs", logs, "--procesos", "1"]) == 0
+        ruta_base = os.path.join(logs, "manuales", "A320", "knowledge_base.json")
+        assert os.path.exists(os.path.join(logs, "manuales", "A320", "AMM.manifest.json"))
+        base = abrir_base(ruta_base)
+        assert type(base).__name__ == "BaseBinaria"
+        assert base.get_all_responses("TREN", "ERROR") == BASE_ESPERADA["TREN"]["ERROR"]
+        base.cerrar()
+
+        reporte = capsys.readouterr().out
+        assert "TOTAL" in reporte and "clasificación" in reporte
+        # 3 secciones clasificadas de 21 (3 oraciones con palabras clave + 18 de relleno)
+        assert "14.3%" in reporte
+
+        assert ingesta_cli.main([os.path.join(directorio, "no_existe.pdf"), "--logs", logs]) == 1
+
+
+if __name__ == "__main__":
+    test_combinar_bases_conserva_orden()
+    print("Pruebas de ingesta completadas")
@@ -0,0 +1,67 @@
+import random
+
+from backends import BackendMemoria
+from bot_simple import WhatsAppBot
+from latencias import (nuevo_histograma, registrar_latencia, combinar_histogramas, percentil,
+                       resumir_histograma)
+
+
+def test_percentiles_con_error_acotado():
+    generador = random.Random(7)
+    muestras = [generador.lognormvariate(-4, 1.2) for _ in range(20000)]
+    histograma = nuevo_histograma()
+    for muestra in muestras:
+        registrar_latencia(histograma, muestra)
+
+    ordenadas = sorted(muestras)
+    for p in (50, 95, 99):
+        exacto = ordenadas[int(len(ordenadas) * p / 100) - 1]
+        assert exacto <= percentil(histograma, p) <= exacto * 1.19
+    assert percentil(histograma, 100) == max(muestras)
+    assert percentil(nuevo_histograma(), 99) == 0.0
+
+
+def test_combinar_y_resumir():
+    a, b = nuevo_histograma(), nuevo_histograma()
+    for segundos in (0.001, 0.002, 0.004):
+        registrar_latencia(a, segundos)
+    registrar_latencia(b, 500.0)  # fuera del mayor límite
+    total = combinar_histogramas([a, b])
+    resumen = resumir_histograma(total)
+    assert resumen["cantidad"] == 4
+    assert resumen["maximo_ms"] == 500000.0
+    assert resumen["p99_ms"] == 500000.0
+    assert resumen["p50_ms"] <= 2.0 * 1.19
+
+
+def test_latencia_por_rama():
+    bot = WhatsAppBot(backend=BackendMemoria())
+    bot.procesar_mensaje("ayuda", "ramas")                                 # otros
+    bot.procesar_mensaje("Necesito ayuda con una consulta general", "ramas")  # fallback
+    bot.procesar_mensaje("listo", "ramas")                                 # encuesta
+    bot.procesar_mensaje("No", "ramas")                                    # encuesta
+    bot.procesar_mensaje("agente", "ramas")                                # agente
+
+    metricas = bot.obtener_metricas()
+    cantidades = {rama: resumen["cantidad"] for rama, resumen in metricas["latencias"].items()}
+    assert cantidades == {"encuesta": 2, "agente": 1, "automatica": 0, "manual": 0,
+                          "fallback": 1, "otros": 1, "total": 5}
+    assert metricas["total_respuestas"] == 5
+    assert bot.obtener_estadisticas()["latencias"]["total"]["cantidad"] == 5
+
+
+def test_promedio_sobre_las_respuestas():
+    bot = WhatsAppBot(backend=BackendMemoria())
+    stats = bot.inicializar_estadisticas()
+    for segundos in (1.0, 2.0, 6.0):
+        bot.aplicar_evento(stats, {"tipo": "respuesta", "tiempo_respuesta": segundos, "rama": "otros"})
+    assert stats["tiempo_respuesta_promedio"] == 3.0
+    assert stats["latencias"]["otros"]["cantidad"] == 3
+
+
+if __name__ == "__main__":
+    test_percentiles_con_error_acotado()
+    test_combinar_y_resumir()
+    test_latencia_por_rama()
+    test_promedio_sobre_las_respuestas()
+    print("Pruebas de latencias completadas")
@@ -0,0 +1,25 @@
+from backends import BackendMemoria
+from bot_simple import WhatsAppBot
+
+
+def test_lote_mantiene_orden_por_usuario():
+    mensajes = []
+    for i in range(10):
+        mensajes += [(f"lote_{i}", "listo"), (f"lote_{i}", "Sí"), (f"lote_{i}", "ayuda")]
+
+    secuencial = WhatsAppBot(backend=BackendMemoria())
+    esperadas = [secuencial.procesar_mensaje(mensaje, id_usuario) for id_usuario, mensaje in mensajes]
+
+    bot = WhatsAppBot(backend=BackendMemoria())
+    escrituras = []
+    registrar_lote = bot.diario.registrar_lote
+    bot.diario.registrar_lote = lambda eventos: (escrituras.append(len(eventos)), registrar_lote(eventos))
+
+    assert bot.procesar_lote(mensajes) == esperadas
+    # Todos los eventos del lote se persisten en una sola escritura
+    assert escrituras == [len(mensajes) + 10]
+    assert bot.obtener_estadisticas()["total_encuestas"] == 10
+
+
+if __name__ == "__main__":
+    test_lote_mantiene_orden_por_usuario()
@@ -0,0 +1,52 @@
+import pytest
+
+from backends import BackendMemoria
+from bot_simple import WhatsAppBot
+from plantillas import PLANTILLAS, RegistroPlantillas
+
+
+def test_cache_por_nombre_y_actualizacion():
+    registro = RegistroPlantillas({'saludo': "Hola {matricula}", 'reset': "Reset del {sistema}"})
+    for numero in range(100):
+        assert registro.renderizar('saludo', matricula=f'CC-{numero:03d}') == f"Hola CC-{numero:03d}"
+    registro.renderizar('reset', sistema='APU')
+    # Una entrada por plantilla, no una por combinación de campos
+    assert registro.resumen()["en_cache"] == len(registro) == 2
+
+    # Al cambiar la plantilla no se sirve el texto viejo
+    registro.actualizar({'saludo': "Buenas {matricula}"})
+    assert registro.renderizar('saludo', matricula='CC-AWN') == "Buenas CC-AWN"
+    assert registro.resumen() == {"version": 2, "en_cache": 2}
+
+
+def test_plantilla_invalida():
+    with pytest.raises(ValueError):
+        RegistroPlantillas({'mala': "Hola {usuario}"})
+    with pytest.raises(ValueError):
+        RegistroPlantillas({'mala': "Hola {matricula"})
+    # Todas las plantillas incluidas son válidas
+    assert 'reset_otro' in RegistroPlantillas(PLANTILLAS)
+
+
+def test_respuestas_del_bot_desde_plantillas():
+    bot = WhatsAppBot(backend=BackendMemoria())
+    primera = bot.manejar_tren_aterrizaje("u1", 'REVISAR', 'CC-AWN')
+    assert primera.startswith("Para realizar un check del tren de aterrizaje en CC-AWN")
+    assert bot.manejar_tren_aterrizaje("u2", 'REVISAR', 'CC-AWN') == primera
+    assert bot.obtener_metricas()["plantillas"]["en_cache"] == len(PLANTILLAS)
+
+    assert "reset del sistema HIDRAULICO" in bot.manejar_reset_sistema("u1", 'HIDRAULICO')
+
+    class Manual:
+        def get_response(self, sistema, problema, mensaje, matricula):
+            return "Revise el breaker {APU START}."
+
+    bot.manual_knowledge = Manual()
+    respuesta = bot.generar_respuesta_automatica('APU', 'NO_ARRANCA', "apu no arranca", 'CC-AWN')
+    assert respuesta.startswith("Según el manual de mantenimiento:\n\nRevise el breaker {APU START}.")
+
+
+if __name__ == "__main__":
+    test_cache_por_nombre_y_actualizacion()
+    test_plantilla_invalida()
+    print("Pruebas de plantillas completadas")
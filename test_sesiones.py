@@ -0,0 +1,61 @@
+import time
+from sesiones import AlmacenSesiones, VistaContextos, VistaHistoriales
+
+
+def test_expulsa_por_capacidad_en_orden_lru():
+    expiradas = []
+    almacen = AlmacenSesiones(capacidad=2, al_expirar=lambda id_usuario, sesion: expiradas.append(id_usuario))
+    almacen.cargar('a')
+    almacen.cargar('b')
+    almacen.cargar('a')
+    almacen.cargar('c')
+    assert expiradas == ['b']
+    assert 'a' in almacen and 'c' in almacen
+
+
+def test_no_expulsa_sesiones_en_uso():
+    expiradas = []
+    almacen = AlmacenSesiones(capacidad=1, al_expirar=lambda id_usuario, sesion: expiradas.append(id_usuario))
+    sesion = almacen.cargar('a', en_uso=True)
+    sesion.historial.append({'mensaje': 'hola'})
+    almacen.cargar('b')
+    assert expiradas == ['b']
+    assert almacen.buscar('a') is sesion
+
+    # Al guardarla vuelve a ser expulsable
+    almacen.guardar('a', sesion)
+    almacen.cargar('c')
+    assert expiradas == ['b', 'a']
+
+
+def test_expulsa_por_inactividad():
+    expiradas = []
+    almacen = AlmacenSesiones(ttl=0.05, al_expirar=lambda id_usuario, sesion: expiradas.append(id_usuario))
+    almacen.cargar('a').historial.append({'mensaje': 'hola'})
+    time.sleep(0.1)
+    almacen.cargar('b')
+    assert expiradas == ['a']
+    assert len(almacen) == 1
+
+
+def test_vistas_y_limite_de_historial():
+    almacen = AlmacenSesiones(max_historial=3)
+    def obtener_sesion(id_usuario, crear):
+        return almacen.cargar(id_usuario) if crear else almacen.buscar(id_usuario)
+
+    contextos = VistaContextos(obtener_sesion)
+    historiales = VistaHistoriales(obtener_sesion)
+    assert 'u' not in contextos
+    assert contextos.get('u', {}) == {}
+    for i in range(5):
+        historiales['u'].append(i)
+    assert list(historiales['u']) == [2, 3, 4]
+    contextos['u'] = {'sistema': 'APU'}
+    assert contextos['u']['sistema'] == 'APU'
+
+
+if __name__ == "__main__":
+    test_expulsa_por_capacidad_en_orden_lru()
+    test_no_expulsa_sesiones_en_uso()
+    test_expulsa_por_inactividad()
+    test_vistas_y_limite_de_historial()